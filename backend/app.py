@@ -3,26 +3,53 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from config import Config
 from models import db
+from database import init_database
 from auth_routes import auth_bp
 from teacher_routes import teacher_bp
 from student_routes import student_bp
+from upload_routes import upload_bp
+from pagination import PaginationError
+from user_cache import user_cache
+from storage import init_storage
+from jobs import job_queue
+from response_cache import response_cache
+from metrics import request_metrics
+from passwords import password_hasher, Overloaded
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
-    db.init_app(app)
+    init_database(app)
+    password_hasher.init_app(app)
+    user_cache.init_app(app)
+    job_queue.init_app(app)
+    response_cache.init_app(app)
+    request_metrics.init_app(app)
     CORS(app, supports_credentials=True)
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    init_storage(app)
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(teacher_bp, url_prefix='/api')
     app.register_blueprint(student_bp, url_prefix='/api')
+    app.register_blueprint(upload_bp, url_prefix='/api')
 
     @app.errorhandler(404)
     def not_found(error):
         return jsonify({'message': 'Resource not found'}), 404
     
+    @app.errorhandler(PaginationError)
+    def pagination_error(error):
+        return jsonify({'message': str(error)}), 400
+    
+    @app.errorhandler(Overloaded)
+    def overloaded(error):
+        db.session.rollback()
+        response = jsonify({'message': str(error)})
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response, 503
+    
     @app.errorhandler(500)
     def internal_error(error):
         db.session.rollback()
@@ -34,6 +61,7 @@ if __name__ == '__main__':
     app = create_app()
     
     with app.app_context():
-        db.create_all()
+        from migrations import upgrade
+        upgrade()
     
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""ZIP archives streamed as they are built.
+
+zipfile writes local headers, data and (because the output cannot seek)
+data descriptors straight into a small spool that is drained after every
+buffer-sized write, so memory stays at one buffer however large the
+archive grows. Submission files are stored, not deflated: they are mostly
+zip, pdf and docx files that are already compressed. Generated entries
+(stream_generated_zip) are deflated.
+"""
+import zipfile
+from uploads import COPY_BUFFER_SIZE
+
+class _Spool:
+    """Write-only, non-seekable sink that zipfile writes into"""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+def _stream(entries):
+    """Yield the bytes of a ZIP archive of (ZipInfo, iterable of bytes) entries"""
+    spool = _Spool()
+    with zipfile.ZipFile(spool, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for info, chunks in entries:
+            # Without a size hint the entry's length is unknown until written
+            with archive.open(info, 'w', force_zip64=not info.file_size) as target:
+                for chunk in chunks:
+                    target.write(chunk)
+                    data = spool.drain()
+                    if data:
+                        yield data
+            yield spool.drain()
+    # Central directory
+    yield spool.drain()
+
+def _read(opener):
+    with opener() as source:
+        while True:
+            buffer = source.read(COPY_BUFFER_SIZE)
+            if not buffer:
+                break
+            yield buffer
+
+def stream_zip(entries):
+    """Yield the bytes of a ZIP archive of entries.
+
+    entries is an iterable of (archive name, size, modified datetime, opener),
+    where opener() returns a readable binary file for the entry's contents.
+    """
+    def infos():
+        for name, size, modified, opener in entries:
+            info = zipfile.ZipInfo(name, date_time=modified.timetuple()[:6])
+            info.file_size = size  # lets zipfile pick ZIP64 headers for large entries
+            yield info, _read(opener)
+    return _stream(infos())
+
+def stream_generated_zip(entries):
+    """Yield the bytes of a deflated ZIP archive of generated content.
+
+    entries is an iterable of (archive name, modified datetime, chunks),
+    where chunks yields the entry's bytes as they are produced. Used for
+    documents such as XLSX workbooks rather than uploaded files.
+    """
+    def infos():
+        for name, modified, chunks in entries:
+            info = zipfile.ZipInfo(name, date_time=modified.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            yield info, chunks
+    return _stream(infos())
@@ -0,0 +1,302 @@
+"""ASGI serving mode.
+
+The two routes that spend their time waiting on the database and the disk,
+POST /api/submissions and GET /api/download/<id>, run here as coroutines
+over an async SQLAlchemy engine and async file I/O. Every other URL is
+passed to the Flask app, which runs in a thread pool (ASGI_WSGI_THREADS),
+so the blueprints' URLs and JSON contracts are unchanged. Run from the
+backend directory:
+
+    uvicorn --factory asgi:create_asgi_app --workers 4
+    gunicorn -k uvicorn.workers.UvicornWorker -w 4 'asgi:create_asgi_app()'
+
+The async engine uses the same database as the Flask app through an async
+driver (aiosqlite, asyncpg or aiomysql; see ASYNC_DATABASE_URL). Writes
+are made with the sync helpers the Flask routes use, run on the async
+session through run_sync(), so blob registration, the job queue, push
+events and cache invalidation behave exactly as they do under WSGI.
+"""
+import asyncio
+import hashlib
+import os
+from contextlib import asynccontextmanager
+import anyio
+import jwt
+from a2wsgi import WSGIMiddleware
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, FileResponse
+from starlette.routing import Route, Mount
+from werkzeug.http import is_resource_modified, http_date
+from werkzeug.utils import secure_filename
+from app import create_app
+from database import engine_options, apply_sqlite_pragmas
+from models import db, User, Assignment, Subject, Enrollment, Submission
+from user_cache import user_cache
+from storage import get_storage, register_blob
+from uploads import COPY_BUFFER_SIZE, temporary_path
+from downloads import accel_location
+from tasks import enqueue_postprocess
+from events import submission_created
+from student_routes import allowed_file
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
+
+def async_database_url(app):
+    """The app's database URL with its driver swapped for an async one"""
+    if app.config['ASYNC_DATABASE_URL']:
+        return make_url(app.config['ASYNC_DATABASE_URL'])
+    with app.app_context():
+        # db.engine.url, not the config string: Flask-SQLAlchemy resolves
+        # relative SQLite paths against the instance folder
+        url = db.engine.url
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f'No async driver known for {backend!r}; set ASYNC_DATABASE_URL')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+def json_response(data, status=200):
+    """The bytes jsonify() would send, so both modes serialise identically"""
+    body = current_app.json.response(data).get_data()
+    return Response(body, status, media_type='application/json')
+
+class AsyncRoutes:
+    def __init__(self, app):
+        self.app = app
+        url = async_database_url(app)
+        self.engine = create_async_engine(url, **engine_options(app.config, url, instrumented=False))
+        if self.engine.dialect.name == 'sqlite':
+            apply_sqlite_pragmas(self.engine.sync_engine, app.config)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        writers = app.config['ASYNC_WRITE_CONCURRENCY']
+        if writers is None and self.engine.dialect.name == 'sqlite':
+            writers = 1
+        self.write_slots = asyncio.Semaphore(writers) if writers else None
+        self.wsgi = WSGIMiddleware(app, workers=app.config['ASGI_WSGI_THREADS'])
+
+    async def authenticate(self, request, session, role=None):
+        """token_required/role_required for a coroutine; returns (user, error response)"""
+        header = request.headers.get('Authorization')
+        token = None
+        if header:
+            try:
+                token = header.split(' ')[1]
+            except IndexError:
+                pass
+        if not token:
+            return None, json_response({'message': 'Token is missing!'}, 401)
+        try:
+            claims = jwt.decode(token, self.app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            return None, json_response({'message': 'Token has expired!'}, 401)
+        except jwt.InvalidTokenError:
+            return None, json_response({'message': 'Invalid token!'}, 401)
+        if role and claims.get('role', role) != role:
+            return None, json_response({'message': f'{role} access required!'}, 403)
+
+        user = user_cache.get(claims['sub'])
+        if user is None:
+            user = await session.get(User, claims['sub'])
+            if user:
+                user_cache.put(user)
+        if not user or not user.active:
+            return None, json_response({'message': 'User not found or inactive!'}, 401)
+        if role and user.role != role:
+            return None, json_response({'message': f'{role} access required!'}, 403)
+        return user, None
+
+    async def submit_assignment(self, request):
+        """POST /api/submissions (student_routes.submit_assignment)"""
+        with self.app.app_context():
+            async with self.sessions() as session:
+                user, error = await self.authenticate(request, session, 'student')
+                if error:
+                    return error
+                try:
+                    return await self._submit(request, session, user)
+                except Exception as e:
+                    await session.rollback()
+                    return json_response({'message': str(e)}, 500)
+
+    async def _submit(self, request, session, user):
+        limit = self.app.config['MAX_CONTENT_LENGTH']
+        if int(request.headers.get('Content-Length') or 0) > limit:
+            return json_response({'message': '413 Request Entity Too Large: '
+                                  'The data value transmitted exceeds the capacity limit.'}, 413)
+
+        form = await request.form()
+        file = form.get('file')
+        if file is None or isinstance(file, str):
+            return json_response({'message': 'No file provided!'}, 400)
+        if file.filename == '':
+            return json_response({'message': 'No file selected!'}, 400)
+
+        assignment_id = form.get('assignment_id')
+        if not assignment_id:
+            return json_response({'message': 'Assignment ID is required!'}, 400)
+        try:
+            assignment_id = int(assignment_id)
+        except ValueError:
+            return json_response({'message': 'Assignment not found!'}, 404)
+
+        subject = (await session.execute(
+            select(Subject.id, Subject.teacher_id).join(Assignment, Assignment.subject_id == Subject.id)
+            .where(Assignment.id == assignment_id)
+        )).first()
+        if subject is None:
+            return json_response({'message': 'Assignment not found!'}, 404)
+        teacher_id = subject.teacher_id
+
+        if await session.get(Enrollment, (subject.id, user.id)) is None:
+            return json_response({'message': 'You are not enrolled in this subject!'}, 403)
+
+        existing = await session.scalar(select(Submission.id).filter_by(
+            assignment_id=assignment_id, student_id=user.id
+        ))
+        if existing:
+            return json_response({'message': 'You have already submitted this assignment!'}, 400)
+
+        if not allowed_file(file.filename):
+            return json_response({
+                'message': f'File type not allowed! Allowed types: {", ".join(self.app.config["ALLOWED_EXTENSIONS"])}'
+            }, 400)
+
+        # Receive into a temporary file, hashing while the bytes are copied
+        temporary = temporary_path()
+        hasher = hashlib.sha256()
+        size = 0
+        async with await anyio.open_file(temporary, 'wb') as destination:
+            while buffer := await file.read(COPY_BUFFER_SIZE):
+                size += len(buffer)
+                if size > limit:
+                    break
+                hasher.update(buffer)
+                await destination.write(buffer)
+        await file.close()
+        if size > limit:
+            await anyio.to_thread.run_sync(os.remove, temporary)
+            return json_response({'message': '413 Request Entity Too Large: '
+                                  'The data value transmitted exceeds the capacity limit.'}, 413)
+
+        digest = hasher.hexdigest()
+
+        async def store():
+            # Register (and lock) the blob row before ingest may reuse stored bytes
+            await session.run_sync(lambda sync_session: register_blob(digest, size, sync_session))
+            return await anyio.to_thread.run_sync(get_storage().ingest, temporary, digest)
+
+        def record(sync_session):
+            submission = Submission(
+                assignment_id=assignment_id,
+                student_id=user.id,
+                blob_key=key,
+                filename=secure_filename(file.filename),
+                sha256=digest
+            )
+            sync_session.add(submission)
+            sync_session.flush()
+            enqueue_postprocess(submission, sync_session)
+            submission_created(submission, teacher_id, sync_session)
+            return submission.to_dict()
+
+        if self.write_slots:
+            async with self.write_slots:
+                key = await store()
+                submission = await session.run_sync(record)
+                await session.commit()
+        else:
+            key = await store()
+            submission = await session.run_sync(record)
+            await session.commit()
+
+        return json_response({
+            'message': 'Assignment submitted successfully!',
+            'submission': submission
+        }, 201)
+
+    async def download_submission(self, request):
+        """GET /api/download/<id> (student_routes.download_submission)"""
+        with self.app.app_context():
+            async with self.sessions() as session:
+                user, error = await self.authenticate(request, session)
+                if error:
+                    return error
+                row = (await session.execute(
+                    select(Submission.student_id, Submission.blob_key, Submission.filename,
+                           Submission.sha256, Submission.submitted_at, Subject.teacher_id)
+                    .join(Assignment, Submission.assignment_id == Assignment.id)
+                    .join(Subject, Assignment.subject_id == Subject.id)
+                    .where(Submission.id == request.path_params['submission_id'])
+                )).first()
+
+            if row is None:
+                return json_response({'message': 'Resource not found'}, 404)
+            if row.student_id != user.id and not (user.role == 'teacher' and row.teacher_id == user.id):
+                return json_response({'message': 'Access denied!'}, 403)
+
+            storage = get_storage()
+            path = storage.local_path(row.blob_key)
+            if path is None:
+                # Backends without local files stream through the Flask route
+                return self.wsgi
+            try:
+                stat_result = await anyio.Path(path).stat()
+            except FileNotFoundError:
+                return json_response({'message': 'File not found!'}, 404)
+            return self._send_file(request, storage, path, stat_result, row)
+
+    def _send_file(self, request, storage, path, stat_result, row):
+        """send_blob() for a local file: conditional, range-aware, optionally offloaded"""
+        etag = row.sha256 or row.blob_key
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': 'no-cache, private',
+        }
+        if row.submitted_at:
+            headers['Last-Modified'] = http_date(row.submitted_at)
+
+        environ = {'REQUEST_METHOD': request.method}
+        for name in ('If-None-Match', 'If-Modified-Since'):
+            if name in request.headers:
+                environ['HTTP_' + name.upper().replace('-', '_')] = request.headers[name]
+        if not is_resource_modified(environ, etag=etag, last_modified=row.submitted_at):
+            return Response(status_code=304, headers=headers)
+
+        response = FileResponse(path, headers=headers, filename=row.filename or row.blob_key,
+                                stat_result=stat_result)
+        offload = self.app.config['DOWNLOAD_OFFLOAD']
+        if offload:
+            # The proxy streams the file and answers Range itself
+            del response.headers['accept-ranges']
+            name = 'X-Accel-Redirect' if offload == 'x-accel' else 'X-Sendfile'
+            location = accel_location(storage, path) if offload == 'x-accel' else path
+            del response.headers['content-length']
+            return Response(status_code=200, headers={**response.headers, name: location})
+        return response
+
+def create_asgi_app(app=None):
+    app = app or create_app()
+    routes = AsyncRoutes(app)
+    # Flask-CORS only sees the routes Flask serves; preflights still reach it
+    cors = [Middleware(CORSMiddleware, allow_origin_regex='.*', allow_credentials=True,
+                       allow_methods=['*'], allow_headers=['*'])]
+
+    @asynccontextmanager
+    async def lifespan(asgi_app):
+        yield
+        await routes.engine.dispose()
+
+    return Starlette(routes=[
+        Route('/api/submissions', routes.submit_assignment, methods=['POST'], middleware=cors),
+        Route('/api/download/{submission_id:int}', routes.download_submission, methods=['GET'], middleware=cors),
+        Mount('', app=routes.wsgi),
+    ], lifespan=lifespan)
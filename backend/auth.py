@@ -1,50 +1,102 @@
 import jwt
 import datetime
+import hashlib
+import secrets
 from functools import wraps
-from flask import request, jsonify, current_app
-from models import User
+from flask import request, jsonify, current_app, g
+from models import db, User, RefreshToken
+from user_cache import user_cache
 
-def generate_token(user_id):
+def generate_token(user_id, role=None):
     """Generate JWT token for user"""
     payload = {
         'exp': datetime.datetime.utcnow() + current_app.config['JWT_ACCESS_TOKEN_EXPIRES'],
         'iat': datetime.datetime.utcnow(),
         'sub': user_id
     }
+    # Lets role_required reject wrong-role requests before touching the database
+    if role:
+        payload['role'] = role
     return jwt.encode(
         payload,
         current_app.config['JWT_SECRET_KEY'],
         algorithm='HS256'
     )
 
+def hash_refresh_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def issue_refresh_token(user_id, family=None):
+    """Add a refresh token for the user to the session (the caller commits)
+    and return it. family is the login it continues; None starts a new one."""
+    now = datetime.datetime.utcnow()
+    # Expired tokens are only kept until the user's next login
+    if family is None:
+        RefreshToken.query.filter(
+            RefreshToken.user_id == user_id, RefreshToken.expires_at < now
+        ).delete(synchronize_session=False)
+    token = secrets.token_urlsafe(32)
+    db.session.add(RefreshToken(
+        token_hash=hash_refresh_token(token),
+        user_id=user_id,
+        family=family or secrets.token_hex(16),
+        expires_at=now + current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+    ))
+    return token
+
+def revoke_refresh_family(family):
+    RefreshToken.query.filter_by(family=family, revoked_at=None).update(
+        {'revoked_at': datetime.datetime.utcnow()}, synchronize_session=False
+    )
+
+def decode_request_token():
+    """Decode the bearer token once per request; returns (claims, error response)"""
+    if 'token_claims' in g:
+        return g.token_claims, None
+    
+    token = None
+    
+    # Get token from Authorization header
+    auth_header = request.headers.get('Authorization')
+    if auth_header:
+        try:
+            token = auth_header.split(" ")[1]
+        except IndexError:
+            return None, (jsonify({'message': 'Token is missing!'}), 401)
+    
+    if not token:
+        return None, (jsonify({'message': 'Token is missing!'}), 401)
+    
+    try:
+        g.token_claims = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        return None, (jsonify({'message': 'Token has expired!'}), 401)
+    except jwt.InvalidTokenError:
+        return None, (jsonify({'message': 'Invalid token!'}), 401)
+    
+    return g.token_claims, None
+
+def load_user(user_id):
+    """Fetch the user for a token, from the user cache when possible"""
+    user = user_cache.get(user_id)
+    if user is None:
+        user = User.query.get(user_id)
+        if user:
+            user_cache.put(user)
+    return user
+
 def token_required(f):
     """Decorator to require valid JWT token"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
+        data, error = decode_request_token()
+        if error:
+            return error
         
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if auth_header:
-            try:
-                token = auth_header.split(" ")[1]
-            except IndexError:
-                return jsonify({'message': 'Token is missing!'}), 401
+        current_user = load_user(data['sub'])
         
-        if not token:
-            return jsonify({'message': 'Token is missing!'}), 401
-        
-        try:
-            data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-            current_user = User.query.get(data['sub'])
-            
-            if not current_user or not current_user.active:
-                return jsonify({'message': 'User not found or inactive!'}), 401
-                
-        except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired!'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'message': 'Invalid token!'}), 401
+        if not current_user or not current_user.active:
+            return jsonify({'message': 'User not found or inactive!'}), 401
         
         return f(current_user, *args, **kwargs)
     
@@ -53,11 +105,20 @@ def token_required(f):
 def role_required(role):
     """Decorator to require specific role"""
     def decorator(f):
-        @wraps(f)
         @token_required
-        def decorated(current_user, *args, **kwargs):
+        def check_user_role(current_user, *args, **kwargs):
             if current_user.role != role:
                 return jsonify({'message': f'{role} access required!'}), 403
             return f(current_user, *args, **kwargs)
+        
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            data, error = decode_request_token()
+            if error:
+                return error
+            # Tokens carrying a role claim are rejected here with no DB work
+            if data.get('role', role) != role:
+                return jsonify({'message': f'{role} access required!'}), 403
+            return check_user_role(*args, **kwargs)
         return decorated
-    return decorator
\ No newline at end of file
+    return decorator
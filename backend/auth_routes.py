@@ -1,6 +1,17 @@
+from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app
-from models import db, User
-from auth import generate_token
+from models import db, User, RefreshToken
+from auth import (
+    generate_token, load_user,
+    hash_refresh_token, issue_refresh_token, revoke_refresh_family
+)
+from passwords import password_hasher
+from user_cache import user_cache
+from jobs import job_queue
+from response_cache import response_cache
+from database import pool_stats
+from replicas import wrote_as
+from metrics import metrics_token_required
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -27,13 +38,19 @@ def register():
     new_user.set_password(data['password'])
     
     db.session.add(new_user)
+    db.session.flush()
+    refresh_token = issue_refresh_token(new_user.id)
+    # No access token yet, so name the writer: their next reads use the primary
+    wrote_as(new_user.id)
     db.session.commit()
 
-    token = generate_token(new_user.id)
+    token = generate_token(new_user.id, new_user.role)
+    user_cache.put(new_user)
     
     return jsonify({
         'message': 'User registered successfully!',
         'token': token,
+        'refresh_token': refresh_token,
         'user': new_user.to_dict()
     }), 201
 
@@ -53,14 +70,71 @@ def login():
     if not user.active:
         return jsonify({'message': 'Account is deactivated!'}), 401
     
-    token = generate_token(user.id)
+    # The password is at hand only now: move it to the configured parameters
+    if password_hasher.needs_rehash(user.password_hash):
+        user.set_password(data['password'])
+        password_hasher.rehashed()
+    
+    refresh_token = issue_refresh_token(user.id)
+    wrote_as(user.id)
+    db.session.commit()
+    token = generate_token(user.id, user.role)
+    user_cache.put(user)
     
     return jsonify({
         'message': 'Login successful!',
         'token': token,
+        'refresh_token': refresh_token,
         'user': user.to_dict()
     }), 200
 
+@auth_bp.route('/refresh', methods=['POST'])
+def refresh():
+    """Exchange a refresh token for a new access token and the next refresh token"""
+    data = request.get_json(silent=True) or {}
+    if not data.get('refresh_token'):
+        return jsonify({'message': 'refresh_token is required!'}), 400
+    
+    now = datetime.utcnow()
+    stored = RefreshToken.query.filter_by(token_hash=hash_refresh_token(data['refresh_token'])).first()
+    if not stored or stored.expires_at <= now:
+        return jsonify({'message': 'Invalid refresh token!'}), 401
+    
+    wrote_as(stored.user_id)
+    # Conditional, so of two requests racing with one token only one rotates it
+    rotated = RefreshToken.query.filter_by(id=stored.id, revoked_at=None).update(
+        {'revoked_at': now}, synchronize_session=False
+    )
+    if not rotated:
+        # Already used: someone else holds a copy, so end the whole login
+        revoke_refresh_family(stored.family)
+        db.session.commit()
+        return jsonify({'message': 'Invalid refresh token!'}), 401
+    
+    user = load_user(stored.user_id)
+    if not user or not user.active:
+        db.session.commit()
+        return jsonify({'message': 'User not found or inactive!'}), 401
+    
+    refresh_token = issue_refresh_token(user.id, stored.family)
+    db.session.commit()
+    
+    return jsonify({
+        'token': generate_token(user.id, user.role),
+        'refresh_token': refresh_token
+    }), 200
+
+@auth_bp.route('/logout', methods=['POST'])
+def logout():
+    """Revoke the refresh token's login; access tokens run out on their own"""
+    data = request.get_json(silent=True) or {}
+    if data.get('refresh_token'):
+        stored = RefreshToken.query.filter_by(token_hash=hash_refresh_token(data['refresh_token'])).first()
+        if stored:
+            revoke_refresh_family(stored.family)
+            db.session.commit()
+    return jsonify({'message': 'Logged out.'}), 200
+
 @auth_bp.route('/me', methods=['GET'])
 def get_current_user():
     """Get current user info (requires token)"""
@@ -70,4 +144,29 @@ def get_current_user():
     def protected_route(current_user):
         return jsonify({'user': current_user.to_dict()}), 200
     
-    return protected_route()
\ No newline at end of file
+    return protected_route()
+
+@auth_bp.route('/cache-stats', methods=['GET'])
+@metrics_token_required
+def get_cache_stats():
+    """Hit/miss counters for the authenticated-user and response caches"""
+    return jsonify({'user_cache': user_cache.stats(), 'response_cache': response_cache.stats()}), 200
+
+@auth_bp.route('/job-stats', methods=['GET'])
+@metrics_token_required
+def get_job_stats():
+    """Background job queue depth and latency"""
+    return jsonify({'jobs': job_queue.stats()}), 200
+
+@auth_bp.route('/auth-stats', methods=['GET'])
+@metrics_token_required
+def get_auth_stats():
+    """Password hashing volume, latency (queueing included) and 503 rejections"""
+    return jsonify({'password_hashing': password_hasher.stats()}), 200
+
+@auth_bp.route('/db-stats', methods=['GET'])
+@metrics_token_required
+def get_db_stats():
+    """Connection pool size, usage and checkout waits per engine, and replica routing"""
+    replicas = current_app.extensions.get('replicas')
+    return jsonify({'pools': pool_stats(current_app), 'replicas': replicas.stats() if replicas else None}), 200
@@ -0,0 +1,182 @@
+"""Submissions and downloads under load: sync gunicorn (WSGI) vs. the
+ASGI mode in asgi.py.
+
+Run from the backend directory:
+
+    python -m benchmarks.asgi_vs_wsgi
+    python -m benchmarks.asgi_vs_wsgi --clients 1000 --rounds 3 --workers 4 --upload-kb 256
+    python -m benchmarks.asgi_vs_wsgi --database-url postgresql://localhost/classflow_bench
+
+Both servers run as separate processes with --workers processes each,
+against the same database and storage: gunicorn with sync workers serving
+app:create_app(), and uvicorn serving asgi:create_asgi_app. Every client is
+a student that, --rounds times, submits a file to a fresh assignment
+(POST /api/submissions) and downloads it back (GET /api/download/<id>),
+all clients at once. Reports throughput, per-route latency and errors.
+"""
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from benchmarks.common import percentile, create_bench_app, bulk_students, bulk_enroll
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    'gunicorn sync': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+        '--backlog', '2048', '--timeout', '300', '--log-level', 'warning', 'app:create_app()'
+    ],
+    'uvicorn asgi': lambda port, workers: [
+        sys.executable, '-m', 'uvicorn', '--factory', 'asgi:create_asgi_app', '--workers', str(workers),
+        '--port', str(port), '--backlog', '2048', '--log-level', 'warning', '--no-access-log'
+    ],
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=3, help='submit + download pairs per client')
+    parser.add_argument('--workers', type=int, default=4, help='server processes per variant')
+    parser.add_argument('--upload-kb', type=int, default=256)
+    parser.add_argument('--database-url', help='default: a throwaway SQLite file')
+    args = parser.parse_args()
+
+    # Uploaded blobs are written under the working directory; keep them out of the tree
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    app = create_bench_app(args.database_url)
+
+    from models import db, User, Subject, Assignment
+    from auth import generate_token
+
+    with app.app_context():
+        teacher = User(email='bench-teacher@classflow.com', role='teacher')
+        teacher.set_password('bench')
+        db.session.add(teacher)
+        db.session.flush()
+        subject = Subject(name='Load', teacher_id=teacher.id)
+        db.session.add(subject)
+        db.session.flush()
+        # A fresh set of assignments per variant, so nobody has submitted yet
+        assignments = {}
+        for name in SERVERS:
+            batch = [Assignment(subject_id=subject.id, title=f'{name} {i}',
+                                due_date=datetime.utcnow() + timedelta(days=7)) for i in range(args.rounds)]
+            db.session.add_all(batch)
+            db.session.flush()
+            assignments[name] = [assignment.id for assignment in batch]
+        db.session.commit()
+        student_ids = bulk_students(db, User, args.clients, teacher.password_hash)
+        bulk_enroll(db, subject.id, student_ids)
+        tokens = [generate_token(student_id, 'student') for student_id in student_ids]
+        database_url = str(db.engine.url.render_as_string(hide_password=False))
+
+    payload = os.urandom(args.upload_kb * 1024)
+    env = {**os.environ, 'DATABASE_URL': database_url, 'PYTHONPATH': BACKEND}
+
+    print(f"{args.clients} clients x {args.rounds} rounds of submit ({args.upload_kb} KB) + download, "
+          f"{args.workers} workers per server")
+    print(f"{'server':>14} {'ok':>6} {'errors':>7} {'wall s':>8} {'req/s':>8} "
+          f"{'submit p50/p99 ms':>18} {'download p50/p99 ms':>20}")
+    for name, command in SERVERS.items():
+        port = free_port()
+        server = subprocess.Popen(command(port, args.workers), cwd=workdir, env=env)
+        try:
+            wait_for_port(port)
+
+            def client(index):
+                headers = {'Authorization': f'Bearer {tokens[index]}'}
+                timings = {'submit': [], 'download': []}
+                errors = 0
+                for assignment_id in assignments[name]:
+                    status, body, duration = submit(port, headers, assignment_id, payload)
+                    timings['submit'].append(duration)
+                    if status != 201:
+                        errors += 1
+                        continue
+                    submission_id = body.split(b'"id":', 1)[1].split(b',', 1)[0].strip()
+                    status, received, duration = download(port, headers, int(submission_id))
+                    timings['download'].append(duration)
+                    if status != 200 or received != len(payload):
+                        errors += 1
+                return timings, errors
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clients) as pool:
+                results = list(pool.map(client, range(args.clients)))
+            wall = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait()
+
+        errors = sum(errors for _, errors in results)
+        submits = [t * 1000 for timings, _ in results for t in timings['submit']]
+        downloads = [t * 1000 for timings, _ in results for t in timings['download']] or [0]
+        total = len(submits) + len(downloads)
+        print(f"{name:>14} {total - errors:>6} {errors:>7} {wall:>8.2f} {total / wall:>8.1f} "
+              f"{percentile(submits, 50):>8.0f}/{percentile(submits, 99):<9.0f} "
+              f"{percentile(downloads, 50):>9.0f}/{percentile(downloads, 99):<10.0f}")
+    return 0
+
+def submit(port, headers, assignment_id, payload):
+    boundary = uuid.uuid4().hex
+    body = b''.join([
+        f'--{boundary}\r\nContent-Disposition: form-data; name="assignment_id"\r\n\r\n{assignment_id}\r\n'.encode(),
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="work.zip"\r\n'
+        f'Content-Type: application/zip\r\n\r\n'.encode(),
+        payload,
+        f'\r\n--{boundary}--\r\n'.encode()
+    ])
+    started = time.perf_counter()
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+        connection.request('POST', '/api/submissions', body=body, headers={
+            **headers, 'Content-Type': f'multipart/form-data; boundary={boundary}'
+        })
+        response = connection.getresponse()
+        status, data = response.status, response.read()
+        connection.close()
+    except OSError:
+        status, data = 0, b''
+    return status, data, time.perf_counter() - started
+
+def download(port, headers, submission_id):
+    started = time.perf_counter()
+    received = 0
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+        connection.request('GET', f'/api/download/{submission_id}', headers=headers)
+        response = connection.getresponse()
+        status = response.status
+        while chunk := response.read(64 * 1024):
+            received += len(chunk)
+        connection.close()
+    except OSError:
+        status = 0
+    return status, received, time.perf_counter() - started
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+def wait_for_port(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""GET /api/attendance/<subject_id> for a whole term: the grouped record
+list vs. ?format=matrix.
+
+Run from the backend directory:
+
+    python -m benchmarks.attendance_register
+    python -m benchmarks.attendance_register --students 30 --days 90 --runs 20
+
+Marks --students enrolled students on each of --days days and fetches the
+full range both ways, reporting response size, latency and the server CPU
+time per request (the test client runs the view in this process).
+"""
+import argparse
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+from benchmarks.common import percentile, create_bench_app, bulk_students, bulk_enroll
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='defaults to a throwaway SQLite file')
+    parser.add_argument('--students', type=int, default=30)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_bench_app(args.database_url)
+
+    from models import db, User, Subject, Attendance
+    from auth import generate_token
+
+    with app.app_context():
+        teacher = User(email='bench-teacher@classflow.com', role='teacher')
+        teacher.set_password('bench')
+        db.session.add(teacher)
+        db.session.flush()
+        subject = Subject(name='Register', teacher_id=teacher.id)
+        db.session.add(subject)
+        db.session.commit()
+        subject_id = subject.id
+        student_ids = bulk_students(db, User, args.students, teacher.password_hash)
+        bulk_enroll(db, subject_id, student_ids)
+        first_day = date(2024, 1, 1)
+        now = datetime.utcnow()
+        db.session.execute(Attendance.__table__.insert(), [
+            {'subject_id': subject_id, 'student_id': student_id, 'date': first_day + timedelta(days=d),
+             'status': 'PRESENT' if (student_id + d) % 7 else 'ABSENT', 'marked_at': now}
+            for d in range(args.days) for student_id in student_ids
+        ])
+        db.session.commit()
+        token = generate_token(teacher.id, teacher.role)
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    last_day = first_day + timedelta(days=args.days - 1)
+    query = f'start_date={first_day.isoformat()}&end_date={last_day.isoformat()}'
+
+    print(f"{app.config['SQLALCHEMY_DATABASE_URI']}")
+    print(f"{args.students} students x {args.days} days = {args.students * args.days} marks")
+    print(f"{'format':>8} {'bytes':>10} {'p50 ms':>10} {'p99 ms':>10} {'cpu ms':>10}")
+    for name, url in (('records', f'/api/attendance/{subject_id}?{query}'),
+                      ('matrix', f'/api/attendance/{subject_id}?{query}&format=matrix')):
+        samples = []
+        cpu = []
+        for _ in range(args.runs):
+            started, cpu_started = time.perf_counter(), time.process_time()
+            response = client.get(url, headers=headers)
+            body = response.get_data()
+            samples.append((time.perf_counter() - started) * 1000)
+            cpu.append((time.process_time() - cpu_started) * 1000)
+            if response.status_code != 200:
+                print(response.get_json(), file=sys.stderr)
+                return 1
+        print(f"{name:>8} {len(body):>10,} {percentile(samples, 50):>10.2f} {percentile(samples, 99):>10.2f} "
+              f"{statistics.mean(cpu):>10.2f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""Load test for the chunked upload API (POST/PUT /api/uploads...).
+
+Start the backend under the worker pool you want to measure, e.g.
+
+    gunicorn -w 4 --threads 8 'app:create_app()' -b 127.0.0.1:5000
+
+then, from the backend directory:
+
+    python -m benchmarks.chunked_upload_load --url http://127.0.0.1:5000 \\
+        --clients 200 --size-mb 50 --server-pid <gunicorn master pid>
+
+Each client registers a student, uploads one zip of --size-mb in
+--chunk-mb chunks and completes it. Reports per-upload latency
+percentiles, aggregate throughput and, with --server-pid, the peak RSS of
+that process and its children so constant worker memory can be checked.
+--serve runs the app in-process on a throwaway database instead.
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from benchmarks.common import percentile
+
+class Client:
+    def __init__(self, base_url, token=None):
+        self.url = urlparse(base_url)
+        self.token = token
+        self.connection = http.client.HTTPConnection(self.url.hostname, self.url.port, timeout=300)
+
+    def request(self, method, path, body=None, content_type='application/json'):
+        headers = {'Content-Type': content_type}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        if content_type == 'application/json' and body is not None:
+            body = json.dumps(body)
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        payload = response.read()
+        return response.status, json.loads(payload) if payload else None
+
+def rss_kb(pid):
+    """Resident memory of a process plus its direct children, in KiB"""
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    total = 0
+    for p in pids:
+        try:
+            with open(f'/proc/{p}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS'))
+        except (OSError, StopIteration):
+            pass
+    return total
+
+def serve_in_process():
+    """Run the app with Werkzeug's threaded server on a free port"""
+    from werkzeug.serving import make_server
+    from benchmarks.common import create_bench_app
+
+    app = create_bench_app()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--serve', action='store_true', help='start the app in-process')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--size-mb', type=float, default=50)
+    parser.add_argument('--chunk-mb', type=float, default=4)
+    parser.add_argument('--server-pid', type=int)
+    args = parser.parse_args()
+
+    base_url = serve_in_process() if args.serve else args.url
+    size = int(args.size_mb * 1024 * 1024)
+    chunk_size = int(args.chunk_mb * 1024 * 1024)
+    # One shared chunk of random bytes keeps client memory flat too
+    pattern = os.urandom(chunk_size)
+    run_id = uuid.uuid4().hex[:8]
+
+    setup = Client(base_url)
+    status, body = setup.request('POST', '/register', {
+        'email': f'load-teacher-{run_id}@classflow.com', 'password': 'load', 'role': 'teacher'
+    })
+    assert status == 201, body
+    setup.token = body['token']
+    status, body = setup.request('POST', '/api/subjects', {'name': f'Load test {run_id}'})
+    assert status == 201, body
+    boundary = uuid.uuid4().hex
+    form = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="subject_id"\r\n\r\n{body["subject"]["id"]}\r\n'
+        f'--{boundary}\r\nContent-Disposition: form-data; name="title"\r\n\r\nLoad test\r\n'
+        f'--{boundary}\r\nContent-Disposition: form-data; name="due_date"\r\n\r\n2099-01-01T00:00:00\r\n'
+        f'--{boundary}--\r\n'
+    )
+    status, body = setup.request('POST', '/api/assignments', form, f'multipart/form-data; boundary={boundary}')
+    assert status == 201, body
+    assignment_id = body['assignment']['id']
+    subject_id = body['assignment']['subject_id']
+
+    peak_rss = [rss_kb(args.server_pid) if args.server_pid else 0]
+    done = threading.Event()
+
+    def sample_memory():
+        while not done.wait(0.2):
+            peak_rss[0] = max(peak_rss[0], rss_kb(args.server_pid))
+
+    def upload(index):
+        client = Client(base_url)
+        status, body = client.request('POST', '/register', {
+            'email': f'load-student-{run_id}-{index}@classflow.com', 'password': 'load', 'role': 'student'
+        })
+        if status != 201:
+            return None, f'register {status}'
+        client.token = body['token']
+        teacher = Client(base_url)
+        teacher.token = setup.token
+        status, _ = teacher.request('POST', f'/api/subjects/{subject_id}/students',
+                                    {'student_ids': [body['user']['id']]})
+        if status != 201:
+            return None, f'enroll {status}'
+
+        started = time.perf_counter()
+        status, body = client.request('POST', '/api/uploads', {
+            'assignment_id': assignment_id, 'filename': f'load-{index}.zip', 'size': size
+        })
+        if status != 201:
+            return None, f'initiate {status} {body}'
+        upload_id = body['upload_id']
+
+        hasher = hashlib.sha256()
+        offset = 0
+        while offset < size:
+            chunk = pattern[:min(chunk_size, size - offset)]
+            hasher.update(chunk)
+            status, body = client.request('PUT', f'/api/uploads/{upload_id}?offset={offset}',
+                                          chunk, 'application/octet-stream')
+            if status != 200:
+                return None, f'chunk {status} {body}'
+            offset = body['received_bytes']
+
+        status, body = client.request('POST', f'/api/uploads/{upload_id}/complete',
+                                      {'sha256': hasher.hexdigest()})
+        if status != 201:
+            return None, f'complete {status} {body}'
+        return time.perf_counter() - started, None
+
+    if args.server_pid:
+        threading.Thread(target=sample_memory, daemon=True).start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        results = list(pool.map(upload, range(args.clients)))
+    elapsed = time.perf_counter() - started
+    done.set()
+
+    durations = [duration for duration, error in results if error is None]
+    errors = [error for _, error in results if error is not None]
+    print(f"{base_url}: {args.clients} clients x {args.size_mb} MB in {args.chunk_mb} MB chunks")
+    print(f"completed {len(durations)}, failed {len(errors)}, wall {elapsed:.1f} s, "
+          f"throughput {len(durations) * size / elapsed / 1024 / 1024:.1f} MB/s")
+    if durations:
+        print(f"upload latency p50 {percentile(durations, 50):.2f} s, p99 {percentile(durations, 99):.2f} s, "
+              f"mean {statistics.mean(durations):.2f} s")
+    if args.server_pid:
+        print(f"peak server RSS {peak_rss[0] / 1024:.1f} MB")
+    for error in errors[:10]:
+        print(f"  {error}")
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
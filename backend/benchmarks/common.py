@@ -0,0 +1,46 @@
+"""Shared helpers for the benchmark scripts."""
+import os
+import tempfile
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def create_bench_app(database_url=None):
+    """Create the app against `database_url` (default: a throwaway SQLite file)
+    with an empty, freshly created schema."""
+    os.environ['DATABASE_URL'] = database_url or 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'bench.db'
+    )
+
+    from app import create_app
+    from models import db
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+def bulk_students(db, User, count, password_hash, prefix='bench-student'):
+    """Insert `count` students sharing one password hash; hashing thousands
+    of passwords would dominate setup time. Returns their ids."""
+    db.session.execute(User.__table__.insert(), [
+        {'email': f'{prefix}-{i}@classflow.com', 'password_hash': password_hash,
+         'role': 'student', 'active': True}
+        for i in range(count)
+    ])
+    db.session.commit()
+    return [row.id for row in db.session.query(User.id)
+            .filter(User.email.like(f'{prefix}-%')).order_by(User.id)]
+
+def bulk_enroll(db, subject_id, student_ids):
+    """Put students on a subject's roster; student routes refuse subjects
+    the student is not enrolled in."""
+    from models import Enrollment
+
+    db.session.execute(Enrollment.__table__.insert(), [
+        {'subject_id': subject_id, 'student_id': student_id} for student_id in student_ids
+    ])
+    db.session.commit()
@@ -0,0 +1,167 @@
+"""Throughput and worker occupancy of GET /api/download/<id>, with and
+without DOWNLOAD_OFFLOAD.
+
+Run from the backend directory:
+
+    python -m benchmarks.download_offload
+    python -m benchmarks.download_offload --clients 1000 --size-mb 4 --files 20
+
+Each variant forks a threaded Werkzeug server. Worker occupancy is the
+time a request holds a worker, from request start until the response body
+is closed, and the CPU time the server process spent. In offload mode the
+benchmark plays the front proxy: it resolves X-Accel-Redirect against
+STORAGE_ROOT and reads the file itself, as nginx would, so both variants
+deliver the same bytes to the client.
+"""
+import argparse
+import http.client
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import threading
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from werkzeug.wsgi import ClosingIterator
+from benchmarks.common import percentile, create_bench_app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--size-mb', type=float, default=4)
+    parser.add_argument('--files', type=int, default=20, help='distinct submissions downloaded')
+    args = parser.parse_args()
+
+    # Seeded blobs are written under the working directory; keep them out of the tree
+    os.chdir(tempfile.mkdtemp())
+    app = create_bench_app()
+
+    from models import db, User, Subject, Assignment, Submission
+    from auth import generate_token
+    from storage import store_file
+    from uploads import temporary_path, file_sha256
+
+    size = int(args.size_mb * 1024 * 1024)
+    with app.app_context():
+        teacher = User(email='bench-teacher@classflow.com', role='teacher')
+        teacher.set_password('bench')
+        db.session.add(teacher)
+        db.session.flush()
+        subject = Subject(name='Downloads', teacher_id=teacher.id)
+        db.session.add(subject)
+        db.session.flush()
+        submission_ids = []
+        for i in range(args.files):
+            student = User(email=f'bench-student-{i}@classflow.com', role='student',
+                           password_hash=teacher.password_hash)
+            assignment = Assignment(subject_id=subject.id, title=f'Assignment {i}',
+                                    due_date=datetime.utcnow())
+            db.session.add_all([student, assignment])
+            db.session.flush()
+            path = temporary_path()
+            with open(path, 'wb') as f:
+                f.write(os.urandom(size))
+            digest = file_sha256(path)
+            submission = Submission(assignment_id=assignment.id, student_id=student.id,
+                                    blob_key=store_file(path, digest), filename=f'work-{i}.zip', sha256=digest)
+            db.session.add(submission)
+            db.session.flush()
+            submission_ids.append(submission.id)
+        db.session.commit()
+        token = generate_token(teacher.id, teacher.role)
+        storage_root = app.extensions['storage'].root
+
+    prefix = app.config['DOWNLOAD_ACCEL_PREFIX']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    print(f"{args.clients} concurrent downloads of {args.files} files x {args.size_mb} MB")
+    print(f"{'offload':>10} {'ok':>6} {'wall s':>8} {'MB/s':>8} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'busy/req ms':>12} {'worker CPU s':>13}")
+    for offload in ('', 'x-accel'):
+        port, stop, report, server = start_server(app, offload, args.clients)
+
+        def download(index):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+            started = time.perf_counter()
+            connection.request('GET', f'/api/download/{submission_ids[index % len(submission_ids)]}',
+                               headers=headers)
+            response = connection.getresponse()
+            received = drain(response)
+            accel = response.getheader('X-Accel-Redirect')
+            connection.close()
+            if accel:
+                # What the proxy does with the internal redirect
+                with open(os.path.join(storage_root, accel[len(prefix):]), 'rb') as f:
+                    received += drain(f)
+            return time.perf_counter() - started, response.status == 200 and received == size
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            results = list(pool.map(download, range(args.clients)))
+        wall = time.perf_counter() - started
+        stop.set()
+        busy, cpu = report.get()
+        server.join()
+
+        latencies = [duration * 1000 for duration, _ in results]
+        ok = sum(1 for _, success in results if success)
+        print(f"{offload or 'off':>10} {ok:>6} {wall:>8.2f} {ok * size / wall / 1024 / 1024:>8.1f} "
+              f"{percentile(latencies, 50):>9.1f} {percentile(latencies, 99):>9.1f} "
+              f"{statistics.mean(busy) * 1000:>12.2f} {cpu:>13.2f}")
+    return 0
+
+def drain(stream):
+    received = 0
+    while True:
+        chunk = stream.read(64 * 1024)
+        if not chunk:
+            return received
+        received += len(chunk)
+
+def start_server(app, offload, backlog):
+    """Fork a threaded Werkzeug server for app with DOWNLOAD_OFFLOAD=offload.
+    Returns (port, stop event, report queue, process); on stop the server
+    puts (per-request busy seconds, CPU seconds used) on the queue."""
+    ready, report, stop = multiprocessing.Queue(), multiprocessing.Queue(), multiprocessing.Event()
+
+    def serve():
+        from werkzeug.serving import make_server
+        from models import db
+
+        app.config['DOWNLOAD_OFFLOAD'] = offload
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+        busy = []
+        busy_lock = threading.Lock()
+        wsgi_app = app.wsgi_app
+
+        def timed(environ, start_response):
+            started = time.perf_counter()
+
+            def record():
+                with busy_lock:
+                    busy.append(time.perf_counter() - started)
+            # Closed once the server has written the whole body
+            return ClosingIterator(wsgi_app(environ, start_response), record)
+        app.wsgi_app = timed
+
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        server.socket.listen(backlog)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        cpu_started = time.process_time()
+        ready.put(server.server_port)
+        stop.wait()
+        server.shutdown()
+        report.put((busy, time.process_time() - cpu_started))
+
+    process = multiprocessing.get_context('fork').Process(target=serve)
+    process.start()
+    return ready.get(), stop, report, process
+
+if __name__ == '__main__':
+    sys.exit(main())
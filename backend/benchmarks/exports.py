@@ -0,0 +1,97 @@
+"""Streaming CSV/XLSX exports (exports.py): time, size and peak memory.
+
+Run from the backend directory:
+
+    python -m benchmarks.exports
+    python -m benchmarks.exports --students 500 --days 180 --assignments 40
+
+Fills one subject with --students enrolled students, --days days of
+attendance and --assignments assignments each submitted by most students,
+then downloads the attendance register and the gradebook in both formats,
+reading the streamed body chunk by chunk. Peak memory is the tracemalloc
+peak while serving (the test client runs the view in this process); the
+full-range JSON attendance response is shown for comparison.
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from benchmarks.common import create_bench_app, bulk_students, bulk_enroll
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='defaults to a throwaway SQLite file')
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--assignments', type=int, default=30)
+    args = parser.parse_args()
+
+    app = create_bench_app(args.database_url)
+
+    from models import db, User, Subject, Assignment, Submission, Attendance
+    from auth import generate_token
+
+    with app.app_context():
+        teacher = User(email='bench-teacher@classflow.com', role='teacher')
+        teacher.set_password('bench')
+        db.session.add(teacher)
+        db.session.flush()
+        subject = Subject(name='Exports', teacher_id=teacher.id)
+        db.session.add(subject)
+        db.session.commit()
+        subject_id = subject.id
+        student_ids = bulk_students(db, User, args.students, teacher.password_hash)
+        bulk_enroll(db, subject_id, student_ids)
+        first_day = date(2024, 1, 1)
+        now = datetime.utcnow()
+        db.session.execute(Attendance.__table__.insert(), [
+            {'subject_id': subject_id, 'student_id': student_id, 'date': first_day + timedelta(days=d),
+             'status': 'PRESENT' if (student_id + d) % 7 else 'ABSENT', 'marked_at': now}
+            for d in range(args.days) for student_id in student_ids
+        ])
+        db.session.execute(Assignment.__table__.insert(), [
+            {'subject_id': subject_id, 'title': f'Assignment {a}', 'description': '',
+             'due_date': datetime(2024, 1, 8) + timedelta(days=7 * a), 'created_at': now}
+            for a in range(args.assignments)
+        ])
+        assignments = db.session.query(Assignment.id, Assignment.due_date).filter_by(subject_id=subject_id).all()
+        db.session.execute(Submission.__table__.insert(), [
+            {'assignment_id': assignment_id, 'student_id': student_id, 'file_path': '0' * 64,
+             'filename': 'work.pdf', 'grade': 'B' if student_id % 3 else None,
+             'submitted_at': due_date + timedelta(hours=(student_id % 5) - 3)}
+            for assignment_id, due_date in assignments for student_id in student_ids
+            if (student_id + assignment_id) % 10
+        ])
+        db.session.commit()
+        token = generate_token(teacher.id, teacher.role)
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    print(f"{app.config['SQLALCHEMY_DATABASE_URI']}")
+    print(f"{args.students} students, {args.students * args.days} attendance marks, "
+          f"{args.assignments} assignments")
+    print(f"{'download':>20} {'bytes':>12} {'seconds':>9} {'peak MB':>9}")
+    for name, url in (
+        ('attendance JSON', f'/api/attendance/{subject_id}'),
+        ('attendance csv', f'/api/attendance/{subject_id}/export?format=csv'),
+        ('attendance xlsx', f'/api/attendance/{subject_id}/export?format=xlsx'),
+        ('gradebook csv', f'/api/subjects/{subject_id}/gradebook/export?format=csv'),
+        ('gradebook xlsx', f'/api/subjects/{subject_id}/gradebook/export?format=xlsx'),
+    ):
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = client.get(url, headers=headers, buffered=False)
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if response.status_code != 200:
+            print(f'{name}: {response.status_code}', file=sys.stderr)
+            return 1
+        print(f"{name:>20} {size:>12,} {elapsed:>9.2f} {peak / 1024 / 1024:>9.1f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
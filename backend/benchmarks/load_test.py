@@ -0,0 +1,359 @@
+"""End-to-end load test replaying the frontend's call patterns against a
+seeded database, with per-endpoint throughput and latency percentiles.
+
+Run from the backend directory, against the database seed.py filled:
+
+    python seed.py --students 5000 --subjects 200 --reset
+    python -m benchmarks.load_test --users 50 --duration 60 --output baseline.json
+    # ... change the backend ...
+    python -m benchmarks.load_test --users 50 --duration 60 --baseline baseline.json
+
+By default gunicorn is started on DATABASE_URL (--workers sync workers, or
+gthread with --threads); --url targets a server that is already running,
+which must share DATABASE_URL and JWT_SECRET_KEY with this script.
+
+Each of --users virtual users repeatedly opens one page of the frontend,
+chosen by PAGES weight, and makes the requests that page's view makes
+(see frontend/src/views and services/api.js), as a teacher or student
+sampled from the seeded school. Access tokens are minted directly, so
+only the 'login' page pays for password hashing. Some pages write:
+grades, today's attendance and new submissions, so reseed (--reset)
+before recording a baseline that later runs are compared with.
+
+Latency is measured per request and grouped by endpoint (method and URL
+pattern). Requests answered with 4xx/5xx count as errors. --output writes
+the results as JSON; --baseline prints the change in throughput and p95
+against such a file.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from urllib.parse import urlsplit, urlencode
+from benchmarks.common import percentile
+from benchmarks.asgi_vs_wsgi import BACKEND, free_port, wait_for_port
+
+DOMAIN = 'school.classflow.com'
+
+class Client:
+    """One virtual user's keep-alive connection and its samples"""
+
+    def __init__(self, host, port, samples):
+        self.host = host
+        self.port = port
+        self.samples = samples
+        self.connection = None
+        self.token = None
+
+    def call(self, label, method, path, params=None, payload=None, body=None, headers=None):
+        if params:
+            path = f'{path}?{urlencode(params)}'
+        headers = dict(headers or {})
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        if payload is not None:
+            body = json.dumps(payload)
+            headers['Content-Type'] = 'application/json'
+        started = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=300)
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            status, data = response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            if self.connection is not None:
+                self.connection.close()
+            self.connection = None
+            status, data = 0, b''
+        self.samples[label].append((status, time.perf_counter() - started))
+        if 200 <= status < 300 and data[:1] in (b'{', b'['):
+            return json.loads(data)
+        return None
+
+class School:
+    """Identities and ids sampled from the seeded database"""
+
+    def __init__(self, teachers, students, today):
+        self.teachers = teachers  # [{id, token, subjects: {subject_id: {roster, assignments}}}]
+        self.students = students  # [{id, email, token, subjects, open_assignments}]
+        self.today = today
+        self.lock = threading.Lock()
+
+def load_school(app, sample):
+    from sqlalchemy import select, func
+    from models import db, User, Subject, Enrollment, Assignment, Submission
+    from auth import generate_token
+
+    with app.app_context():
+        teacher_ids = db.session.scalars(
+            select(User.id).where(User.role == 'teacher', User.email.like(f'%@{DOMAIN}'))
+            .order_by(func.random()).limit(sample)
+        ).all()
+        if not teacher_ids:
+            raise SystemExit(f'No seeded users @{DOMAIN}; run seed.py first')
+        teachers = []
+        students = {}
+        for teacher_id in teacher_ids:
+            subjects = {}
+            for subject_id in db.session.scalars(select(Subject.id).where(Subject.teacher_id == teacher_id)):
+                roster = db.session.scalars(
+                    select(Enrollment.student_id).where(Enrollment.subject_id == subject_id)
+                ).all()
+                assignments = db.session.scalars(
+                    select(Assignment.id).where(Assignment.subject_id == subject_id)
+                ).all()
+                subjects[subject_id] = {'roster': roster, 'assignments': assignments}
+                for student_id in roster:
+                    students.setdefault(student_id, set()).add(subject_id)
+            teachers.append({'id': teacher_id, 'token': generate_token(teacher_id, 'teacher'), 'subjects': subjects})
+
+        emails = dict(db.session.execute(select(User.id, User.email).where(User.id.in_(students))).all())
+        submitted = set(db.session.execute(
+            select(Submission.student_id, Submission.assignment_id).where(Submission.student_id.in_(students))
+        ).all())
+        upcoming = db.session.execute(
+            select(Assignment.id, Assignment.subject_id)
+            .where(Assignment.subject_id.in_({s for subjects in students.values() for s in subjects}),
+                   Assignment.due_date > datetime.utcnow())
+        ).all()
+        student_list = []
+        for student_id, subject_ids in students.items():
+            student_list.append({
+                'id': student_id,
+                'email': emails[student_id],
+                'token': generate_token(student_id, 'student'),
+                'subjects': sorted(subject_ids),
+                'open_assignments': [assignment_id for assignment_id, subject_id in upcoming
+                                     if subject_id in subject_ids and (student_id, assignment_id) not in submitted]
+            })
+    return School(teachers, student_list, date.today())
+
+def items_of(response):
+    """Rows of a list response; the frontend asks for the unpaginated bare array"""
+    return response if isinstance(response, list) else (response or {}).get('items') or []
+
+# Pages: the requests each view issues when opened (frontend/src/views)
+
+def student_dashboard(client, school, student, rng):
+    client.call('GET /api/student/dashboard', 'GET', '/api/student/dashboard')
+
+def student_assignments(client, school, student, rng):
+    client.call('GET /api/student/subjects', 'GET', '/api/student/subjects')
+    for subject_id in student['subjects']:
+        client.call('GET /api/student/assignments/<subject_id>', 'GET', f'/api/student/assignments/{subject_id}')
+
+def student_submissions(client, school, student, rng):
+    page = client.call('GET /api/my-submissions', 'GET', '/api/my-submissions')
+    items = items_of(page)
+    if items:
+        submission = rng.choice(items)
+        client.call('GET /api/download/<submission_id>', 'GET', f"/api/download/{submission['id']}")
+
+def student_attendance(client, school, student, rng):
+    client.call('GET /api/student/subjects', 'GET', '/api/student/subjects')
+    client.call('GET /api/my-attendance', 'GET', '/api/my-attendance',
+                params={'subject_id': rng.choice(student['subjects'])})
+
+def student_submit(client, school, student, rng, payload=b''):
+    with school.lock:
+        if not student['open_assignments']:
+            return
+        assignment_id = student['open_assignments'].pop()
+    boundary = uuid.uuid4().hex
+    body = b''.join([
+        f'--{boundary}\r\nContent-Disposition: form-data; name="assignment_id"\r\n\r\n{assignment_id}\r\n'.encode(),
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="work.pdf"\r\n'
+        f'Content-Type: application/pdf\r\n\r\n'.encode(),
+        payload,
+        f'\r\n--{boundary}--\r\n'.encode()
+    ])
+    client.call('POST /api/submissions', 'POST', '/api/submissions', body=body,
+                headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+
+def login(client, school, student, rng):
+    token = client.token
+    client.token = None
+    client.call('POST /login', 'POST', '/login', payload={'email': student['email'], 'password': 'student123'})
+    client.token = token
+
+def teacher_dashboard(client, school, teacher, rng):
+    client.call('GET /api/subjects', 'GET', '/api/subjects')
+    client.call('GET /api/students', 'GET', '/api/students')
+
+def teacher_assignments(client, school, teacher, rng):
+    client.call('GET /api/subjects', 'GET', '/api/subjects')
+    for subject_id in teacher['subjects']:
+        client.call('GET /api/assignments/<subject_id>', 'GET', f'/api/assignments/{subject_id}')
+
+def teacher_review(client, school, teacher, rng):
+    subject = rng.choice(list(teacher['subjects'].values()))
+    assignment_id = rng.choice(subject['assignments'])
+    page = client.call('GET /api/assignments/<id>/submissions', 'GET',
+                       f'/api/assignments/{assignment_id}/submissions')
+    items = items_of(page)
+    if items:
+        client.call('PUT /api/submissions/<id>/grade', 'PUT', f"/api/submissions/{rng.choice(items)['id']}/grade",
+                    payload={'grade': rng.choice('ABCDF'), 'feedback': 'Reviewed under load.'})
+
+def teacher_attendance(client, school, teacher, rng):
+    client.call('GET /api/subjects', 'GET', '/api/subjects')
+    client.call('GET /api/students', 'GET', '/api/students')
+    subject_id = rng.choice(list(teacher['subjects']))
+    client.call('GET /api/attendance/<subject_id>', 'GET', f'/api/attendance/{subject_id}', params={
+        'start_date': (school.today - timedelta(days=14)).isoformat(), 'end_date': school.today.isoformat()
+    })
+    client.call('POST /api/attendance/mark', 'POST', '/api/attendance/mark', payload={
+        'subject_id': subject_id,
+        'date': school.today.isoformat(),
+        'attendance_records': [{'student_id': student_id, 'status': 'PRESENT' if rng.random() < 0.9 else 'ABSENT'}
+                               for student_id in teacher['subjects'][subject_id]['roster']]
+    })
+
+# (page, role, weight): students open pages far more often than teachers
+PAGES = [
+    (student_dashboard, 'student', 30),
+    (student_assignments, 'student', 15),
+    (student_submissions, 'student', 10),
+    (student_attendance, 'student', 10),
+    (student_submit, 'student', 3),
+    (login, 'student', 2),
+    (teacher_dashboard, 'teacher', 8),
+    (teacher_assignments, 'teacher', 6),
+    (teacher_review, 'teacher', 6),
+    (teacher_attendance, 'teacher', 4),
+]
+
+def summarize(samples, wall):
+    def stats(entries):
+        latencies = [duration * 1000 for _, duration in entries]
+        return {
+            'requests': len(entries),
+            'rps': round(len(entries) / wall, 2),
+            'errors': sum(1 for status, _ in entries if not 200 <= status < 400),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(max(latencies), 2),
+        }
+    endpoints = {label: stats(entries) for label, entries in sorted(samples.items()) if entries}
+    everything = [entry for entries in samples.values() for entry in entries]
+    return {'endpoints': endpoints, 'total': stats(everything) if everything else None}
+
+def print_report(results, baseline=None):
+    header = f"{'endpoint':<38} {'requests':>8} {'req/s':>8} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>9}"
+    if baseline:
+        header += f" {'req/s vs base':>13} {'p95 vs base':>12}"
+    print(header)
+    rows = list(results['endpoints'].items()) + [('total', results['total'])]
+    base_rows = {**(baseline or {}).get('endpoints', {}), 'total': (baseline or {}).get('total')}
+    for label, row in rows:
+        line = (f"{label:<38} {row['requests']:>8} {row['rps']:>8.1f} {row['errors']:>6} {row['p50_ms']:>8.1f} "
+                f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>9.1f}")
+        base = base_rows.get(label) if baseline else None
+        if base:
+            change = lambda now, then: f"{(now - then) / then * 100:+.0f}%" if then else 'n/a'
+            line += f" {change(row['rps'], base['rps']):>13} {change(row['p95_ms'], base['p95_ms']):>12}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=60, help='seconds')
+    parser.add_argument('--think', type=float, default=0, help='seconds a user pauses between pages')
+    parser.add_argument('--sample', type=int, default=20, help='teachers (and their students) to act as')
+    parser.add_argument('--url', help='a running server; default starts gunicorn')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn processes')
+    parser.add_argument('--threads', type=int, default=1, help='threads per gunicorn process (gthread if > 1)')
+    parser.add_argument('--upload-kb', type=int, default=64)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with results from an earlier --output')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    app = create_app()
+    school = load_school(app, args.sample)
+    with app.app_context():
+        from models import db
+        database_url = db.engine.url.render_as_string(hide_password=False)
+    weights = [weight for _, _, weight in PAGES]
+    payload = os.urandom(args.upload_kb * 1024)
+
+    server = None
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        host, port = '127.0.0.1', free_port()
+        server = subprocess.Popen([
+            sys.executable, '-m', 'gunicorn', '--workers', str(args.workers), '--threads', str(args.threads),
+            '--bind', f'{host}:{port}', '--backlog', '2048', '--timeout', '300', '--log-level', 'warning',
+            'app:create_app()'
+        ], cwd=os.getcwd(), env={**os.environ, 'DATABASE_URL': database_url, 'PYTHONPATH': BACKEND})
+
+    print(f"{database_url}: {len(school.teachers)} teachers, {len(school.students)} students sampled; "
+          f"{args.users} users for {args.duration:.0f}s")
+    samples = defaultdict(list)
+    try:
+        if server:
+            wait_for_port(port)
+        deadline = time.monotonic() + args.duration
+
+        def virtual_user(index):
+            rng = random.Random(args.seed * 100003 + index)
+            client = Client(host, port, defaultdict(list))
+            while time.monotonic() < deadline:
+                page, role, _ = rng.choices(PAGES, weights)[0]
+                identity = rng.choice(school.students if role == 'student' else school.teachers)
+                client.token = identity['token']
+                if page is student_submit:
+                    page(client, school, identity, rng, payload)
+                else:
+                    page(client, school, identity, rng)
+                if args.think:
+                    time.sleep(args.think)
+            return client.samples
+
+        threads_samples = []
+        started = time.perf_counter()
+        workers = [threading.Thread(target=lambda i=i: threads_samples.append(virtual_user(i)))
+                   for i in range(args.users)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        wall = time.perf_counter() - started
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    for user_samples in threads_samples:
+        for label, entries in user_samples.items():
+            samples[label].extend(entries)
+    results = summarize(samples, wall)
+    results['config'] = {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')}
+    results['recorded_at'] = datetime.utcnow().isoformat()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
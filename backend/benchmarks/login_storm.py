@@ -0,0 +1,144 @@
+"""A burst of logins, as at the start of a class: password hashing on the
+request threads vs. the bounded hashing pool in passwords.py.
+
+Run from the backend directory:
+
+    python -m benchmarks.login_storm
+    python -m benchmarks.login_storm --logins 2000 --clients 200 --workers 2 --threads 16
+    python -m benchmarks.login_storm --method pbkdf2:sha256:50000   # cheaper hashes, quicker runs
+
+Each variant runs gunicorn with --workers gthread workers of --threads
+threads: 'inline' with PASSWORD_HASH_WORKERS=0, 'pool' with the default
+hashing pool. --clients threads send --logins POST /login requests between
+them (a 503 is retried after its Retry-After) while --probes other clients
+load GET /api/student/dashboard, an endpoint that does no hashing, back to
+back. Reports logins/sec, 503s and login latency, and the probe latency
+during the burst, which is what the pool exists to protect.
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash
+from benchmarks.common import percentile, create_bench_app, bulk_students
+from benchmarks.asgi_vs_wsgi import BACKEND, free_port, wait_for_port
+
+PASSWORD = 'bench-password'
+
+VARIANTS = {
+    'inline': {'PASSWORD_HASH_WORKERS': '0'},
+    'pool': {},
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=200, help='concurrent login clients')
+    parser.add_argument('--probes', type=int, default=4, help='concurrent dashboard clients')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn processes')
+    parser.add_argument('--threads', type=int, default=16, help='threads per gunicorn process')
+    parser.add_argument('--method', help='PASSWORD_HASH_METHOD (default: the configured one)')
+    parser.add_argument('--database-url', help='default: a throwaway SQLite file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    if args.method:
+        os.environ['PASSWORD_HASH_METHOD'] = args.method
+    app = create_bench_app(args.database_url)
+
+    from models import db, User
+    from auth import generate_token
+
+    with app.app_context():
+        method = app.config['PASSWORD_HASH_METHOD']
+        password_hash = generate_password_hash(PASSWORD, method)
+        student_ids = bulk_students(db, User, args.logins, password_hash)
+        probe_token = generate_token(student_ids[0], 'student')
+        database_url = str(db.engine.url.render_as_string(hide_password=False))
+
+    emails = [f'bench-student-{i}@classflow.com' for i in range(args.logins)]
+    env = {**os.environ, 'DATABASE_URL': database_url, 'PYTHONPATH': BACKEND}
+
+    print(f"{args.logins} logins from {args.clients} clients, {args.probes} dashboard probes, "
+          f"{args.workers} workers x {args.threads} threads, {method}")
+    print(f"{'variant':>8} {'logins/s':>9} {'503s':>6} {'errors':>7} {'login p50/p99 ms':>17} "
+          f"{'probe p50/p99 ms':>17} {'idle probe p50':>15}")
+    for name, overrides in VARIANTS.items():
+        port = free_port()
+        server = subprocess.Popen([
+            sys.executable, '-m', 'gunicorn', '--worker-class', 'gthread', '--workers', str(args.workers),
+            '--threads', str(args.threads), '--bind', f'127.0.0.1:{port}', '--backlog', '2048',
+            '--timeout', '300', '--log-level', 'warning', 'app:create_app()'
+        ], cwd=workdir, env={**env, **overrides})
+        try:
+            wait_for_port(port)
+            probe_headers = {'Authorization': f'Bearer {probe_token}'}
+            idle = [request(port, 'GET', '/api/student/dashboard', headers=probe_headers)[1] for _ in range(50)]
+
+            done = threading.Event()
+            probe_samples = []
+
+            def probe():
+                while not done.is_set():
+                    status, duration = request(port, 'GET', '/api/student/dashboard', headers=probe_headers)
+                    probe_samples.append(duration)
+
+            def login(email):
+                rejected = 0
+                started = time.perf_counter()
+                while True:
+                    status, _ = request(port, 'POST', '/login', {'email': email, 'password': PASSWORD})
+                    if status != 503:
+                        return status, rejected, time.perf_counter() - started
+                    rejected += 1
+                    time.sleep(2)
+
+            probes = [threading.Thread(target=probe) for _ in range(args.probes)]
+            for thread in probes:
+                thread.start()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clients) as pool:
+                results = list(pool.map(login, emails))
+            wall = time.perf_counter() - started
+            done.set()
+            for thread in probes:
+                thread.join()
+        finally:
+            server.terminate()
+            server.wait()
+
+        ok = sum(1 for status, _, _ in results if status == 200)
+        rejected = sum(rejected for _, rejected, _ in results)
+        logins = [duration * 1000 for _, _, duration in results]
+        probed = [duration * 1000 for duration in probe_samples] or [0]
+        idle = [duration * 1000 for duration in idle]
+        print(f"{name:>8} {ok / wall:>9.1f} {rejected:>6} {len(results) - ok:>7} "
+              f"{percentile(logins, 50):>8.0f}/{percentile(logins, 99):<8.0f} "
+              f"{percentile(probed, 50):>8.0f}/{percentile(probed, 99):<8.0f} {percentile(idle, 50):>15.1f}")
+    return 0
+
+def request(port, method, path, payload=None, headers=None):
+    started = time.perf_counter()
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+        body = json.dumps(payload) if payload is not None else None
+        connection.request(method, path, body=body, headers={
+            **(headers or {}), **({'Content-Type': 'application/json'} if body else {})
+        })
+        response = connection.getresponse()
+        status = response.status
+        response.read()
+        connection.close()
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - started
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Latency benchmark for POST /api/attendance/mark.
+
+Run from the backend directory:
+
+    python -m benchmarks.mark_attendance
+    python -m benchmarks.mark_attendance --database-url postgresql://localhost/classflow_bench
+
+Reports p50/p99 latency for 50, 500 and 5000 record payloads.
+"""
+import argparse
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from benchmarks.common import percentile, create_bench_app, bulk_students, bulk_enroll
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='defaults to a throwaway SQLite file')
+    parser.add_argument('--sizes', default='50,500,5000')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    app = create_bench_app(args.database_url)
+
+    from models import db, User, Subject
+
+    with app.app_context():
+        teacher = User(email='bench-teacher@classflow.com', role='teacher')
+        teacher.set_password('bench')
+        db.session.add(teacher)
+        db.session.flush()
+        subject = Subject(name='Benchmark', teacher_id=teacher.id)
+        db.session.add(subject)
+        db.session.commit()
+        subject_id = subject.id
+
+        student_ids = bulk_students(db, User, max(sizes), teacher.password_hash)
+        bulk_enroll(db, subject_id, student_ids)
+
+    client = app.test_client()
+    token = client.post('/login', json={
+        'email': 'bench-teacher@classflow.com', 'password': 'bench'
+    }).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    print(f"{app.config['SQLALCHEMY_DATABASE_URI']}")
+    print(f"{'records':>8} {'p50 ms':>10} {'p99 ms':>10} {'mean ms':>10}")
+    day = date(2024, 1, 1)
+    for size in sizes:
+        samples = []
+        for run in range(args.runs):
+            # Alternate fresh days (inserts) with re-marking the previous day (updates)
+            if run % 2 == 0:
+                day += timedelta(days=1)
+            payload = {
+                'subject_id': subject_id,
+                'date': day.isoformat(),
+                'attendance_records': [
+                    {'student_id': student_id, 'status': 'PRESENT' if (student_id + run) % 3 else 'ABSENT'}
+                    for student_id in student_ids[:size]
+                ]
+            }
+            started = time.perf_counter()
+            response = client.post('/api/attendance/mark', json=payload, headers=headers)
+            samples.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 201:
+                print(response.get_json(), file=sys.stderr)
+                return 1
+        print(f"{size:>8} {percentile(samples, 50):>10.2f} {percentile(samples, 99):>10.2f} "
+              f"{statistics.mean(samples):>10.2f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Sustained message throughput of push_server.py with many connected clients.
+
+Run from the backend directory:
+
+    python -m benchmarks.push_throughput
+    python -m benchmarks.push_throughput --clients 5000 --events 100 --rate 10
+
+The push server runs in a forked process against a throwaway SQLite
+database. Every client is a student enrolled in and subscribed to one subject. Events
+are published through the outbox as the routes do it, at --rate per
+second. Each event is either a broadcast to that subject or, with
+--targeted, an event addressed to a single user. Reports delivered
+messages per second and publish-to-receive latency.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from benchmarks.common import percentile, create_bench_app, bulk_students, bulk_enroll
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=100, help='broadcast events published')
+    parser.add_argument('--targeted', type=int, default=1000, help='single-user events published alongside')
+    parser.add_argument('--rate', type=float, default=10, help='broadcast events per second')
+    parser.add_argument('--connect-concurrency', type=int, default=200)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    app = create_bench_app()
+
+    from models import db, User, Subject
+    from auth import generate_token
+    from events import event_row, publish_many
+
+    with app.app_context():
+        teacher = User(email='bench-teacher@classflow.com', role='teacher')
+        teacher.set_password('bench')
+        db.session.add(teacher)
+        db.session.flush()
+        subject = Subject(name='Push', teacher_id=teacher.id)
+        db.session.add(subject)
+        db.session.commit()
+        subject_id = subject.id
+        student_ids = bulk_students(db, User, args.clients, teacher.password_hash)
+        bulk_enroll(db, subject_id, student_ids)
+        tokens = [generate_token(student_id, 'student') for student_id in student_ids]
+
+    port_queue, stats_queue, stop = multiprocessing.Queue(), multiprocessing.Queue(), multiprocessing.Event()
+    server = multiprocessing.get_context('fork').Process(
+        target=run_server, args=(app, port_queue, stats_queue, stop)
+    )
+    server.start()
+    port = port_queue.get()
+
+    expected = args.events * args.clients + args.targeted
+    received = [0]
+    latencies = []
+    all_received = asyncio.Event()
+
+    async def client(token, semaphore, connected):
+        from websockets.asyncio.client import connect
+
+        async with semaphore:
+            websocket = await connect(f'ws://127.0.0.1:{port}/ws?token={token}', open_timeout=60,
+                                      compression=None, max_queue=None)
+            await websocket.send(json.dumps({'type': 'subscribe_attendance', 'payload': {'subject_id': subject_id}}))
+            await websocket.recv()  # 'subscribed'
+        connected.append(websocket)
+        async for raw in websocket:
+            received[0] += 1
+            # Parse a sample only; decoding every message would measure the client
+            if received[0] % 97 == 0:
+                latencies.append(time.time() - json.loads(raw)['payload']['sent_at'])
+            if received[0] >= expected:
+                all_received.set()
+
+    def publish(kind, count, rate):
+        """Write count events to the outbox, paced at rate per second"""
+        with app.app_context():
+            started = time.perf_counter()
+            for i in range(count):
+                if kind == 'broadcast':
+                    rows = [event_row('attendance_marked', {'subject_id': subject_id, 'sent_at': time.time()},
+                                      channels=[f'subject:{subject_id}'])]
+                else:
+                    rows = [event_row('submission_graded', {'sent_at': time.time()},
+                                      users=[student_ids[i % len(student_ids)]])]
+                publish_many(rows)
+                db.session.commit()
+                delay = started + (i + 1) / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+    async def run():
+        semaphore = asyncio.Semaphore(args.connect_concurrency)
+        connected = []
+        started = time.perf_counter()
+        tasks = [asyncio.ensure_future(client(token, semaphore, connected)) for token in tokens]
+        while len(connected) < args.clients:
+            await asyncio.sleep(0.1)
+            failed = [task for task in tasks if task.done() and task.exception()]
+            if failed:
+                raise failed[0].exception()
+        print(f"connected {args.clients} clients in {time.perf_counter() - started:.1f} s")
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            asyncio.to_thread(publish, 'broadcast', args.events, args.rate),
+            asyncio.to_thread(publish, 'targeted', args.targeted, args.targeted * args.rate / max(args.events, 1))
+        )
+        publish_done = time.perf_counter() - started
+        try:
+            await asyncio.wait_for(all_received.wait(), timeout=60)
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - started
+        for websocket in connected:
+            await websocket.close()
+        for task in tasks:
+            task.cancel()
+        return publish_done, elapsed
+
+    publish_done, elapsed = asyncio.run(run())
+    stop.set()
+    stats = stats_queue.get()
+    server.join()
+
+    print(f"published {args.events} broadcasts + {args.targeted} targeted events in {publish_done:.1f} s")
+    print(f"received {received[0]}/{expected} messages in {elapsed:.1f} s: "
+          f"{received[0] / elapsed:,.0f} msg/s")
+    if latencies:
+        print(f"latency p50 {percentile(latencies, 50) * 1000:.0f} ms, p99 {percentile(latencies, 99) * 1000:.0f} ms, "
+              f"max {max(latencies) * 1000:.0f} ms")
+    print(f"server: {stats}")
+    return 0 if received[0] == expected else 1
+
+def run_server(app, port_queue, stats_queue, stop):
+    from models import db
+    from push_server import PushServer
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+    push = PushServer(app)
+
+    async def serve():
+        ready = asyncio.get_running_loop().create_future()
+        task = asyncio.ensure_future(push.serve(port=0, ready=ready))
+        port_queue.put(await ready)
+        await asyncio.to_thread(stop.wait)
+        task.cancel()
+
+    asyncio.run(serve())
+    stats_queue.put(push.hub.stats())
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Compare GET /api/student/dashboard with the request fan-out it replaces.
+
+Run from the backend directory:
+
+    python -m benchmarks.student_dashboard
+    python -m benchmarks.student_dashboard --subjects 8 --assignments 10 --days 90
+
+The fan-out mirrors what views/student/Dashboard.vue used to do: subjects,
+then assignments per subject, then my-submissions and my-attendance.
+"""
+import argparse
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+from benchmarks.common import percentile, create_bench_app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='defaults to a throwaway SQLite file')
+    parser.add_argument('--subjects', type=int, default=8)
+    parser.add_argument('--assignments', type=int, default=10, help='per subject')
+    parser.add_argument('--days', type=int, default=90, help='attendance days per subject')
+    parser.add_argument('--runs', type=int, default=30)
+    args = parser.parse_args()
+
+    app = create_bench_app(args.database_url)
+    # Measure the queries, not cache hits
+    app.config['RESPONSE_CACHE_ENABLED'] = False
+
+    from models import db, User, Subject, Enrollment, Assignment, Submission, Attendance
+    from auth import generate_token
+    from querycount import count_queries
+
+    with app.app_context():
+        teacher = User(email='bench-teacher@classflow.com', role='teacher')
+        student = User(email='bench-student@classflow.com', role='student')
+        teacher.set_password('bench')
+        student.password_hash = teacher.password_hash
+        db.session.add_all([teacher, student])
+        db.session.flush()
+
+        now = datetime.utcnow()
+        for s in range(args.subjects):
+            subject = Subject(name=f'Subject {s}', teacher_id=teacher.id)
+            db.session.add(subject)
+            db.session.flush()
+            db.session.add(Enrollment(subject_id=subject.id, student_id=student.id))
+            for a in range(args.assignments):
+                assignment = Assignment(subject_id=subject.id, title=f'Assignment {s}.{a}',
+                                        due_date=now + timedelta(days=a - args.assignments // 2))
+                db.session.add(assignment)
+                db.session.flush()
+                if a % 2 == 0:
+                    db.session.add(Submission(assignment_id=assignment.id, student_id=student.id,
+                                              blob_key='0' * 64, filename='bench.txt',
+                                              grade='A' if a % 4 == 0 else None))
+            db.session.execute(Attendance.__table__.insert(), [
+                {'subject_id': subject.id, 'student_id': student.id,
+                 'date': date(2024, 1, 1) + timedelta(days=d),
+                 'status': 'PRESENT' if d % 5 else 'ABSENT', 'marked_at': now}
+                for d in range(args.days)
+            ])
+        db.session.commit()
+        token = generate_token(student.id, student.role)
+
+    headers = {'Authorization': f'Bearer {token}'}
+
+    client = app.test_client()
+
+    def call(path):
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()
+
+    def fan_out():
+        subjects = call('/api/student/subjects')
+        for subject in subjects:
+            call(f"/api/student/assignments/{subject['id']}")
+        call('/api/my-submissions')
+        call('/api/my-attendance')
+        return 3 + len(subjects)
+
+    def aggregated():
+        call('/api/student/dashboard')
+        return 1
+
+    print(f"{app.config['SQLALCHEMY_DATABASE_URI']}")
+    print(f"{args.subjects} subjects x {args.assignments} assignments, {args.days} attendance days each")
+    print(f"{'variant':>12} {'requests':>9} {'SQL':>6} {'p50 ms':>10} {'p99 ms':>10} {'mean ms':>10}")
+    for name, variant in (('fan-out', fan_out), ('dashboard', aggregated)):
+        with app.app_context():
+            with count_queries() as statements:
+                requests_made = variant()
+        samples = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            variant()
+            samples.append((time.perf_counter() - started) * 1000)
+        print(f"{name:>12} {requests_made:>9} {len(statements):>6} {percentile(samples, 50):>10.2f} "
+              f"{percentile(samples, 99):>10.2f} {statistics.mean(samples):>10.2f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
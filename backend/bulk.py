@@ -0,0 +1,137 @@
+from datetime import datetime
+from sqlalchemy import insert, update, func
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, User, Attendance, Submission, Assignment, Subject
+
+# Dialects whose INSERT supports ON CONFLICT DO UPDATE against the unique_attendance columns
+UPSERT_DIALECTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+def valid_student_ids(student_ids):
+    """Return the subset of ids that belong to student accounts (one IN query)"""
+    if not student_ids:
+        return set()
+    rows = db.session.query(User.id).filter(
+        User.id.in_(student_ids),
+        User.role == 'student'
+    ).all()
+    return {row.id for row in rows}
+
+# A row that changed status held the other one
+OTHER_STATUS = {'PRESENT': 'ABSENT', 'ABSENT': 'PRESENT'}
+
+def existing_attendance(subject_id, attendance_date, student_ids, lock=False):
+    """Map student_id -> (attendance id, status) for rows already marked on this date.
+    With lock, the rows are held (SELECT ... FOR UPDATE) until the transaction ends."""
+    if not student_ids:
+        return {}
+    query = db.session.query(Attendance.student_id, Attendance.id, Attendance.status).filter(
+        Attendance.subject_id == subject_id,
+        Attendance.date == attendance_date,
+        Attendance.student_id.in_(student_ids)
+    )
+    if lock:
+        query = query.with_for_update()
+    return {row.student_id: (row.id, row.status) for row in query.all()}
+
+def upsert_attendance(subject_id, attendance_date, statuses):
+    """Insert or update attendance for one subject/date in a single batch.
+
+    `statuses` maps student_id -> status. Existing rows only have their
+    status changed, matching the per-record behaviour of mark_attendance.
+    Returns student_id -> previous status (None for a new row) for the rows
+    this call actually changed, as seen by the writes themselves: two
+    requests marking the same day at once never both report a change.
+    """
+    if not statuses:
+        return {}
+
+    dialect = db.session.get_bind().dialect.name
+    marked_at = datetime.utcnow()
+    rows = [
+        {
+            'subject_id': subject_id,
+            'student_id': student_id,
+            'date': attendance_date,
+            'status': status,
+            'marked_at': marked_at
+        }
+        for student_id, status in statuses.items()
+    ]
+
+    dialect_insert = UPSERT_DIALECTS.get(dialect)
+    if dialect_insert is not None:
+        # New rows first; RETURNING names only the ones this statement inserted
+        stmt = dialect_insert(Attendance).on_conflict_do_nothing(
+            index_elements=['subject_id', 'student_id', 'date']
+        ).returning(Attendance.student_id)
+        changes = {student_id: None for student_id in db.session.scalars(stmt, rows)}
+
+        # Then flip existing rows whose status differs. The UPDATE re-checks
+        # its WHERE on the row it locks, so a concurrent identical mark finds
+        # nothing left to change.
+        for status in OTHER_STATUS:
+            student_ids = [student_id for student_id, new_status in statuses.items()
+                           if new_status == status and student_id not in changes]
+            if not student_ids:
+                continue
+            flipped = db.session.scalars(
+                update(Attendance)
+                .where(
+                    Attendance.subject_id == subject_id,
+                    Attendance.date == attendance_date,
+                    Attendance.student_id.in_(student_ids),
+                    Attendance.status != status
+                )
+                .values(status=status)
+                .returning(Attendance.student_id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            changes.update({student_id: OTHER_STATUS[status] for student_id in flipped})
+        return changes
+
+    # Fallback: lock the day's existing rows, then a bulk UPDATE and a bulk INSERT
+    existing = existing_attendance(subject_id, attendance_date, list(statuses), lock=True)
+    updates = [
+        {'id': existing[row['student_id']][0], 'status': row['status']}
+        for row in rows if row['student_id'] in existing and existing[row['student_id']][1] != row['status']
+    ]
+    inserts = [row for row in rows if row['student_id'] not in existing]
+
+    if updates:
+        db.session.execute(update(Attendance), updates)
+    if inserts:
+        db.session.execute(insert(Attendance), inserts)
+    changes = {row['student_id']: None for row in inserts}
+    changes.update({student_id: existing[student_id][1] for student_id, status in statuses.items()
+                    if student_id in existing and existing[student_id][1] != status})
+    return changes
+
+def submission_owners(submission_ids):
+    """Map submission id -> (teacher_id, student_id, assignment_id) rows (one joined query)"""
+    if not submission_ids:
+        return {}
+    rows = db.session.query(Submission.id, Subject.teacher_id, Submission.student_id, Submission.assignment_id)\
+        .join(Assignment, Submission.assignment_id == Assignment.id)\
+        .join(Subject, Assignment.subject_id == Subject.id)\
+        .filter(Submission.id.in_(submission_ids)).all()
+    return {row.id: row for row in rows}
+
+def assignment_submissions_by_email(assignment_id, emails):
+    """Map lowercased student email -> submission id for one assignment (one joined query)"""
+    if not emails:
+        return {}
+    rows = db.session.query(User.email, Submission.id)\
+        .join(Submission, Submission.student_id == User.id)\
+        .filter(Submission.assignment_id == assignment_id, func.lower(User.email).in_(emails)).all()
+    return {row.email.lower(): row.id for row in rows}
+
+def update_grades(grades):
+    """Write {submission_id: {'grade': ..., 'feedback': ...}} as one bulk UPDATE.
+    Only the keys present for a submission are changed."""
+    if grades:
+        db.session.execute(update(Submission), [
+            {'id': submission_id, **values} for submission_id, values in grades.items()
+        ])
@@ -8,8 +8,93 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///classflow.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Engine profile (database.py): 'sqlite' or 'server'; unset picks it from the URL
+    DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE')
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT = float(os.environ.get('SQLITE_BUSY_TIMEOUT', 30))  # seconds a writer waits for the lock
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # below the server's idle timeout
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') != '0'
+    DB_POOL_STATS_WINDOW = 1000  # checkouts the wait percentiles cover
+    # Read replicas (replicas.py): comma-separated URLs that GET requests read from
+    DATABASE_REPLICA_URLS = [url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url]
+    REPLICA_STICKY_WINDOW = float(os.environ.get('REPLICA_STICKY_WINDOW', 5))  # seconds a writer reads the primary
+    REPLICA_RETRY_INTERVAL = 30  # seconds an unreachable replica is skipped
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)  # renewed by /refresh without the password
+    # Password hashing (passwords.py): Werkzeug method string for new hashes;
+    # stored hashes with other parameters are rehashed on the next login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 1))  # processes per app process; 0 hashes inline
+    PASSWORD_HASH_NICE = 10  # priority decrease of the hashing processes
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))  # hashes queued or running per app process
+    PASSWORD_HASH_WAIT = float(os.environ.get('PASSWORD_HASH_WAIT', 2))  # seconds to wait for a slot before 503
+    PASSWORD_HASH_RETRY_AFTER = 2  # seconds, sent with the 503
     UPLOAD_FOLDER = 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-    ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt', 'zip'}
\ No newline at end of file
+    ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt', 'zip'}
+    # Chunked uploads (upload_routes.py): per-extension size caps, default for the rest
+    UPLOAD_SIZE_LIMITS = {'zip': 512 * 1024 * 1024}
+    DEFAULT_UPLOAD_SIZE_LIMIT = 16 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # largest chunk accepted per PUT, below MAX_CONTENT_LENGTH
+    UPLOAD_SESSION_TTL = timedelta(hours=24)
+    # Submission file storage (storage.py): 'cas' for sharded local files,
+    # 'object' for the local S3-compatible stand-in bucket
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND') or 'cas'
+    STORAGE_ROOT = os.environ.get('STORAGE_ROOT') or os.path.join(UPLOAD_FOLDER, 'blobs')
+    STORAGE_BUCKET = 'submissions'
+    # Hand submission downloads to the front proxy instead of streaming them
+    # from the worker: '' (off), 'x-accel' (nginx) or 'x-sendfile' (Apache, lighttpd)
+    DOWNLOAD_OFFLOAD = os.environ.get('DOWNLOAD_OFFLOAD', '')
+    DOWNLOAD_ACCEL_PREFIX = '/_blobs/'  # nginx internal location aliased to STORAGE_ROOT
+    DEFAULT_PAGE_SIZE = 100  # used when only ?cursor= is given
+    MAX_PAGE_SIZE = 1000
+    DASHBOARD_LIST_SIZE = 5  # pending assignments / recent submissions shown
+    EXPORT_BATCH_SIZE = 1000  # rows fetched per round trip by the CSV/XLSX exports (exports.py)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))  # seconds
+    USER_CACHE_SIZE = 10000
+    USER_CACHE_URL = os.environ.get('USER_CACHE_URL')  # e.g. redis://localhost:6379/0 to share across workers
+
+    # Cached list responses (response_cache.py); shares USER_CACHE_URL when set
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1') != '0'
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 60))  # seconds
+    RESPONSE_CACHE_SIZE = 2000
+    # Background jobs (jobs.py): 'database' for the jobs table, 'memory' for tests
+    JOB_QUEUE_BACKEND = os.environ.get('JOB_QUEUE_BACKEND') or 'database'
+    JOB_MAX_ATTEMPTS = 5
+    JOB_RETRY_BASE = 5  # seconds before the first retry, doubled each attempt
+    JOB_RETRY_MAX = 3600
+    JOB_TIMEOUT = timedelta(minutes=15)  # running jobs older than this are retried
+    JOB_POLL_INTERVAL = 1.0  # seconds an idle worker sleeps
+    JOB_RETENTION = timedelta(days=7)
+    JOB_STATS_WINDOW = 500  # finished jobs the latency percentiles cover
+    # e.g. "clamdscan --no-summary --fdpass"; unset skips scanning
+    SUBMISSION_SCAN_COMMAND = os.environ.get('SUBMISSION_SCAN_COMMAND', '').split()
+    SUBMISSION_SCAN_TIMEOUT = 300
+    # WebSocket push server (push_server.py); the front proxy routes /ws to it
+    PUSH_HOST = os.environ.get('PUSH_HOST', '127.0.0.1')
+    PUSH_PORT = int(os.environ.get('PUSH_PORT', 5001))
+    PUSH_POLL_INTERVAL = 0.1  # seconds between outbox polls when idle
+    PUSH_BATCH_SIZE = 500  # events read per poll
+    PUSH_GAP_TIMEOUT = 2.0  # seconds to wait for an uncommitted lower event id
+    PUSH_QUEUE_SIZE = 256  # messages buffered per client before it is dropped as too slow
+    PUSH_EVENT_RETENTION = timedelta(minutes=10)
+    # ASGI mode (asgi.py): async engine URL, derived from the sync one when unset
+    # (sqlite -> sqlite+aiosqlite, postgresql -> postgresql+asyncpg, mysql -> mysql+aiomysql)
+    ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL')
+    ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 32))  # threads running the Flask routes
+    # Write transactions in flight per ASGI process; None is 1 on SQLite (one
+    # writer at a time, so more only queue on the file lock) and unlimited elsewhere
+    ASYNC_WRITE_CONCURRENCY = None
+    # Request metrics (metrics.py): GET /metrics and the /*-stats endpoints need
+    # Bearer METRICS_TOKEN; unset, they are refused
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Folded-stack profiles of requests slower than PROFILE_THRESHOLD seconds
+    PROFILE_SLOW_REQUESTS = os.environ.get('PROFILE_SLOW_REQUESTS', '0') == '1'
+    PROFILE_THRESHOLD = float(os.environ.get('PROFILE_THRESHOLD', 1.0))
+    PROFILE_INTERVAL = 0.005  # seconds between stack samples
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
\ No newline at end of file
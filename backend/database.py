@@ -0,0 +1,239 @@
+"""Engine profiles and connection pool metrics.
+
+DATABASE_PROFILE picks the engine options (default: from the URL scheme):
+
+    'sqlite'  WAL journal, busy_timeout and synchronous=NORMAL set on every
+              new connection, so readers never block the writer and
+              concurrent writers wait SQLITE_BUSY_TIMEOUT for the lock
+              instead of failing with "database is locked"
+    'server'  PostgreSQL/MySQL: DB_POOL_SIZE connections plus
+              DB_MAX_OVERFLOW extra under load, pre-ping on checkout and
+              recycling after DB_POOL_RECYCLE seconds
+
+Queue pools record how long each checkout waited for a connection, how
+many connections are open and checked out, and how many checkouts timed
+out. GET /db-stats reports them; a p95 wait well above zero, or
+timeouts, means DB_POOL_SIZE + DB_MAX_OVERFLOW is too small for the
+number of threads using the pool.
+
+Replicas in DATABASE_REPLICA_URLS get engines 'replica-0', 'replica-1',
+... with the same profile (not Flask-SQLAlchemy binds, so create_all()
+and migrations never write to them); replicas.py routes reads to them. To try it
+locally with SQLite files, refresh them from the primary (a snapshot
+stands in for replication, lag included) from the backend directory:
+
+    python database.py sync-replicas
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from sqlalchemy import event, create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+from models import db
+from replicas import ReplicaRouter
+from user_cache import LocalBackend, RedisBackend
+
+def database_profile(config, url):
+    profile = config['DATABASE_PROFILE'] or ('sqlite' if make_url(url).get_backend_name() == 'sqlite' else 'server')
+    if profile not in ('sqlite', 'server'):
+        raise RuntimeError(f'Unknown DATABASE_PROFILE {profile!r}')
+    return profile
+
+def engine_options(config, url, instrumented=True):
+    """create_engine() keyword arguments for url under its profile"""
+    if database_profile(config, url) == 'sqlite':
+        options = {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT']}}
+    else:
+        options = {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+            'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        }
+    if instrumented:
+        # Flask-SQLAlchemy still swaps in StaticPool for in-memory SQLite
+        options['poolclass'] = InstrumentedQueuePool
+    return options
+
+def apply_sqlite_pragmas(engine, config):
+    """Set the SQLite profile's pragmas on each new DBAPI connection of engine"""
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}")
+        cursor.execute(f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'] * 1000)}")
+        cursor.close()
+
+class PoolMetrics:
+    """Counters for one pool, updated from pool events and checkout timing"""
+
+    def __init__(self, window):
+        self.waits = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.opened = 0
+        self.closed = 0
+        self.lock = threading.Lock()
+
+    def record_wait(self, seconds, timed_out=False):
+        with self.lock:
+            self.waits.append(seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def listen(self, pool):
+        @event.listens_for(pool, 'connect')
+        def opened(dbapi_connection, connection_record):
+            with self.lock:
+                self.opened += 1
+
+        @event.listens_for(pool, 'close')
+        def closed(dbapi_connection, connection_record):
+            with self.lock:
+                self.closed += 1
+
+        @event.listens_for(pool, 'checkout')
+        def checked_out(dbapi_connection, connection_record, connection_proxy):
+            with self.lock:
+                self.checkouts += 1
+
+    def stats(self, pool):
+        with self.lock:
+            waits = sorted(self.waits)
+            stats = {
+                'pool': type(pool).__name__,
+                'checkouts': self.checkouts,
+                'checkout_timeouts': self.timeouts,
+                'connections_opened': self.opened,
+                'connections_closed': self.closed,
+                'connections_open': self.opened - self.closed,
+            }
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), overflow=pool.overflow(), checked_out=pool.checkedout(),
+                         checked_in=pool.checkedin())
+        if waits:
+            pick = lambda pct: waits[min(len(waits) - 1, int(round(pct / 100 * (len(waits) - 1))))]
+            stats['checkout_wait_ms'] = {
+                'p50': round(pick(50) * 1000, 3),
+                'p95': round(pick(95) * 1000, 3),
+                'max': round(waits[-1] * 1000, 3),
+            }
+        return stats
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waits for a connection"""
+
+    metrics = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeout:
+            if self.metrics:
+                self.metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        if self.metrics:
+            self.metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # dispose() replaces the pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+def instrument(engine, config):
+    """Attach the profile's connect hooks and pool metrics to engine"""
+    if database_profile(config, engine.url) == 'sqlite':
+        apply_sqlite_pragmas(engine, config)
+    metrics = PoolMetrics(config['DB_POOL_STATS_WINDOW'])
+    metrics.listen(engine)  # pool events set on the engine survive pool recreation
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.metrics = metrics
+    return metrics
+
+def replica_url(app, url):
+    """url with a relative SQLite path resolved like Flask-SQLAlchemy resolves the primary's"""
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database and url.database != ':memory:' \
+            and not os.path.isabs(url.database):
+        os.makedirs(app.instance_path, exist_ok=True)
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+    return url
+
+def init_database(app):
+    """db.init_app() with the engine profile's options and instrumentation,
+    plus replica engines and read routing when DATABASE_REPLICA_URLS is set"""
+    url = app.config['SQLALCHEMY_DATABASE_URI']
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(app.config, url),
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    }
+    replica_keys = [f'replica-{i}' for i in range(len(app.config['DATABASE_REPLICA_URLS']))]
+    if replica_keys:
+        # Registered before db.init_app() so it runs after the session is removed
+        @app.teardown_appcontext
+        def release_replica_connection(exc):
+            if 'replicas' in app.extensions:
+                app.extensions['replicas'].release()
+
+    db.init_app(app)
+    with app.app_context():
+        engines = {'default': db.engine, **{
+            key: create_engine(replica_url(app, url), **engine_options(app.config, url))
+            for key, url in zip(replica_keys, app.config['DATABASE_REPLICA_URLS'])
+        }}
+        app.extensions['pool_metrics'] = {
+            name: (engine, instrument(engine, app.config)) for name, engine in engines.items()
+        }
+
+    if replica_keys:
+        window = app.config['REPLICA_STICKY_WINDOW']
+        if app.config.get('USER_CACHE_URL'):
+            sticky = RedisBackend(app.config['USER_CACHE_URL'], window, prefix='classflow:wrote:')
+        else:
+            sticky = LocalBackend(app.config['USER_CACHE_SIZE'], window)
+        app.extensions['replicas'] = ReplicaRouter(
+            {key: engines[key] for key in replica_keys}, sticky, app.config['REPLICA_RETRY_INTERVAL']
+        )
+
+def pool_stats(app):
+    return {name: metrics.stats(engine.pool) for name, (engine, metrics) in app.extensions['pool_metrics'].items()}
+
+def sync_sqlite_replicas(app):
+    """Copy the primary SQLite database over each SQLite replica file"""
+    with app.app_context():
+        engines = [db.engine] + list(app.extensions['replicas'].engines.values()) \
+            if 'replicas' in app.extensions else [db.engine]
+    if any(engine.dialect.name != 'sqlite' for engine in engines):
+        raise RuntimeError('sync-replicas only copies SQLite files; use real replication for server databases')
+    source = sqlite3.connect(engines[0].url.database)
+    try:
+        for engine in engines[1:]:
+            destination = sqlite3.connect(engine.url.database)
+            with destination:
+                source.backup(destination)
+            destination.close()
+    finally:
+        source.close()
+    return [engine.url.database for engine in engines[1:]]
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == 'sync-replicas':
+        for target in sync_sqlite_replicas(app):
+            print(f"Copied primary to {target}")
+    else:
+        print(__doc__)
+        sys.exit(2)
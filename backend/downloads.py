@@ -0,0 +1,65 @@
+"""Conditional, range-aware responses for stored blobs.
+
+Every response carries a strong ETag (the blob's SHA-256) and
+Last-Modified, so clients revalidate with If-None-Match and get a 304
+instead of the file. Byte ranges are served for resuming large downloads.
+
+With DOWNLOAD_OFFLOAD set, the worker only answers the conditional check
+and names the file; the front proxy streams the bytes (and handles Range).
+For nginx ('x-accel'):
+
+    location /_blobs/ {
+        internal;
+        alias /srv/classflow/uploads/blobs/;   # STORAGE_ROOT
+    }
+
+DOWNLOAD_ACCEL_PREFIX must match the location. 'x-sendfile' sends the
+absolute path for Apache mod_xsendfile or lighttpd.
+"""
+import os
+from flask import current_app, request
+from werkzeug.utils import send_file
+from storage import get_storage
+
+def accel_location(storage, path):
+    """Internal proxy URI for a blob file under the storage root"""
+    relative = os.path.relpath(path, storage.root).replace(os.sep, '/')
+    return current_app.config['DOWNLOAD_ACCEL_PREFIX'] + relative
+
+def send_blob(key, download_name, etag=None, last_modified=None):
+    """Send the blob stored under key as an attachment named download_name"""
+    storage = get_storage()
+    offload = current_app.config['DOWNLOAD_OFFLOAD']
+    path = storage.local_path(key)
+    options = dict(
+        environ=request.environ,
+        as_attachment=True,
+        download_name=download_name,
+        etag=etag or key,
+        last_modified=last_modified,
+        response_class=current_app.response_class
+    )
+
+    if path and offload:
+        response = send_file(path, use_x_sendfile=True, conditional=False, **options)
+        if offload == 'x-accel':
+            del response.headers['X-Sendfile']
+            response.headers['X-Accel-Redirect'] = accel_location(storage, path)
+        # The proxy serves ranges itself; only answer If-None-Match/If-Modified-Since here
+        response = response.make_conditional(request.environ)
+        if response.status_code == 304:
+            response.headers.pop('X-Sendfile', None)
+            response.headers.pop('X-Accel-Redirect', None)
+    elif path:
+        response = send_file(path, **options)
+    else:
+        # Backends without local files hand back a stream of unknown length;
+        # supply it so ranges still work
+        response = send_file(storage.open(key), conditional=False, **options)
+        size = storage.size(key)
+        response.content_length = size
+        response = response.make_conditional(request.environ, accept_ranges=True, complete_length=size)
+
+    # Cached by the browser only, and always revalidated against the ETag
+    response.cache_control.private = True
+    return response
@@ -0,0 +1,70 @@
+"""Subject rosters: who is enrolled where, and bulk changes to them"""
+from datetime import datetime
+from sqlalchemy import select, insert, func
+from models import db, User, Subject, Enrollment
+from bulk import UPSERT_DIALECTS
+
+def is_enrolled(student_id, subject_id):
+    return db.session.get(Enrollment, (subject_id, student_id)) is not None
+
+def enrolled_student_ids(subject_id, student_ids):
+    """Return the subset of ids on the subject's roster (one IN query)"""
+    if not student_ids:
+        return set()
+    return set(db.session.scalars(
+        select(Enrollment.student_id).where(
+            Enrollment.subject_id == subject_id,
+            Enrollment.student_id.in_(student_ids)
+        )
+    ))
+
+def roster_student_ids(teacher_id, subject_id=None):
+    """Subquery of the students enrolled in one subject, or in any of the teacher's"""
+    if subject_id is not None:
+        return select(Enrollment.student_id).where(Enrollment.subject_id == subject_id)
+    return select(Enrollment.student_id)\
+        .join(Subject, Subject.id == Enrollment.subject_id)\
+        .where(Subject.teacher_id == teacher_id)
+
+def enrolled_subject_ids(student_id):
+    """Subquery of the subjects a student is enrolled in"""
+    return select(Enrollment.subject_id).where(Enrollment.student_id == student_id)
+
+def student_ids_by_email(emails):
+    """Map lowercased email -> id for student accounts (one IN query)"""
+    if not emails:
+        return {}
+    rows = db.session.query(User.email, User.id).filter(
+        func.lower(User.email).in_(emails),
+        User.role == 'student'
+    ).all()
+    return {row.email.lower(): row.id for row in rows}
+
+def enroll(subject_id, student_ids):
+    """Add students to the roster; ids already on it are skipped.
+    Returns the ids added. The caller commits."""
+    already = enrolled_student_ids(subject_id, student_ids)
+    added = sorted(set(student_ids) - already)
+    if not added:
+        return []
+    now = datetime.utcnow()
+    rows = [{'subject_id': subject_id, 'student_id': student_id, 'created_at': now} for student_id in added]
+    dialect_insert = UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+    if dialect_insert is not None:
+        # Tolerate a concurrent request enrolling the same students
+        db.session.execute(dialect_insert(Enrollment).on_conflict_do_nothing(
+            index_elements=['subject_id', 'student_id']
+        ), rows)
+    else:
+        db.session.execute(insert(Enrollment), rows)
+    return added
+
+def unenroll(subject_id, student_ids):
+    """Remove students from the roster; returns how many were on it.
+    Their attendance and submissions are kept. The caller commits."""
+    if not student_ids:
+        return 0
+    return Enrollment.query.filter(
+        Enrollment.subject_id == subject_id,
+        Enrollment.student_id.in_(student_ids)
+    ).delete(synchronize_session=False)
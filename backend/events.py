@@ -0,0 +1,44 @@
+"""Push events for connected WebSocket clients (see push_server.py).
+
+Events are rows in the push_events outbox, added to the current session so
+they are committed, or rolled back, together with the change they
+announce. Each event goes to the listed users' connections and to clients
+subscribed to any of its channels:
+
+    subject:<id>      attendance for a subject
+    assignment:<id>   submissions and grades for an assignment
+"""
+from datetime import datetime
+from sqlalchemy import insert
+from models import db, PushEvent
+
+def event_row(event_type, payload, users=(), channels=()):
+    return {
+        'type': event_type,
+        'payload': payload,
+        'user_ids': sorted(set(users)),
+        'channels': list(channels),
+        'created_at': datetime.utcnow()
+    }
+
+def publish(event_type, payload, users=(), channels=(), session=None):
+    """Queue one event with the current transaction"""
+    publish_many([event_row(event_type, payload, users, channels)], session)
+
+def publish_many(rows, session=None):
+    """Queue several event_row() dicts with a single INSERT"""
+    if rows:
+        (session or db.session).execute(insert(PushEvent), rows)
+
+def submission_created(submission, teacher_id, session=None):
+    """A flushed submission, for the subject's teacher and the assignment's subscribers"""
+    publish('submission_created', submission.to_dict(), users=[teacher_id],
+            channels=[f'assignment:{submission.assignment_id}'], session=session)
+
+def submission_graded(submission_id, assignment_id, student_id, values):
+    """event_row() telling a student (and the assignment's subscribers) about a new grade"""
+    return event_row('submission_graded', {
+        'submission_id': submission_id,
+        'assignment_id': assignment_id,
+        **values
+    }, users=[student_id], channels=[f'assignment:{assignment_id}'])
@@ -0,0 +1,127 @@
+"""EXPLAIN check for the main query behind each endpoint.
+
+Run from the backend directory after migrating:
+
+    python explain.py
+
+Prints each endpoint's query plan and exits non-zero if any of them falls
+back to a full table scan. Supports SQLite (EXPLAIN QUERY PLAN) and
+PostgreSQL (EXPLAIN).
+"""
+import sys
+from datetime import date, datetime
+from sqlalchemy import func, case, and_
+from models import db, User, Subject, Enrollment, Assignment, Submission, Attendance
+from enrollments import roster_student_ids, enrolled_subject_ids
+from registers import marks_criteria, marks_statement, students_statement
+from exports import register_statement, gradebook_statement
+from serializers import (
+    shaped, SUBJECT_SHAPE, ASSIGNMENT_SHAPE, SUBMISSION_SHAPE, SUBMISSION_JOINED_SHAPE, ATTENDANCE_SHAPE
+)
+
+def endpoint_queries():
+    """Representative main query per endpoint, with placeholder ids"""
+    enrolled = and_(Enrollment.subject_id == Assignment.subject_id, Enrollment.student_id == 1)
+    my_submission = and_(Submission.assignment_id == Assignment.id, Submission.student_id == 1)
+    term = marks_criteria(1, date(2024, 1, 1), date(2024, 6, 30))
+    return {
+        'token_required': User.query.filter_by(id=1),
+        'get_teacher_subjects': shaped(Subject.query, SUBJECT_SHAPE).filter_by(teacher_id=1),
+        'get_subject_assignments': shaped(Assignment.query, ASSIGNMENT_SHAPE).filter_by(subject_id=1),
+        'get_assignment_submissions': shaped(Submission.query, SUBMISSION_SHAPE)
+            .filter_by(assignment_id=1)
+            .order_by(Submission.submitted_at, Submission.id),
+        'get_my_submissions': shaped(Submission.query, SUBMISSION_JOINED_SHAPE)
+            .filter_by(student_id=1)
+            .join(Submission.assignment)
+            .order_by(Submission.submitted_at.desc(), Submission.id.desc()),
+        'get_my_attendance': shaped(Attendance.query, ATTENDANCE_SHAPE)
+            .filter_by(student_id=1)
+            .order_by(Attendance.date.desc(), Attendance.id.desc()),
+        'get_my_attendance (subject)': shaped(Attendance.query, ATTENDANCE_SHAPE)
+            .filter_by(student_id=1, subject_id=1)
+            .order_by(Attendance.date.desc(), Attendance.id.desc()),
+        'get_my_attendance (stats)': db.session.query(
+            func.count(Attendance.id),
+            func.sum(case((Attendance.status == 'PRESENT', 1), else_=0))
+        ).filter_by(student_id=1, subject_id=1),
+        'get_subject_attendance': shaped(Attendance.query, ATTENDANCE_SHAPE)
+            .filter_by(subject_id=1)
+            .filter(Attendance.date >= date(2024, 1, 1))
+            .order_by(Attendance.date.desc(), Attendance.id.desc()),
+        'get_students': User.query.filter_by(role='student', active=True)
+            .filter(User.id.in_(roster_student_ids(1)))
+            .order_by(User.id),
+        'get_students (subject)': User.query.filter_by(role='student', active=True)
+            .filter(User.id.in_(roster_student_ids(1, 1)))
+            .order_by(User.id),
+        'get_student_subjects': shaped(Subject.query, SUBJECT_SHAPE)
+            .filter(Subject.id.in_(enrolled_subject_ids(1)))
+            .order_by(Subject.id),
+        'get_student_dashboard (counts)': db.session.query(
+            func.count(Assignment.id),
+            func.count(Submission.id),
+            func.sum(case((Submission.submitted_at > Assignment.due_date, 1), else_=0)),
+            func.sum(case((and_(Submission.id.is_(None), Assignment.due_date < datetime(2024, 1, 1)), 1), else_=0))
+        ).select_from(Assignment).join(Enrollment, enrolled).outerjoin(Submission, my_submission),
+        'get_student_dashboard (pending)': db.session.query(
+            Assignment.id, Assignment.title, Assignment.due_date, Subject.name
+        ).join(Enrollment, enrolled)
+            .join(Subject, Subject.id == Assignment.subject_id)
+            .outerjoin(Submission, my_submission)
+            .filter(Submission.id.is_(None))
+            .order_by(Assignment.due_date, Assignment.id)
+            .limit(10),
+        'get_student_dashboard (recent)': db.session.query(
+            Submission.id, Submission.submitted_at, Submission.grade, Assignment.title, Subject.name
+        ).join(Assignment, Assignment.id == Submission.assignment_id)
+            .join(Subject, Subject.id == Assignment.subject_id)
+            .filter(Submission.student_id == 1)
+            .order_by(Submission.submitted_at.desc(), Submission.id.desc())
+            .limit(10),
+        'get_subject_attendance (matrix marks)': marks_statement(term),
+        'get_subject_attendance (matrix students)': students_statement(1, term),
+        'export_attendance': register_statement(1, term),
+        'export_gradebook': gradebook_statement(1),
+        'mark_attendance (validate)': db.session.query(User.id)
+            .filter(User.id.in_([1, 2, 3]), User.role == 'student'),
+    }
+
+def explain(query):
+    """Return the plan for a query as a list of text lines"""
+    dialect = db.engine.dialect
+    # ORM Query objects, or Core select() statements as built by registers.py and exports.py
+    statement = getattr(query, 'statement', query)
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    if dialect.name == 'sqlite':
+        return [row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}'))]
+    if dialect.name == 'postgresql':
+        return [row[0] for row in db.session.execute(db.text(f'EXPLAIN {sql}'))]
+    raise NotImplementedError(f'EXPLAIN check does not support {dialect.name}')
+
+def full_scans(plan):
+    """Plan lines that read a whole table instead of going through an index"""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        return [line for line in plan if line.startswith('SCAN') and 'USING' not in line]
+    return [line for line in plan if 'Seq Scan' in line]
+
+def check():
+    """Explain every endpoint query; returns {endpoint: full-scan lines}"""
+    failures = {}
+    for endpoint, query in endpoint_queries().items():
+        plan = explain(query)
+        scans = full_scans(plan)
+        print(f"{'FULL SCAN' if scans else 'ok':<10} {endpoint}")
+        for line in plan:
+            print(f"           {line}")
+        if scans:
+            failures[endpoint] = scans
+    return failures
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        sys.exit(1 if check() else 0)
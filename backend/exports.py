@@ -0,0 +1,209 @@
+"""Attendance registers and gradebooks as CSV or XLSX, streamed.
+
+Rows are read through a server-side cursor in batches of
+EXPORT_BATCH_SIZE (yield_per) as plain column tuples, ordered by student,
+and each student's line is written as soon as their last row has been
+read. Memory therefore stays at one batch plus one line whatever the
+length of the term, and no ORM objects or relationships are loaded.
+
+XLSX workbooks are written as a minimal SpreadsheetML package (one sheet,
+inline strings, no styles) inside a streamed ZIP (archives.py), so
+no spreadsheet library is needed and the sheet is never held in memory.
+"""
+import csv
+import io
+import re
+from datetime import datetime
+from xml.sax.saxutils import escape
+from flask import Response, current_app, stream_with_context
+from sqlalchemy import select, union, and_
+from models import db, User, Attendance, Enrollment, Assignment, Submission
+from archives import stream_generated_zip
+from registers import STATUS_CODES, marks_criteria
+from uploads import COPY_BUFFER_SIZE
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+def _stream_rows(statement):
+    """Execute through Core with a server-side cursor, yielding tuples batch by batch"""
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    result = db.session.connection().execute(statement.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield from partition
+
+def _by_student(rows):
+    """Group consecutive (student_id, email, ...) rows: yields (student_id, email, [rest])"""
+    current = None
+    email = None
+    group = []
+    for student_id, student_email, *rest in rows:
+        if student_id != current:
+            if current is not None:
+                yield current, email, group
+            current, email, group = student_id, student_email, []
+        group.append(rest)
+    if current is not None:
+        yield current, email, group
+
+def _students_in(subject_id, *also):
+    """Subquery of the subject's roster plus the students selected by `also`"""
+    return union(select(Enrollment.student_id).where(Enrollment.subject_id == subject_id), *also)
+
+def register_statement(subject_id, criteria):
+    """(student_id, email, date, status) for the roster and everyone marked,
+    one row per mark (or one with no mark), ordered by student"""
+    students = _students_in(subject_id, select(Attendance.student_id).where(*criteria))
+    return select(User.id, User.email, Attendance.date, Attendance.status)\
+        .outerjoin(Attendance, and_(Attendance.student_id == User.id, *criteria))\
+        .where(User.id.in_(students))\
+        .order_by(User.email, User.id)
+
+def gradebook_statement(subject_id):
+    """(student_id, email, assignment_id, grade, submitted_at) for the roster
+    and everyone who submitted, one row per submission, ordered by student"""
+    assignment_ids = select(Assignment.id).where(Assignment.subject_id == subject_id)
+    students = _students_in(subject_id, select(Submission.student_id).where(Submission.assignment_id.in_(assignment_ids)))
+    return select(User.id, User.email, Submission.assignment_id, Submission.grade, Submission.submitted_at)\
+        .outerjoin(Submission, and_(Submission.student_id == User.id, Submission.assignment_id.in_(assignment_ids)))\
+        .where(User.id.in_(students))\
+        .order_by(User.email, User.id)
+
+def attendance_register(subject_id, start_date=None, end_date=None):
+    """Yield the header, then one row per student: their mark on each date
+    with at least one mark in the range, then present/absent totals"""
+    criteria = marks_criteria(subject_id, start_date, end_date)
+    dates = db.session.scalars(select(Attendance.date).where(*criteria).distinct().order_by(Attendance.date)).all()
+    columns = {mark_date: index for index, mark_date in enumerate(dates)}
+    yield ['Student'] + [mark_date.isoformat() for mark_date in dates] + ['Present', 'Absent', 'Percentage']
+
+    rows = _stream_rows(register_statement(subject_id, criteria))
+    for _, email, marks in _by_student(rows):
+        line = [''] * len(dates)
+        present = absent = 0
+        for mark_date, status in marks:
+            if mark_date is None:  # on the roster, never marked
+                continue
+            line[columns[mark_date]] = STATUS_CODES.get(status, status)
+            present += status == 'PRESENT'
+            absent += status == 'ABSENT'
+        marked = present + absent
+        yield [email] + line + [present, absent, round(present / marked * 100, 1) if marked else '']
+
+def gradebook(subject_id):
+    """Yield the header, then one row per student with the grade, late flag
+    and submission time for each of the subject's assignments"""
+    assignments = db.session.execute(
+        select(Assignment.id, Assignment.title, Assignment.due_date)
+        .where(Assignment.subject_id == subject_id)
+        .order_by(Assignment.due_date, Assignment.id)
+    ).all()
+    columns = {assignment_id: index for index, (assignment_id, _, _) in enumerate(assignments)}
+    due_dates = {assignment_id: due_date for assignment_id, _, due_date in assignments}
+    header = ['Student']
+    for _, title, _ in assignments:
+        header += [f'{title} grade', f'{title} late', f'{title} submitted at']
+    yield header
+
+    rows = _stream_rows(gradebook_statement(subject_id))
+    for _, email, submissions in _by_student(rows):
+        line = [''] * (3 * len(assignments))
+        for assignment_id, grade, submitted_at in submissions:
+            if assignment_id is None:  # on the roster, nothing submitted
+                continue
+            index = 3 * columns[assignment_id]
+            late = bool(submitted_at and due_dates[assignment_id] and submitted_at > due_dates[assignment_id])
+            line[index:index + 3] = [grade or '', 'yes' if late else 'no',
+                                     submitted_at.isoformat() if submitted_at else '']
+        yield [email] + line
+
+def csv_chunks(rows):
+    """Encode rows as CSV, in chunks of about COPY_BUFFER_SIZE bytes"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= COPY_BUFFER_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+# Characters XML 1.0 does not allow, even escaped
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# ... and those Excel does not allow in sheet names
+_INVALID_SHEET_NAME = re.compile(r'[\x00-\x1f\[\]:*?/\\]')
+
+def _cell(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        text = _INVALID_XML.sub('', str(value))
+        return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>' if text else '<c/>'
+    return f'<c><v>{value}</v></c>'
+
+def _sheet_chunks(rows):
+    yield ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+           '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+           '<sheetData>').encode()
+    parts = []
+    size = 0
+    for row in rows:
+        part = '<row>' + ''.join(_cell(value) for value in row) + '</row>'
+        parts.append(part)
+        size += len(part)
+        if size >= COPY_BUFFER_SIZE:
+            yield ''.join(parts).encode()
+            parts = []
+            size = 0
+    parts.append('</sheetData></worksheet>')
+    yield ''.join(parts).encode()
+
+def xlsx_chunks(rows, sheet_name='Sheet1'):
+    """Yield an XLSX workbook with a single sheet of rows"""
+    sheet_name = escape(_INVALID_SHEET_NAME.sub('', sheet_name)[:31] or 'Sheet1', {'"': '&quot;'})
+    now = datetime.utcnow()
+    package = {
+        '[Content_Types].xml':
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '</Types>',
+        '_rels/.rels':
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="xl/workbook.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+            '</Relationships>',
+        'xl/workbook.xml':
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>',
+        'xl/_rels/workbook.xml.rels':
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+            '</Relationships>',
+    }
+    entries = [(name, now, [content.encode()]) for name, content in package.items()]
+    entries.append(('xl/worksheets/sheet1.xml', now, _sheet_chunks(rows)))
+    return stream_generated_zip(entries)
+
+def export_response(rows, export_format, filename, sheet_name=None):
+    """A streamed attachment of rows in export_format ('csv' or 'xlsx').
+
+    The database is read while the response is sent, so the request
+    context (and its session) is kept open until the last chunk.
+    """
+    chunks = xlsx_chunks(rows, sheet_name or filename) if export_format == 'xlsx' else csv_chunks(rows)
+    return Response(stream_with_context(chunks), content_type=FORMATS[export_format], headers={
+        'Content-Disposition': f'attachment; filename={filename}.{export_format}'
+    })
@@ -0,0 +1,270 @@
+"""Background jobs for work that should not hold up a request.
+
+Route handlers enqueue a registered task by name; a worker process runs it
+later with its own app context. Run from the backend directory:
+
+    python jobs.py worker     # run jobs until interrupted
+    python jobs.py stats      # queue depth and latency
+    python jobs.py prune      # delete finished jobs older than JOB_RETENTION
+
+JOB_QUEUE_BACKEND selects where jobs wait:
+
+    'database'  rows in the jobs table, added in the caller's transaction so a
+                job exists only if the work it follows was committed; any
+                number of worker processes may share it
+    'memory'    an in-process list for tests and local runs; run_pending()
+                executes due jobs synchronously
+
+A failing job is retried after JOB_RETRY_BASE * 2**(attempt - 1) seconds
+(capped at JOB_RETRY_MAX) until it has used max_attempts, then it is left
+as 'failed' with its last error. Jobs stuck in 'running' longer than
+JOB_TIMEOUT (a crashed worker) are claimed again.
+"""
+import copy
+import os
+import socket
+import sys
+import threading
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import insert, update, func, or_, and_
+from models import db, Job
+from bulk import UPSERT_DIALECTS
+
+TASKS = {}
+
+def task(name, max_attempts=None):
+    """Register fn as the handler for jobs called name; it receives the payload as keyword arguments"""
+    def register(fn):
+        TASKS[name] = (fn, max_attempts)
+        return fn
+    return register
+
+def retry_delay(attempts, base, cap):
+    return timedelta(seconds=min(cap, base * 2 ** (attempts - 1)))
+
+class DatabaseQueue:
+    """Jobs table shared by every web and worker process"""
+
+    def enqueue(self, values, session=None):
+        session = session or db.session
+        dialect_insert = UPSERT_DIALECTS.get(session.get_bind().dialect.name)
+        if values['idempotency_key'] and dialect_insert is not None:
+            session.execute(
+                dialect_insert(Job).values(**values).on_conflict_do_nothing(index_elements=['idempotency_key'])
+            )
+        elif not values['idempotency_key'] or not session.query(Job).filter_by(idempotency_key=values['idempotency_key']).first():
+            session.execute(insert(Job).values(**values))
+
+    def claim(self, worker_id, now, timeout):
+        """Mark the oldest due job running for worker_id and return it, or None"""
+        while True:
+            candidate = db.session.query(Job.id, Job.attempts).filter(or_(
+                and_(Job.status == 'queued', Job.run_at <= now),
+                and_(Job.status == 'running', Job.started_at < now - timeout)
+            )).order_by(Job.run_at, Job.id).first()
+            if candidate is None:
+                db.session.commit()
+                return None
+            # Another worker may claim the same row; only one conditional UPDATE wins
+            claimed = db.session.execute(
+                update(Job)
+                .where(Job.id == candidate.id, Job.attempts == candidate.attempts)
+                .values(status='running', attempts=candidate.attempts + 1, locked_by=worker_id, started_at=now)
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                job = db.session.get(Job, candidate.id)
+                return {'id': job.id, 'name': job.name, 'payload': job.payload,
+                        'attempts': job.attempts, 'max_attempts': job.max_attempts}
+
+    def finish(self, job_id, values):
+        db.session.execute(update(Job).where(Job.id == job_id).values(**values))
+        db.session.commit()
+
+    def depth(self, now):
+        counts = dict(db.session.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+        oldest = db.session.query(func.min(Job.run_at)).filter(Job.status == 'queued', Job.run_at <= now).scalar()
+        return counts, oldest
+
+    def recent(self, limit):
+        """(run_at, started_at, finished_at) of the most recently finished jobs"""
+        return db.session.query(Job.run_at, Job.started_at, Job.finished_at)\
+            .filter(Job.status == 'done').order_by(Job.finished_at.desc()).limit(limit).all()
+
+    def prune(self, before):
+        removed = Job.query.filter(Job.status.in_(['done', 'failed']), Job.finished_at < before).delete()
+        db.session.commit()
+        return removed
+
+class MemoryQueue:
+    """Per-process job list; nothing survives a restart"""
+
+    def __init__(self):
+        self.jobs = []
+        self.lock = threading.Lock()
+
+    def enqueue(self, values, session=None):
+        with self.lock:
+            key = values['idempotency_key']
+            if key and any(job['idempotency_key'] == key for job in self.jobs):
+                return
+            self.jobs.append({**copy.deepcopy(values), 'id': len(self.jobs) + 1})
+
+    def claim(self, worker_id, now, timeout):
+        with self.lock:
+            due = [job for job in self.jobs if
+                   (job['status'] == 'queued' and job['run_at'] <= now) or
+                   (job['status'] == 'running' and job['started_at'] < now - timeout)]
+            if not due:
+                return None
+            job = min(due, key=lambda job: (job['run_at'], job['id']))
+            job.update(status='running', attempts=job['attempts'] + 1, locked_by=worker_id, started_at=now)
+            return {field: copy.deepcopy(job[field]) for field in ('id', 'name', 'payload', 'attempts', 'max_attempts')}
+
+    def finish(self, job_id, values):
+        with self.lock:
+            self.jobs[job_id - 1].update(values)
+
+    def depth(self, now):
+        with self.lock:
+            counts = {}
+            for job in self.jobs:
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+            due = [job['run_at'] for job in self.jobs if job['status'] == 'queued' and job['run_at'] <= now]
+            return counts, min(due) if due else None
+
+    def recent(self, limit):
+        with self.lock:
+            done = sorted((job for job in self.jobs if job['status'] == 'done'),
+                          key=lambda job: job['finished_at'], reverse=True)[:limit]
+            return [(job['run_at'], job['started_at'], job['finished_at']) for job in done]
+
+    def prune(self, before):
+        # Ids index the list, so finished jobs are kept until the process exits
+        return 0
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class JobQueue:
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config['JOB_QUEUE_BACKEND']
+        if kind == 'database':
+            self.backend = DatabaseQueue()
+        elif kind == 'memory':
+            self.backend = MemoryQueue()
+        else:
+            raise RuntimeError(f'Unknown JOB_QUEUE_BACKEND {kind!r}')
+        app.extensions['jobs'] = self
+
+    def enqueue(self, name, payload=None, idempotency_key=None, delay=None, session=None):
+        """Queue task name to run with payload (a JSON-serialisable dict).
+        With the database backend the job is committed with the caller's
+        transaction (db.session unless another session is given)."""
+        if name not in TASKS:
+            raise KeyError(f'No task registered as {name!r}')
+        now = datetime.utcnow()
+        self.backend.enqueue({
+            'name': name,
+            'payload': payload or {},
+            'idempotency_key': idempotency_key,
+            'status': 'queued',
+            'attempts': 0,
+            'max_attempts': TASKS[name][1] or current_app.config['JOB_MAX_ATTEMPTS'],
+            'run_at': now + delay if delay else now,
+            'created_at': now
+        }, session)
+
+    def run_one(self, worker_id=None):
+        """Claim and run one due job in a fresh app context. Returns False if none was due."""
+        app = current_app._get_current_object()
+        worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        with app.app_context():
+            job = self.backend.claim(worker_id, datetime.utcnow(), app.config['JOB_TIMEOUT'])
+        if job is None:
+            return False
+
+        with app.app_context():
+            try:
+                handler, _ = TASKS[job['name']]
+                handler(**job['payload'])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                error = traceback.format_exc(limit=5)
+                if job['attempts'] < job['max_attempts']:
+                    delay = retry_delay(job['attempts'], app.config['JOB_RETRY_BASE'], app.config['JOB_RETRY_MAX'])
+                    values = {'status': 'queued', 'run_at': datetime.utcnow() + delay, 'last_error': error}
+                else:
+                    values = {'status': 'failed', 'finished_at': datetime.utcnow(), 'last_error': error}
+            else:
+                values = {'status': 'done', 'finished_at': datetime.utcnow(), 'last_error': None}
+            self.backend.finish(job['id'], values)
+        return True
+
+    def run_pending(self):
+        """Run every job that is due now; returns how many ran"""
+        ran = 0
+        while self.run_one():
+            ran += 1
+        return ran
+
+    def work(self, stop=None):
+        """Worker loop: run due jobs, sleeping JOB_POLL_INTERVAL when idle"""
+        stop = stop or threading.Event()
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        while not stop.is_set():
+            if not self.run_one(worker_id):
+                stop.wait(current_app.config['JOB_POLL_INTERVAL'])
+
+    def prune(self):
+        return self.backend.prune(datetime.utcnow() - current_app.config['JOB_RETENTION'])
+
+    def stats(self):
+        """Queue depth by status and wait/run latency over recently finished jobs"""
+        now = datetime.utcnow()
+        counts, oldest_due = self.backend.depth(now)
+        recent = self.backend.recent(current_app.config['JOB_STATS_WINDOW'])
+        waits = [(started - run_at).total_seconds() * 1000 for run_at, started, _ in recent]
+        runs = [(finished - started).total_seconds() * 1000 for _, started, finished in recent]
+        return {
+            'depth': counts.get('queued', 0),
+            'by_status': counts,
+            'oldest_due_age_s': round((now - oldest_due).total_seconds(), 3) if oldest_due else 0.0,
+            'recent_jobs': len(recent),
+            'wait_ms': {'p50': round(_percentile(waits, 50), 2), 'p95': round(_percentile(waits, 95), 2)} if waits else None,
+            'run_ms': {'p50': round(_percentile(runs, 50), 2), 'p95': round(_percentile(runs, 95), 2)} if runs else None
+        }
+
+job_queue = JobQueue()
+
+if __name__ == '__main__':
+    import json
+    from app import create_app
+    # The app registered the task handlers with the imported module, not __main__
+    from jobs import job_queue
+
+    app = create_app()
+    with app.app_context():
+        command = sys.argv[1] if len(sys.argv) > 1 else None
+        if command == 'worker':
+            print(f"Worker {socket.gethostname()}:{os.getpid()} polling {app.config['JOB_QUEUE_BACKEND']} queue")
+            try:
+                job_queue.work()
+            except KeyboardInterrupt:
+                pass
+        elif command == 'stats':
+            print(json.dumps(job_queue.stats(), indent=2))
+        elif command == 'prune':
+            print(f"Removed {job_queue.prune()} finished jobs.")
+        else:
+            print(__doc__)
+            sys.exit(2)
@@ -0,0 +1,248 @@
+"""Per-endpoint request metrics, SQL instrumentation and slow-request profiles.
+
+Every request served by the Flask app records, labelled by endpoint:
+
+    classflow_request_duration_seconds   latency (also by method and status)
+    classflow_request_sql_statements     SQL statements executed
+    classflow_request_sql_seconds        time spent in those statements
+    classflow_request_serialize_seconds  time spent serializing rows (serializers.serialize)
+    classflow_response_size_bytes        body size, when known up front
+
+GET /metrics serves them in the Prometheus text format, with the
+connection pool gauges from database.py, to scrapers that send
+"Authorization: Bearer <METRICS_TOKEN>". Without METRICS_TOKEN set the
+endpoint answers 403. The JSON operational endpoints (/cache-stats,
+/job-stats, /auth-stats, /db-stats) take the same token
+(metrics_token_required). Values are per process; scrape every worker, or
+aggregate with the process label.
+
+With PROFILE_SLOW_REQUESTS on, a sampler thread records the stack of each
+request thread every PROFILE_INTERVAL seconds. Requests slower than
+PROFILE_THRESHOLD write their samples to PROFILE_DIR in the folded-stack
+format that flamegraph.pl, speedscope and inferno render as flame graphs.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, request, has_request_context, current_app, Response
+from sqlalchemy import event
+from database import pool_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by label values"""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            series = self.series.setdefault(label_values, {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self, extra_labels):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for label_values, series in sorted(self.series.items()):
+                labels = format_labels({**dict(zip(self.labels, label_values)), **extra_labels})
+                for bound, count in zip(self.buckets, series['counts']):
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{{labels}}} {series["sum"]:.6f}')
+                lines.append(f'{self.name}_count{{{labels}}} {series["count"]}')
+        return lines
+
+def format_labels(labels):
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+class StackSampler:
+    """Samples the stacks of registered threads from one background thread"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.active = {}  # thread id -> Counter of folded stacks
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='classflow-profiler', daemon=True)
+            self.thread.start()
+
+    def begin(self):
+        with self.lock:
+            self.active[threading.get_ident()] = Counter()
+
+    def end(self):
+        with self.lock:
+            return self.active.pop(threading.get_ident(), None)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                for thread_id, samples in self.active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[fold(frame)] += 1
+
+def fold(frame):
+    """'outer;...;inner' for a frame and its callers"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+def metrics_token_required(f):
+    """Restrict an operational endpoint to callers sending "Authorization:
+    Bearer <METRICS_TOKEN>"; with no token configured, refuse everyone"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        token = current_app.config['METRICS_TOKEN']
+        if not token:
+            return Response('Forbidden: METRICS_TOKEN is not set\n', 403, mimetype='text/plain')
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Unauthorized\n', 401, mimetype='text/plain')
+        return f(*args, **kwargs)
+    return decorated
+
+class RequestMetrics:
+    def __init__(self, app=None):
+        self.duration = Histogram('classflow_request_duration_seconds', 'Request latency',
+                                  ('endpoint', 'method', 'status'), LATENCY_BUCKETS)
+        self.sql_statements = Histogram('classflow_request_sql_statements', 'SQL statements per request',
+                                        ('endpoint',), COUNT_BUCKETS)
+        self.sql_time = Histogram('classflow_request_sql_seconds', 'SQL execution time per request',
+                                  ('endpoint',), LATENCY_BUCKETS)
+        self.serialize_time = Histogram('classflow_request_serialize_seconds', 'Row serialization time per request',
+                                        ('endpoint',), LATENCY_BUCKETS)
+        self.response_size = Histogram('classflow_response_size_bytes', 'Response body size',
+                                       ('endpoint',), SIZE_BUCKETS)
+        self.sampler = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['metrics'] = self
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        with app.app_context():
+            for engine, _ in app.extensions['pool_metrics'].values():
+                instrument_sql(engine)
+        if app.config['PROFILE_SLOW_REQUESTS']:
+            os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+            self.sampler = StackSampler(app.config['PROFILE_INTERVAL'])
+            self.sampler.start()
+
+    def before_request(self):
+        g.metrics = {'started': time.perf_counter(), 'sql_statements': 0, 'sql_time': 0.0,
+                     'serialize_time': 0.0, 'serialize_depth': 0}
+        if self.sampler:
+            self.sampler.begin()
+
+    def after_request(self, response):
+        state = g.pop('metrics', None)
+        if state is None:
+            return response
+        elapsed = time.perf_counter() - state['started']
+        endpoint = request.endpoint or 'unmatched'
+        self.duration.observe(elapsed, endpoint, request.method, str(response.status_code))
+        self.sql_statements.observe(state['sql_statements'], endpoint)
+        self.sql_time.observe(state['sql_time'], endpoint)
+        self.serialize_time.observe(state['serialize_time'], endpoint)
+        # Streamed bodies (archives, file downloads) are only counted when their length is declared
+        size = response.content_length
+        if size is not None:
+            self.response_size.observe(size, endpoint)
+
+        if self.sampler:
+            samples = self.sampler.end()
+            if samples and elapsed >= current_app.config['PROFILE_THRESHOLD']:
+                write_profile(samples, endpoint, elapsed)
+        return response
+
+    def render(self):
+        process = {'process': os.getpid()}
+        lines = []
+        for histogram in (self.duration, self.sql_statements, self.sql_time,
+                          self.serialize_time, self.response_size):
+            lines.extend(histogram.render(process))
+        for name, help, key in (
+            ('classflow_db_connections_open', 'Open DBAPI connections', 'connections_open'),
+            ('classflow_db_connections_checked_out', 'Connections in use', 'checked_out'),
+            ('classflow_db_checkout_timeouts_total', 'Pool checkouts that timed out', 'checkout_timeouts'),
+        ):
+            kind = 'counter' if name.endswith('_total') else 'gauge'
+            lines.extend([f'# HELP {name} {help}', f'# TYPE {name} {kind}'])
+            for pool, stats in pool_stats(current_app).items():
+                if key in stats:
+                    lines.append(f'{name}{{{format_labels({"pool": pool, **process})}}} {stats[key]}')
+        return '\n'.join(lines) + '\n'
+
+    @metrics_token_required
+    def metrics_view(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+def write_profile(samples, endpoint, elapsed):
+    name = re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint)
+    path = os.path.join(current_app.config['PROFILE_DIR'],
+                        f'{time.strftime("%Y%m%d-%H%M%S")}-{name}-{int(elapsed * 1000)}ms-{os.getpid()}.folded')
+    with open(path, 'w') as f:
+        for stack, count in samples.most_common():
+            f.write(f'{stack} {count}\n')
+
+def instrument_sql(engine):
+    """Count statements and time them into the current request's metrics"""
+    # The start time lives on the statement's execution context, which is
+    # dropped with it, so a statement that raises leaves nothing behind
+    @event.listens_for(engine, 'before_cursor_execute')
+    def started(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def finished(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        state = g.get('metrics') if has_request_context() else None
+        if state is not None:
+            state['sql_statements'] += 1
+            state['sql_time'] += elapsed
+
+@contextmanager
+def timed_serialization():
+    """Add the block's duration to the request's serialize time; nested blocks are counted once"""
+    state = g.get('metrics') if has_request_context() else None
+    if state is None:
+        yield
+        return
+    state['serialize_depth'] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        state['serialize_depth'] -= 1
+        if state['serialize_depth'] == 0:
+            state['serialize_time'] += time.perf_counter() - started
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,166 @@
+"""Versioned schema migrations.
+
+Run from the backend directory:
+
+    python migrations.py           # apply pending migrations
+    python migrations.py status    # list applied and pending migrations
+
+Applied versions are recorded in the schema_migrations table. Migration 1
+builds tables from the current models, so later migrations must be
+idempotent (use create_index/add_column below) to be safe on fresh and
+pre-existing databases alike.
+"""
+import sys
+from datetime import datetime
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, inspect, text, select
+from sqlalchemy.orm import Session
+from models import (
+    db, User, Subject, Assignment, Submission, Attendance, AttendanceSummary, UploadSession, Blob, Job, PushEvent,
+    RefreshToken, Enrollment
+)
+
+version_table = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+MIGRATIONS = []
+
+def migration(version, name):
+    """Register an upgrade function under a schema version"""
+    def register(upgrade_fn):
+        MIGRATIONS.append((version, name, upgrade_fn))
+        return upgrade_fn
+    return register
+
+def create_index(conn, name, table, columns, unique=False):
+    """CREATE INDEX unless an index with this name already exists"""
+    if name in {index['name'] for index in inspect(conn).get_indexes(table)}:
+        return
+    unique_sql = 'UNIQUE ' if unique else ''
+    conn.execute(text(f'CREATE {unique_sql}INDEX {name} ON {table} ({", ".join(columns)})'))
+
+def add_column(conn, table, name, ddl):
+    """ALTER TABLE ADD COLUMN unless the column already exists"""
+    if name in {column['name'] for column in inspect(conn).get_columns(table)}:
+        return
+    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}'))
+
+@migration(1, 'initial schema')
+def initial_schema(conn):
+    # Databases created by the old db.create_all() already have these tables
+    db.metadata.create_all(conn, tables=[
+        User.__table__, Subject.__table__, Assignment.__table__,
+        Submission.__table__, Attendance.__table__
+    ])
+
+@migration(2, 'indexes for hot query predicates')
+def hot_path_indexes(conn):
+    create_index(conn, 'ix_users_role_active', 'users', ['role', 'active'])
+    create_index(conn, 'ix_subjects_teacher', 'subjects', ['teacher_id'])
+    create_index(conn, 'ix_assignments_subject_due', 'assignments', ['subject_id', 'due_date'])
+    create_index(conn, 'ix_submissions_assignment_submitted', 'submissions', ['assignment_id', 'submitted_at', 'id'])
+    create_index(conn, 'ix_submissions_student_submitted', 'submissions', ['student_id', 'submitted_at', 'id'])
+    create_index(conn, 'ix_attendance_subject_date', 'attendance', ['subject_id', 'date', 'id'])
+    create_index(conn, 'ix_attendance_student_date', 'attendance', ['student_id', 'date', 'id'])
+    create_index(conn, 'ix_attendance_student_subject_date', 'attendance', ['student_id', 'subject_id', 'date'])
+
+@migration(3, 'attendance summary rollups')
+def attendance_summaries(conn):
+    from rollups import rebuild
+
+    AttendanceSummary.__table__.create(conn, checkfirst=True)
+    session = Session(bind=conn)
+    rebuild(session=session)
+    session.flush()
+
+@migration(4, 'chunked upload sessions and submission checksums')
+def upload_sessions(conn):
+    UploadSession.__table__.create(conn, checkfirst=True)
+    add_column(conn, 'submissions', 'sha256', 'VARCHAR(64)')
+
+@migration(5, 'content-addressed submission storage')
+def blob_storage(conn):
+    from storage import migrate_legacy_files
+
+    Blob.__table__.create(conn, checkfirst=True)
+    add_column(conn, 'submissions', 'filename', 'VARCHAR(255)')
+    create_index(conn, 'ix_submissions_blob', 'submissions', ['file_path'])
+    # Copies files; the old flat-layout originals are removed by `python storage.py gc`
+    session = Session(bind=conn)
+    migrate_legacy_files(session)
+    session.flush()
+
+@migration(6, 'background jobs and submission post-processing')
+def background_jobs(conn):
+    Job.__table__.create(conn, checkfirst=True)
+    add_column(conn, 'submissions', 'scan_status', 'VARCHAR(20)')
+    add_column(conn, 'submissions', 'processed_at', 'DATETIME')
+
+@migration(7, 'websocket push event outbox')
+def push_events(conn):
+    PushEvent.__table__.create(conn, checkfirst=True)
+
+@migration(8, 'refresh tokens')
+def refresh_tokens(conn):
+    RefreshToken.__table__.create(conn, checkfirst=True)
+
+@migration(9, 'subject enrollments')
+def enrollments(conn):
+    Enrollment.__table__.create(conn, checkfirst=True)
+    # Enroll every student who already has attendance or a submission in a subject
+    conn.execute(text(
+        "INSERT INTO enrollments (subject_id, student_id, created_at) "
+        "SELECT subject_id, student_id, :now FROM ("
+        "  SELECT subject_id, student_id FROM attendance"
+        "  UNION"
+        "  SELECT assignments.subject_id, submissions.student_id FROM submissions"
+        "  JOIN assignments ON assignments.id = submissions.assignment_id"
+        ") AS existing "
+        "WHERE NOT EXISTS (SELECT 1 FROM enrollments WHERE enrollments.subject_id = existing.subject_id"
+        "  AND enrollments.student_id = existing.student_id)"
+    ), {'now': datetime.utcnow()})
+
+def applied_versions(conn):
+    version_table.create(conn, checkfirst=True)
+    return {row.version for row in conn.execute(select(version_table.c.version))}
+
+def upgrade(engine=None):
+    """Apply pending migrations in version order, one transaction each.
+    Returns the list of versions applied."""
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        applied = applied_versions(conn)
+
+    newly_applied = []
+    for version, name, upgrade_fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            upgrade_fn(conn)
+            conn.execute(version_table.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            ))
+        newly_applied.append(version)
+    return newly_applied
+
+def status(engine=None):
+    """Return [(version, name, applied)] for every known migration"""
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        applied = applied_versions(conn)
+    return [(version, name, version in applied) for version, name, _ in sorted(MIGRATIONS, key=lambda m: m[0])]
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        if len(sys.argv) > 1 and sys.argv[1] == 'status':
+            for version, name, applied in status():
+                print(f"{version:>4}  {'applied' if applied else 'pending':<8} {name}")
+        else:
+            versions = upgrade()
+            print(f"Applied migrations: {versions}" if versions else "Database is up to date.")
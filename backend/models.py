@@ -1,8 +1,11 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import select, func
+from sqlalchemy.orm import column_property
+from replicas import RoutingSession
+from passwords import password_hasher
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -14,16 +17,20 @@ class User(db.Model):
     role = db.Column(db.String(20), nullable=False)  # 'teacher' or 'student'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_users_role_active', 'role', 'active'),
+    )
+    
     # Relationships
     taught_subjects = db.relationship('Subject', backref='teacher', lazy=True, foreign_keys='Subject.teacher_id')
     submissions = db.relationship('Submission', backref='student', lazy=True, foreign_keys='Submission.student_id')
     attendances = db.relationship('Attendance', backref='student', lazy=True, foreign_keys='Attendance.student_id')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
     
     def to_dict(self):
         return {
@@ -41,9 +48,15 @@ class Subject(db.Model):
     teacher_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_subjects_teacher', 'teacher_id'),
+    )
+    
     # Relationships
     assignments = db.relationship('Assignment', backref='subject', lazy=True, cascade='all, delete-orphan')
     attendances = db.relationship('Attendance', backref='subject', lazy=True, cascade='all, delete-orphan')
+    attendance_summaries = db.relationship('AttendanceSummary', backref='subject', lazy=True, cascade='all, delete-orphan')
+    enrollments = db.relationship('Enrollment', backref='subject', lazy=True, cascade='all, delete-orphan')
     
     def to_dict(self):
         return {
@@ -54,6 +67,20 @@ class Subject(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class Enrollment(db.Model):
+    """A student on a subject's roster. The primary key serves roster
+    lookups (subject -> students); ix_enrollments_student serves a
+    student's subject list."""
+    __tablename__ = 'enrollments'
+    
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_enrollments_student', 'student_id', 'subject_id'),
+    )
+
 class Assignment(db.Model):
     __tablename__ = 'assignments'
     
@@ -64,6 +91,10 @@ class Assignment(db.Model):
     due_date = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_assignments_subject_due', 'subject_id', 'due_date'),
+    )
+    
     # Relationships
     submissions = db.relationship('Submission', backref='assignment', lazy=True, cascade='all, delete-orphan')
     
@@ -76,7 +107,7 @@ class Assignment(db.Model):
             'description': self.description,
             'due_date': self.due_date.isoformat() if self.due_date else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'submission_count': len(self.submissions)
+            'submission_count': self.submission_count
         }
 
 class Submission(db.Model):
@@ -85,13 +116,26 @@ class Submission(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     assignment_id = db.Column(db.Integer, db.ForeignKey('assignments.id'), nullable=False)
     student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    file_path = db.Column(db.String(500), nullable=False)
+    # SHA-256 key of the file in blob storage (storage.py); the column keeps
+    # its pre-blob name, file_path, so existing databases need no rebuild
+    blob_key = db.Column('file_path', db.String(500), nullable=False)
+    filename = db.Column(db.String(255))  # original (secured) upload name
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     grade = db.Column(db.String(10))
     feedback = db.Column(db.Text)
+    sha256 = db.Column(db.String(64))  # hex digest of the stored file
+    # Set by the submission.postprocess background job (tasks.py)
+    scan_status = db.Column(db.String(20), default='pending')  # pending, clean, infected, skipped
+    processed_at = db.Column(db.DateTime)
     
     # Unique constraint: one submission per student per assignment
-    __table_args__ = (db.UniqueConstraint('assignment_id', 'student_id', name='unique_assignment_student'),)
+    __table_args__ = (
+        db.UniqueConstraint('assignment_id', 'student_id', name='unique_assignment_student'),
+        # Keyset pagination sort keys: (submitted_at, id) within an assignment or a student
+        db.Index('ix_submissions_assignment_submitted', 'assignment_id', 'submitted_at', 'id'),
+        db.Index('ix_submissions_student_submitted', 'student_id', 'submitted_at', 'id'),
+        db.Index('ix_submissions_blob', 'file_path'),
+    )
     
     def to_dict(self):
         return {
@@ -99,11 +143,15 @@ class Submission(db.Model):
             'assignment_id': self.assignment_id,
             'student_id': self.student_id,
             'student_email': self.student.email if self.student else None,
-            'file_path': self.file_path,
-            'filename': self.file_path.split('/')[-1] if self.file_path else None,
+            'blob_key': self.blob_key,
+            # Pre-blob-storage name of the same column value, kept for API clients
+            'file_path': self.blob_key,
+            'filename': self.filename,
             'submitted_at': self.submitted_at.isoformat() if self.submitted_at else None,
             'grade': self.grade,
             'feedback': self.feedback,
+            'sha256': self.sha256,
+            'scan_status': self.scan_status,
             'is_late': self.submitted_at > self.assignment.due_date if self.assignment and self.submitted_at else False
         }
 
@@ -118,7 +166,13 @@ class Attendance(db.Model):
     marked_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Unique constraint: one attendance record per student per subject per day
-    __table_args__ = (db.UniqueConstraint('subject_id', 'student_id', 'date', name='unique_attendance'),)
+    __table_args__ = (
+        db.UniqueConstraint('subject_id', 'student_id', 'date', name='unique_attendance'),
+        # Keyset pagination sort keys: (date, id) within a subject or a student
+        db.Index('ix_attendance_subject_date', 'subject_id', 'date', 'id'),
+        db.Index('ix_attendance_student_date', 'student_id', 'date', 'id'),
+        db.Index('ix_attendance_student_subject_date', 'student_id', 'subject_id', 'date'),
+    )
     
     def to_dict(self):
         return {
@@ -130,4 +184,143 @@ class Attendance(db.Model):
             'date': self.date.isoformat() if self.date else None,
             'status': self.status,
             'marked_at': self.marked_at.isoformat() if self.marked_at else None
-        }
\ No newline at end of file
+        }
+
+class Blob(db.Model):
+    """A stored file, shared by every submission with the same content"""
+    __tablename__ = 'blobs'
+    
+    key = db.Column(db.String(64), primary_key=True)  # SHA-256 hex digest
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UploadSession(db.Model):
+    """A chunked submission upload in progress (see upload_routes.py)"""
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, used in URLs
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignments.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    declared_size = db.Column(db.BigInteger, nullable=False)
+    received_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'assignment_id': self.assignment_id,
+            'filename': self.filename,
+            'declared_size': self.declared_size,
+            'received_bytes': self.received_bytes,
+            'complete': self.received_bytes == self.declared_size,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class Job(db.Model):
+    """A unit of background work (see jobs.py)"""
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # registered task name
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    # Enqueueing a key that already exists is a no-op
+    idempotency_key = db.Column(db.String(200), unique=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        # Workers claim the oldest due job
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'payload': self.payload,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class PushEvent(db.Model):
+    """Outbox of WebSocket events, written in the transaction that caused them
+    and relayed to connected clients by push_server.py"""
+    __tablename__ = 'push_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    user_ids = db.Column(db.JSON, nullable=False, default=list)  # delivered to these users' connections
+    channels = db.Column(db.JSON, nullable=False, default=list)  # and to subscribers of e.g. 'subject:3'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class RefreshToken(db.Model):
+    """Opaque token exchanged at /refresh for a new access token. Only its
+    SHA-256 is stored. Each use revokes it and issues the next token of the
+    same family (one family per login); a revoked token presented again
+    revokes the whole family."""
+    __tablename__ = 'refresh_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    family = db.Column(db.String(32), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime)
+
+class AttendanceSummary(db.Model):
+    """Per-(subject, student) rollup of Attendance, kept current by mark_attendance
+    (see rollups.py). current_streak counts consecutive PRESENT marks ending at
+    last_marked_date."""
+    __tablename__ = 'attendance_summaries'
+    
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    present_count = db.Column(db.Integer, nullable=False, default=0)
+    absent_count = db.Column(db.Integer, nullable=False, default=0)
+    last_marked_date = db.Column(db.Date)
+    current_streak = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_attendance_summaries_student', 'student_id'),
+    )
+    
+    def to_dict(self):
+        total = self.present_count + self.absent_count
+        return {
+            'subject_id': self.subject_id,
+            'student_id': self.student_id,
+            'total': total,
+            'present': self.present_count,
+            'absent': self.absent_count,
+            'percentage': round(self.present_count / total * 100, 2) if total else 0,
+            'last_marked_date': self.last_marked_date.isoformat() if self.last_marked_date else None,
+            'current_streak': self.current_streak
+        }
+
+# Deferred COUNT subquery; list queries undefer it (see serializers.py) so the
+# count is computed in the same SELECT instead of loading every submission
+Assignment.submission_count = column_property(
+    select(func.count(Submission.id))
+    .where(Submission.assignment_id == Assignment.id)
+    .correlate_except(Submission)
+    .scalar_subquery(),
+    deferred=True
+)
@@ -0,0 +1,98 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from flask import request, current_app
+from sqlalchemy import and_, or_
+
+class PaginationError(ValueError):
+    """Raised for a malformed cursor or limit"""
+
+def encode_cursor(values):
+    """Encode the sort key of the last row as an opaque, URL-safe cursor"""
+    raw = json.dumps([value.isoformat() if isinstance(value, (date, datetime)) else value
+                      for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, columns):
+    """Decode a cursor back into sort key values typed like `columns`"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw_values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise PaginationError('Invalid cursor!')
+
+    if not isinstance(raw_values, list) or len(raw_values) != len(columns):
+        raise PaginationError('Invalid cursor!')
+
+    values = []
+    for column, raw in zip(columns, raw_values):
+        python_type = column.type.python_type
+        try:
+            if python_type in (date, datetime):
+                values.append(python_type.fromisoformat(raw))
+            else:
+                values.append(python_type(raw))
+        except (TypeError, ValueError):
+            raise PaginationError('Invalid cursor!')
+    return values
+
+def keyset_filter(columns, values, descending=False):
+    """Rows strictly after `values` in (columns...) order, e.g. for (date, id) descending:
+    date < :date OR (date = :date AND id < :id)"""
+    clauses = []
+    for i, column in enumerate(columns):
+        beyond = column < values[i] if descending else column > values[i]
+        equal_prefix = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal_prefix, beyond))
+    return or_(*clauses)
+
+def is_paginated():
+    """Pagination is opt-in: legacy clients that send neither parameter get full lists"""
+    return 'limit' in request.args or 'cursor' in request.args
+
+def page_size():
+    max_size = current_app.config['MAX_PAGE_SIZE']
+    raw = request.args.get('limit')
+    if raw is None:
+        return current_app.config['DEFAULT_PAGE_SIZE']
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise PaginationError('Invalid limit!')
+    if limit < 1:
+        raise PaginationError('Invalid limit!')
+    return min(limit, max_size)
+
+def paginate(query, columns, descending=False):
+    """Order `query` by `columns` and, when the request asks for a page,
+    return only rows after the cursor.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page and
+    whenever the request is not paginated.
+    """
+    order = [column.desc() if descending else column.asc() for column in columns]
+    query = query.order_by(*order)
+
+    if not is_paginated():
+        return query.all(), None
+
+    limit = page_size()
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = query.filter(keyset_filter(columns, decode_cursor(cursor, columns), descending))
+
+    # Fetch one extra row to learn whether another page exists
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, column.key) for column in columns])
+
+def page_response(items, next_cursor):
+    """Envelope for endpoints whose unpaginated response is a bare JSON array"""
+    if not is_paginated():
+        return items
+    return {'items': items, 'next_cursor': next_cursor}
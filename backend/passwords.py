@@ -0,0 +1,154 @@
+"""Password hashing off the request threads, with admission control.
+
+Hashes are deliberately slow, so a burst of logins at the start of a class
+can take every CPU the workers have and leave the other endpoints queueing
+behind it. Here hashes are computed in a small process pool of
+PASSWORD_HASH_WORKERS processes per app process, run PASSWORD_HASH_NICE
+steps below normal scheduling priority, so logins never use more than
+that many CPUs and the request threads keep theirs. PASSWORD_HASH_WORKERS
+= 0 hashes on the request thread instead.
+
+At most PASSWORD_HASH_QUEUE hashes are queued or running per app process.
+A login that cannot get a slot within PASSWORD_HASH_WAIT seconds is
+answered 503 with Retry-After (PASSWORD_HASH_RETRY_AFTER) rather than
+waiting indefinitely while it holds a worker thread.
+
+PASSWORD_HASH_METHOD sets the parameters of new hashes in Werkzeug's
+format, e.g. 'pbkdf2:sha256:600000' or 'scrypt:32768:8:1'. A successful
+login whose stored hash used other parameters stores a new hash of the
+password (needs_rehash), so changing the cost migrates users as they sign in.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+DEFAULT_METHOD = f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+
+class Overloaded(Exception):
+    """No hashing slot became free within PASSWORD_HASH_WAIT"""
+
+    def __init__(self, retry_after):
+        super().__init__('Too many sign-ins at once, please retry shortly.')
+        self.retry_after = retry_after
+
+def normalize_method(method):
+    """method with Werkzeug's defaults filled in, as it appears in stored hashes"""
+    name, *args = method.split(':')
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{int(iterations)}'
+    if name == 'scrypt':
+        n, r, p = args if args else (2 ** 15, 8, 1)
+        return f'scrypt:{int(n)}:{int(r)}:{int(p)}'
+    return method
+
+def lower_priority(increment):
+    """Pool initializer: let request handling win the CPU over hashing"""
+    if increment:
+        os.nice(increment)
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.method = DEFAULT_METHOD
+        self.workers = 0
+        self.nice = 0
+        self.wait = 0
+        self.retry_after = 1
+        self.slots = None
+        self.executor = None
+        self.executor_pid = None
+        self.lock = threading.Lock()
+        self.hashes = 0
+        self.rehashes = 0
+        self.rejected = 0
+        self.durations = deque(maxlen=1000)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['password_hasher'] = self
+        self.method = normalize_method(app.config['PASSWORD_HASH_METHOD'])
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.nice = app.config['PASSWORD_HASH_NICE']
+        self.wait = app.config['PASSWORD_HASH_WAIT']
+        self.retry_after = app.config['PASSWORD_HASH_RETRY_AFTER']
+        self.slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_QUEUE'])
+
+    def _executor(self):
+        # Created on first use in each process: pools do not survive a fork
+        # (gunicorn forks its workers after create_app()). The pool's own
+        # processes are spawned, not forked from a threaded server, so
+        # scripts that hash must keep their code under `if __name__ == '__main__':`
+        with self.lock:
+            if self.executor is None or self.executor_pid != os.getpid():
+                self.executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=lower_priority, initargs=(self.nice,)
+                )
+                self.executor_pid = os.getpid()
+            return self.executor
+
+    def _run(self, fn, *args):
+        if self.slots is not None and not self.slots.acquire(timeout=self.wait):
+            with self.lock:
+                self.rejected += 1
+            raise Overloaded(self.retry_after)
+        started = time.perf_counter()
+        try:
+            if not self.workers:
+                return fn(*args)
+            try:
+                return self._executor().submit(fn, *args).result()
+            except BrokenProcessPool:
+                # A pool process died; start a fresh pool on the next call
+                with self.lock:
+                    self.executor = None
+                return fn(*args)
+        finally:
+            if self.slots is not None:
+                self.slots.release()
+            with self.lock:
+                self.hashes += 1
+                self.durations.append(time.perf_counter() - started)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when password_hash was made with parameters other than PASSWORD_HASH_METHOD"""
+        method = password_hash.split('$', 1)[0]
+        return normalize_method(method) != self.method
+
+    def rehashed(self):
+        with self.lock:
+            self.rehashes += 1
+
+    def stats(self):
+        with self.lock:
+            durations = sorted(self.durations)
+            stats = {
+                'method': self.method,
+                'workers': self.workers,
+                'hashes': self.hashes,
+                'rehashes': self.rehashes,
+                'rejected': self.rejected,
+            }
+        if durations:
+            pick = lambda pct: durations[min(len(durations) - 1, int(round(pct / 100 * (len(durations) - 1))))]
+            stats['duration_ms'] = {
+                'p50': round(pick(50) * 1000, 3),
+                'p95': round(pick(95) * 1000, 3),
+                'max': round(durations[-1] * 1000, 3),
+            }
+        return stats
+
+password_hasher = PasswordHasher()
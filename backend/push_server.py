@@ -0,0 +1,283 @@
+"""WebSocket push server for frontend/src/services/websocket.js.
+
+Run from the backend directory next to the Flask app, with the front proxy
+(or the Vite dev server) routing /ws here:
+
+    python push_server.py        # listens on PUSH_HOST:PUSH_PORT
+
+Clients connect to /ws?token=<JWT> with the same token the REST API uses.
+Messages in both directions are {"type": ..., "payload": ...}. A client
+receives every event addressed to its user and, after sending
+subscribe_attendance {subject_id} or subscribe_assignment {assignment_id},
+the events of that channel.
+
+Routes write events to the push_events outbox (events.py) inside their own
+transactions; this process tails the outbox by id and fans each event out.
+Each client has a bounded send queue; a client that falls PUSH_QUEUE_SIZE
+messages behind is disconnected (close code 1013) rather than letting its
+backlog grow, and reconnects to reload state.
+"""
+import asyncio
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+import jwt
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+from models import db, Subject, Assignment, PushEvent
+from auth import load_user
+from enrollments import is_enrolled
+
+logger = logging.getLogger('classflow.push')
+
+class Client:
+    """One connection: its user, subscribed channels and send queue"""
+
+    def __init__(self, websocket, user, queue_size):
+        self.websocket = websocket
+        self.user = user
+        self.channels = set()
+        self.queue = asyncio.Queue(queue_size)
+
+    def offer(self, message):
+        """Queue message for sending; False if the client is too far behind"""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def send_loop(self):
+        # websocket.send() waits while the socket's write buffer is full, so a
+        # slow reader backs up into self.queue, which offer() bounds
+        while True:
+            await self.websocket.send(await self.queue.get())
+
+class Hub:
+    """Connected clients indexed by user id and by channel"""
+
+    def __init__(self):
+        self.by_user = {}
+        self.by_channel = {}
+        self.events = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def add(self, client):
+        self.by_user.setdefault(client.user['id'], set()).add(client)
+
+    def remove(self, client):
+        self.by_user.get(client.user['id'], set()).discard(client)
+        if not self.by_user.get(client.user['id']):
+            self.by_user.pop(client.user['id'], None)
+        for channel in client.channels:
+            subscribers = self.by_channel.get(channel, set())
+            subscribers.discard(client)
+            if not subscribers:
+                self.by_channel.pop(channel, None)
+
+    def subscribe(self, client, channel):
+        client.channels.add(channel)
+        self.by_channel.setdefault(channel, set()).add(client)
+
+    def unsubscribe(self, client, channel):
+        client.channels.discard(channel)
+        self.by_channel.get(channel, set()).discard(client)
+
+    def dispatch(self, event_type, payload, user_ids, channels):
+        """Send one event to its users and channel subscribers, each client once"""
+        targets = set()
+        for user_id in user_ids:
+            targets.update(self.by_user.get(user_id, ()))
+        for channel in channels:
+            targets.update(self.by_channel.get(channel, ()))
+        if not targets:
+            return
+        # Serialised once, however many clients receive it
+        message = json.dumps({'type': event_type, 'payload': payload})
+        self.events += 1
+        for client in targets:
+            if client.offer(message):
+                self.delivered += 1
+            else:
+                self.dropped += 1
+                asyncio.ensure_future(client.websocket.close(1013, 'Too far behind'))
+
+    def stats(self):
+        return {
+            'connections': sum(len(clients) for clients in self.by_user.values()),
+            'users': len(self.by_user),
+            'channels': len(self.by_channel),
+            'events': self.events,
+            'delivered': self.delivered,
+            'dropped_slow_clients': self.dropped
+        }
+
+class PushServer:
+    def __init__(self, app):
+        self.app = app
+        self.config = app.config
+        self.hub = Hub()
+        self.last_id = 0
+
+    # Database access runs in worker threads so the event loop never blocks
+
+    def _authenticate(self, token):
+        try:
+            claims = jwt.decode(token, self.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+        except jwt.InvalidTokenError:
+            return None
+        with self.app.app_context():
+            user = load_user(claims['sub'])
+            if not user or not user.active:
+                return None
+            return {'id': user.id, 'role': user.role, 'exp': claims['exp']}
+
+    def _may_subscribe(self, user, channel):
+        kind, _, raw_id = channel.partition(':')
+        try:
+            object_id = int(raw_id)
+        except ValueError:
+            return False
+        with self.app.app_context():
+            if kind == 'subject':
+                if user['role'] == 'student':
+                    # Only the subjects on the student's roster, as with the REST lists
+                    return is_enrolled(user['id'], object_id)
+                subject = Subject.query.get(object_id)
+                return bool(subject) and subject.teacher_id == user['id']
+            if kind == 'assignment':
+                assignment = Assignment.query.get(object_id)
+                # Submission events carry student details, so only the owning teacher
+                return bool(assignment) and assignment.subject.teacher_id == user['id']
+        return False
+
+    def _latest_id(self):
+        with self.app.app_context():
+            return db.session.query(db.func.max(PushEvent.id)).scalar() or 0
+
+    def _events_after(self, last_id):
+        with self.app.app_context():
+            rows = PushEvent.query.filter(PushEvent.id > last_id)\
+                .order_by(PushEvent.id).limit(self.config['PUSH_BATCH_SIZE']).all()
+            return [(row.id, row.type, row.payload, row.user_ids, row.channels) for row in rows]
+
+    def _prune(self):
+        with self.app.app_context():
+            cutoff = datetime.utcnow() - self.config['PUSH_EVENT_RETENTION']
+            PushEvent.query.filter(PushEvent.created_at < cutoff, PushEvent.id < self.last_id).delete()
+            db.session.commit()
+
+    async def relay(self):
+        """Tail the outbox and dispatch events in id order.
+
+        Ids can commit out of order on databases with concurrent writers, so
+        a missing id holds delivery back for up to PUSH_GAP_TIMEOUT before it
+        is treated as a rolled-back transaction and skipped.
+        """
+        self.last_id = await asyncio.to_thread(self._latest_id)
+        gap_since = None
+        last_prune = time.monotonic()
+        while True:
+            events = await asyncio.to_thread(self._events_after, self.last_id)
+            for event_id, event_type, payload, user_ids, channels in events:
+                if event_id != self.last_id + 1:
+                    gap_since = gap_since or time.monotonic()
+                    if time.monotonic() - gap_since < self.config['PUSH_GAP_TIMEOUT']:
+                        break
+                gap_since = None
+                self.hub.dispatch(event_type, payload, user_ids, channels)
+                self.last_id = event_id
+            else:
+                if len(events) == self.config['PUSH_BATCH_SIZE']:
+                    continue
+            if time.monotonic() - last_prune > 60:
+                await asyncio.to_thread(self._prune)
+                last_prune = time.monotonic()
+            await asyncio.sleep(self.config['PUSH_POLL_INTERVAL'])
+
+    async def process_request(self, connection, request):
+        """Reject anything but an authenticated /ws upgrade before the handshake"""
+        url = urlparse(request.path)
+        if url.path != '/ws':
+            return connection.respond(404, 'Not found\n')
+        token = parse_qs(url.query).get('token', [None])[0]
+        user = await asyncio.to_thread(self._authenticate, token) if token else None
+        if user is None:
+            return connection.respond(401, 'Unauthorized\n')
+        connection.user = user
+        return None
+
+    async def handle(self, websocket):
+        client = Client(websocket, websocket.user, self.config['PUSH_QUEUE_SIZE'])
+        self.hub.add(client)
+        sender = asyncio.ensure_future(client.send_loop())
+        # Tokens are not re-checked per message; close the socket when this one expires
+        expiry = asyncio.get_running_loop().call_later(
+            max(0, client.user['exp'] - time.time()),
+            lambda: asyncio.ensure_future(websocket.close(4001, 'Token expired'))
+        )
+        try:
+            async for raw in websocket:
+                await self.on_message(client, raw)
+        except ConnectionClosed:
+            pass
+        finally:
+            expiry.cancel()
+            sender.cancel()
+            self.hub.remove(client)
+
+    async def on_message(self, client, raw):
+        try:
+            message = json.loads(raw)
+            kind, payload = message['type'], message.get('payload') or {}
+        except (ValueError, KeyError, TypeError):
+            return
+        channel = {
+            'subscribe_attendance': 'subject:{subject_id}',
+            'subscribe_assignment': 'assignment:{assignment_id}',
+            'unsubscribe_attendance': 'subject:{subject_id}',
+            'unsubscribe_assignment': 'assignment:{assignment_id}',
+        }.get(kind)
+        if channel is None:
+            return
+        try:
+            channel = channel.format(**payload)
+        except (KeyError, TypeError):
+            return
+        if kind.startswith('unsubscribe'):
+            self.hub.unsubscribe(client, channel)
+        elif await asyncio.to_thread(self._may_subscribe, client.user, channel):
+            self.hub.subscribe(client, channel)
+            client.offer(json.dumps({'type': 'subscribed', 'payload': {'channel': channel}}))
+        else:
+            client.offer(json.dumps({'type': 'error', 'payload': {'message': f'Cannot subscribe to {channel}'}}))
+
+    async def serve(self, host=None, port=None, ready=None):
+        """Serve until cancelled; ready (an asyncio.Future) receives the bound port"""
+        async with serve(
+            self.handle,
+            host or self.config['PUSH_HOST'],
+            self.config['PUSH_PORT'] if port is None else port,
+            process_request=self.process_request,
+            compression=None,  # events are small; per-connection deflate state costs more than it saves
+            max_size=64 * 1024
+        ) as server:
+            if ready is not None:
+                ready.set_result(server.sockets[0].getsockname()[1])
+            await self.relay()
+
+if __name__ == '__main__':
+    from app import create_app
+
+    logging.basicConfig(level=logging.INFO)
+    app = create_app()
+    push = PushServer(app)
+    logger.info('Push server on ws://%s:%s/ws', app.config['PUSH_HOST'], app.config['PUSH_PORT'])
+    try:
+        asyncio.run(push.serve())
+    except KeyboardInterrupt:
+        sys.exit(0)
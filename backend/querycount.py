@@ -0,0 +1,35 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from models import db
+
+@contextmanager
+def count_queries(engine=None):
+    """Collect every SQL statement executed inside the block.
+
+    Yields a list that fills with statement strings, e.g.
+
+        with count_queries() as statements:
+            client.get('/api/my-submissions', headers=headers)
+        assert len(statements) == 3
+    """
+    engine = engine or db.engine
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+@contextmanager
+def assert_num_queries(expected, engine=None):
+    """Fail if the block does not issue exactly `expected` SQL statements"""
+    with count_queries(engine) as statements:
+        yield statements
+    if len(statements) != expected:
+        raise AssertionError(
+            f'Expected {expected} SQL statements, got {len(statements)}:\n' + '\n'.join(statements)
+        )
@@ -0,0 +1,60 @@
+"""Attendance registers: a subject's students x dates grid.
+
+Built from a narrow SELECT of (student_id, date, status) tuples, so a
+term-long register never instantiates an Attendance object or loads its
+subject and student. Each student's row is packed into a string with one
+character per date, e.g. "PPA-P", using STATUS_CODES, with UNMARKED
+for dates the student has no mark on.
+"""
+from sqlalchemy import select, union
+from models import db, User, Attendance, Enrollment
+
+STATUS_CODES = {'PRESENT': 'P', 'ABSENT': 'A'}
+UNMARKED = '-'
+
+def marks_criteria(subject_id, start_date=None, end_date=None):
+    criteria = [Attendance.subject_id == subject_id]
+    if start_date is not None:
+        criteria.append(Attendance.date >= start_date)
+    if end_date is not None:
+        criteria.append(Attendance.date <= end_date)
+    return criteria
+
+def marks_statement(criteria):
+    return select(Attendance.student_id, Attendance.date, Attendance.status).where(*criteria)
+
+def students_statement(subject_id, criteria):
+    """The roster plus anyone marked under `criteria`, by email"""
+    student_ids = union(
+        select(Enrollment.student_id).where(Enrollment.subject_id == subject_id),
+        select(Attendance.student_id).where(*criteria)
+    )
+    return select(User.id, User.email).where(User.id.in_(student_ids)).order_by(User.email)
+
+def attendance_matrix(subject_id, start_date=None, end_date=None):
+    """The subject's register between two dates (inclusive, either optional).
+
+    Returns {'dates': [...], 'students': [{'id', 'email'}], 'rows': [...],
+    'codes': {...}}: rows[i][j] is students[i]'s mark on dates[j]. Dates
+    are those with at least one mark; students are the current roster plus
+    anyone marked in the range, ordered by email.
+    """
+    criteria = marks_criteria(subject_id, start_date, end_date)
+    # Core execution: plain tuples without the ORM's per-row result processing
+    marks = db.session.connection().execute(marks_statement(criteria)).all()
+    students = db.session.execute(students_statement(subject_id, criteria)).all()
+
+    dates = sorted({mark_date for _, mark_date, _ in marks})
+    columns = {mark_date: index for index, mark_date in enumerate(dates)}
+    blank = UNMARKED.encode() * len(dates)
+    grid = {student_id: bytearray(blank) for student_id, _ in students}
+    codes = {status: ord(code) for status, code in STATUS_CODES.items()}
+    for student_id, mark_date, status in marks:
+        grid[student_id][columns[mark_date]] = codes.get(status, ord('?'))
+
+    return {
+        'dates': [mark_date.isoformat() for mark_date in dates],
+        'students': [{'id': student_id, 'email': email} for student_id, email in students],
+        'rows': [grid[student_id].decode() for student_id, _ in students],
+        'codes': {**{code: status for status, code in STATUS_CODES.items()}, UNMARKED: None}
+    }
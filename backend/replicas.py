@@ -0,0 +1,165 @@
+"""Read-replica routing for the Flask-SQLAlchemy session.
+
+With DATABASE_REPLICA_URLS set, reads made while serving a GET or HEAD
+request go to a replica; everything else uses the primary:
+
+    - flushes and INSERT/UPDATE/DELETE statements
+    - every statement after the request's session has written anything
+    - requests from a user who committed a write within the last
+      REPLICA_STICKY_WINDOW seconds (read-your-writes), tracked in the
+      user cache's store, so shared across workers when USER_CACHE_URL is set.
+      The writer is the access token's user, or the one named with
+      wrote_as() by requests that have no token yet (register, login)
+    - code inside `with read_from_primary():`
+
+A replica that cannot be connected to is skipped for
+REPLICA_RETRY_INTERVAL seconds; if none is available the request reads
+from the primary. Each request uses one replica connection throughout, so
+its reads see a single point in the replica's history.
+
+Cached responses (response_cache.py) filled from a lagging replica can
+trail other users' writes until they expire after RESPONSE_CACHE_TTL.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, request, has_request_context, current_app
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+
+READ_METHODS = ('GET', 'HEAD')
+
+class RoutingSession(FlaskSession):
+    """Session whose reads may be served by a replica connection"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self.info.get('replica_flushing') and not getattr(clause, 'is_dml', False) \
+                and not self.info.get('replica_wrote'):
+            router = current_app.extensions.get('replicas') if has_request_context() else None
+            connection = router.read_connection() if router else None
+            if connection is not None:
+                return connection
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+class ReplicaRouter:
+    def __init__(self, engines, sticky, retry_interval):
+        self.engines = engines          # {bind key: Engine}
+        self.sticky = sticky            # user id -> recently wrote, with TTL
+        self.retry_interval = retry_interval
+        self.down_until = {}
+        self.lock = threading.Lock()
+        self.reads = {key: 0 for key in engines}
+        self.primary_reads = 0
+        self.failovers = 0
+
+    def _available(self):
+        now = time.monotonic()
+        with self.lock:
+            return [key for key in self.engines if self.down_until.get(key, 0) <= now]
+
+    def _mark_down(self, key):
+        with self.lock:
+            self.down_until[key] = time.monotonic() + self.retry_interval
+            self.failovers += 1
+
+    def read_connection(self):
+        """This request's replica connection, or None to use the primary"""
+        if request.method not in READ_METHODS or g.get('read_from_primary'):
+            return None
+        if 'replica_connection' in g:
+            return g.replica_connection
+
+        g.replica_connection = None
+        user_id = (g.get('token_claims') or {}).get('sub')
+        if user_id is None or not self.sticky.get(user_id):
+            keys = self._available()
+            random.shuffle(keys)
+            for key in keys:
+                try:
+                    g.replica_connection = self.engines[key].connect()
+                except DBAPIError:
+                    self._mark_down(key)
+                    continue
+                with self.lock:
+                    self.reads[key] += 1
+                return g.replica_connection
+        with self.lock:
+            self.primary_reads += 1
+        return None
+
+    def wrote(self, user_id):
+        self.sticky.set(user_id, True)
+
+    def release(self):
+        connection = g.pop('replica_connection', None)
+        if connection is not None:
+            connection.close()
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            return {
+                'replica_reads': dict(self.reads),
+                'primary_reads': self.primary_reads,
+                'failovers': self.failovers,
+                'down': sorted(key for key, until in self.down_until.items() if until > now)
+            }
+
+def wrote_as(user_id):
+    """Make user_id the writer of this request's commits, for requests that
+    authenticate without an access token (register, login, refresh)"""
+    if has_request_context():
+        g.replica_writer = user_id
+
+@contextmanager
+def read_from_primary():
+    """Route the reads inside the block to the primary, e.g. right after a
+    write made by another request that this one must see"""
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('read_from_primary', False)
+    connection = g.pop('replica_connection', None)
+    g.read_from_primary = True
+    try:
+        yield
+    finally:
+        g.read_from_primary = previous
+        if connection is not None:
+            g.replica_connection = connection
+
+# Once a session writes, later reads in the same transaction use the primary;
+# after the commit, the user's next requests do too for the sticky window
+
+@event.listens_for(RoutingSession, 'before_flush')
+def flag_flushing(session, flush_context, instances):
+    session.info['replica_flushing'] = True
+
+@event.listens_for(RoutingSession, 'after_flush')
+def flag_flush(session, flush_context):
+    session.info['replica_wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_flush_postexec')
+def unflag_flushing(session, flush_context):
+    session.info.pop('replica_flushing', None)
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def flag_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['replica_wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def remember_writer(session):
+    if session.info.pop('replica_wrote', False) and has_request_context():
+        router = current_app.extensions.get('replicas')
+        user_id = g.get('replica_writer') or (g.get('token_claims') or {}).get('sub')
+        if router and user_id is not None:
+            router.wrote(user_id)
+        g.read_from_primary = True
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def forget_flags(session):
+    session.info.pop('replica_wrote', None)
+    session.info.pop('replica_flushing', None)
@@ -0,0 +1,178 @@
+"""Cached, ETag-validated responses for read-heavy list endpoints.
+
+A view decorated with @cached_response('subjects', ...) is cached per
+(endpoint, scope, query string, versions of the named namespaces). A
+commit that inserts, updates or deletes a row of a model mapped to a
+namespace bumps that namespace's version, so later lookups miss and the
+stale entries age out of the LRU. Every cached response carries a strong
+ETag over its body, and a matching If-None-Match gets a 304 with no body.
+
+Like the user cache, entries are per process unless USER_CACHE_URL points
+at Redis; in per-process mode another worker's writes become visible when
+entries expire after RESPONSE_CACHE_TTL.
+"""
+import hashlib
+import threading
+from functools import wraps
+from flask import request, make_response, current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import User, Subject, Enrollment, Assignment, Submission
+from user_cache import LocalBackend, RedisBackend
+
+# Which cached namespaces a change to each model makes stale
+NAMESPACES = {
+    User: ('users',),
+    Subject: ('subjects',),
+    Enrollment: ('enrollments',),
+    # submission_count is part of the assignment lists
+    Assignment: ('assignments',),
+    Submission: ('assignments',),
+}
+
+class LocalVersions:
+    def __init__(self):
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def get(self, namespaces):
+        with self.lock:
+            return tuple(self.versions.get(namespace, 0) for namespace in namespaces)
+
+    def bump(self, namespace):
+        with self.lock:
+            self.versions[namespace] = self.versions.get(namespace, 0) + 1
+
+class RedisVersions:
+    prefix = 'classflow:response-version:'
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, namespaces):
+        return tuple(int(value or 0) for value in self.client.mget([self.prefix + n for n in namespaces]))
+
+    def bump(self, namespace):
+        self.client.incr(self.prefix + namespace)
+
+class ResponseCache:
+    def __init__(self, app=None):
+        self.entries = None
+        self.versions = None
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bytes_saved = 0
+        # The same counters per view, e.g. 'student.get_student_subjects'
+        self.endpoints = {}
+        self.counter_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ttl = app.config['RESPONSE_CACHE_TTL']
+        if app.config.get('USER_CACHE_URL'):
+            self.entries = RedisBackend(app.config['USER_CACHE_URL'], ttl, prefix='classflow:response:')
+            self.versions = RedisVersions(self.entries.client)
+        else:
+            self.entries = LocalBackend(app.config['RESPONSE_CACHE_SIZE'], ttl)
+            self.versions = LocalVersions()
+        app.extensions['response_cache'] = self
+
+    def invalidate(self, *namespaces):
+        if self.versions:
+            for namespace in namespaces:
+                self.versions.bump(namespace)
+
+    def count(self, counter, amount=1, endpoint=None):
+        with self.counter_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+            if endpoint is not None:
+                counters = self.endpoints.setdefault(
+                    endpoint, {'hits': 0, 'misses': 0, 'not_modified': 0, 'bytes_saved': 0})
+                counters[counter] += amount
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'bytes_saved': self.bytes_saved,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'endpoints': {endpoint: dict(counters) for endpoint, counters in self.endpoints.items()}
+        }
+
+response_cache = ResponseCache()
+
+def cached_response(*namespaces, per_user=True):
+    """Cache a role_required view's 200 responses.
+
+    per_user=False shares entries between every user with the same role,
+    for views whose output does not depend on who is asking.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user, *args, **kwargs):
+            if not current_app.config['RESPONSE_CACHE_ENABLED']:
+                return f(current_user, *args, **kwargs)
+
+            scope = f'user:{current_user.id}' if per_user else f'role:{current_user.role}'
+            versions = response_cache.versions.get(namespaces)
+            key = '|'.join([
+                request.endpoint, scope, repr(sorted(kwargs.items())),
+                request.query_string.decode(), ','.join(map(str, versions))
+            ])
+
+            entry = response_cache.entries.get(key)
+            if entry is None:
+                response_cache.count('misses', endpoint=request.endpoint)
+                response = make_response(f(current_user, *args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data(as_text=True)
+                entry = {
+                    'body': body,
+                    'etag': hashlib.sha256(body.encode()).hexdigest()[:32],
+                    'mimetype': response.mimetype
+                }
+                response_cache.entries.set(key, entry)
+            else:
+                response_cache.count('hits', endpoint=request.endpoint)
+                response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+
+            response.set_etag(entry['etag'])
+            # Revalidate on every use; unchanged lists cost a 304 and no body
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            size = response.content_length or 0
+            response = response.make_conditional(request)
+            if response.status_code == 304:
+                response_cache.count('not_modified', endpoint=request.endpoint)
+                response_cache.count('bytes_saved', size, endpoint=request.endpoint)
+            return response
+        return decorated
+    return decorator
+
+@event.listens_for(Session, 'after_flush')
+def collect_stale_namespaces(session, flush_context):
+    stale = session.info.setdefault('response_cache_stale', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        stale.update(NAMESPACES.get(type(obj), ()))
+
+@event.listens_for(Session, 'do_orm_execute')
+def collect_stale_bulk_statements(orm_execute_state):
+    # Bulk inserts/updates/deletes (bulk.py, Query.delete()) bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            stale = orm_execute_state.session.info.setdefault('response_cache_stale', set())
+            stale.update(NAMESPACES.get(mapper.class_, ()))
+
+@event.listens_for(Session, 'after_commit')
+def bump_stale_namespaces(session):
+    response_cache.invalidate(*session.info.pop('response_cache_stale', ()))
+
+@event.listens_for(Session, 'after_rollback')
+def discard_stale_namespaces(session):
+    session.info.pop('response_cache_stale', None)
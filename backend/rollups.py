@@ -0,0 +1,225 @@
+"""Maintenance of the attendance_summaries rollup table.
+
+mark_attendance calls apply_marks() in the same transaction as its
+attendance writes. For backfills
+and audits, run from the backend directory:
+
+    python rollups.py rebuild [subject_id]
+    python rollups.py check [subject_id]
+"""
+import sys
+from sqlalchemy import func, case, and_, or_, select, insert, update
+from models import db, Attendance, AttendanceSummary
+from bulk import UPSERT_DIALECTS
+
+def _present_absent_last(session, criteria):
+    """(subject_id, student_id) -> (present, absent, last date) from raw rows"""
+    rows = session.query(
+        Attendance.subject_id,
+        Attendance.student_id,
+        func.coalesce(func.sum(case((Attendance.status == 'PRESENT', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Attendance.status == 'ABSENT', 1), else_=0)), 0),
+        func.max(Attendance.date)
+    ).filter(*criteria).group_by(Attendance.subject_id, Attendance.student_id).all()
+    return {(row[0], row[1]): (row[2], row[3], row[4]) for row in rows}
+
+def _streaks(session, criteria):
+    """(subject_id, student_id) -> PRESENT marks after the last ABSENT mark, from raw rows"""
+    last_absent = select(
+        Attendance.subject_id,
+        Attendance.student_id,
+        func.max(Attendance.date).label('last_absent')
+    ).where(Attendance.status == 'ABSENT', *criteria)\
+        .group_by(Attendance.subject_id, Attendance.student_id)\
+        .subquery()
+
+    rows = session.query(
+        Attendance.subject_id,
+        Attendance.student_id,
+        func.count(Attendance.id)
+    ).outerjoin(last_absent, and_(
+        last_absent.c.subject_id == Attendance.subject_id,
+        last_absent.c.student_id == Attendance.student_id
+    )).filter(
+        Attendance.status == 'PRESENT',
+        or_(last_absent.c.last_absent.is_(None), Attendance.date > last_absent.c.last_absent),
+        *criteria
+    ).group_by(Attendance.subject_id, Attendance.student_id).all()
+    return {(row[0], row[1]): row[2] for row in rows}
+
+def _scope(subject_id=None, student_ids=None):
+    criteria = []
+    if subject_id is not None:
+        criteria.append(Attendance.subject_id == subject_id)
+    if student_ids is not None:
+        criteria.append(Attendance.student_id.in_(student_ids))
+    return criteria
+
+def _ensure_summaries(subject_id, student_ids):
+    """Insert zeroed rollup rows for students that have none yet"""
+    rows = [
+        {'subject_id': subject_id, 'student_id': student_id,
+         'present_count': 0, 'absent_count': 0, 'current_streak': 0}
+        for student_id in student_ids
+    ]
+    dialect_insert = UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+    if dialect_insert is not None:
+        # A concurrent batch may be creating the same rows
+        db.session.execute(dialect_insert(AttendanceSummary).on_conflict_do_nothing(
+            index_elements=['subject_id', 'student_id']
+        ), rows)
+        return
+    existing = set(db.session.scalars(select(AttendanceSummary.student_id).where(
+        AttendanceSummary.subject_id == subject_id,
+        AttendanceSummary.student_id.in_(student_ids)
+    )))
+    missing = [row for row in rows if row['student_id'] not in existing]
+    if missing:
+        db.session.execute(insert(AttendanceSummary), missing)
+
+def apply_marks(subject_id, attendance_date, statuses, changes):
+    """Update rollups for one mark_attendance batch without rescanning history.
+
+    `statuses` maps student_id -> new status and `changes` maps student_id ->
+    previous status (None if the day was not marked yet) for the rows the
+    batch changed, as returned by bulk.upsert_attendance. Must run after
+    the Attendance rows are written, in the same transaction.
+
+    Counts move by SQL increments (present_count = present_count + 1), so
+    concurrent batches add up instead of overwriting each other. Those
+    UPDATEs also lock the summary rows until commit, so the streak logic
+    that follows reads current values: marks on the latest day adjust
+    streaks arithmetically; edits to earlier days (or flipping the latest
+    day to PRESENT) recompute the streak for the affected students with
+    one query.
+    """
+    if not changes:
+        return
+
+    _ensure_summaries(subject_id, list(changes))
+
+    by_delta = {}
+    for student_id, old_status in changes.items():
+        status = statuses[student_id]
+        delta = ((status == 'PRESENT') - (old_status == 'PRESENT'),
+                 (status != 'PRESENT') - (old_status is not None and old_status != 'PRESENT'))
+        by_delta.setdefault(delta, []).append(student_id)
+    for (present, absent), student_ids in by_delta.items():
+        db.session.execute(
+            update(AttendanceSummary)
+            .where(AttendanceSummary.subject_id == subject_id, AttendanceSummary.student_id.in_(student_ids))
+            .values(present_count=AttendanceSummary.present_count + present,
+                    absent_count=AttendanceSummary.absent_count + absent)
+            .execution_options(synchronize_session=False)
+        )
+
+    summaries = {
+        summary.student_id: summary
+        for summary in AttendanceSummary.query.filter(
+            AttendanceSummary.subject_id == subject_id,
+            AttendanceSummary.student_id.in_(list(changes))
+        ).populate_existing()
+    }
+
+    recompute = []
+    for student_id in changes:
+        status = statuses[student_id]
+        summary = summaries[student_id]
+        if summary.last_marked_date is None or attendance_date > summary.last_marked_date:
+            summary.last_marked_date = attendance_date
+            summary.current_streak = summary.current_streak + 1 if status == 'PRESENT' else 0
+        elif attendance_date == summary.last_marked_date and status == 'ABSENT':
+            summary.current_streak = 0
+        else:
+            recompute.append(student_id)
+
+    if recompute:
+        streaks = _streaks(db.session, _scope(subject_id, recompute))
+        for student_id in recompute:
+            summaries[student_id].current_streak = streaks.get((subject_id, student_id), 0)
+
+def rebuild(subject_id=None, session=None):
+    """Recompute rollups from raw Attendance rows (all subjects, or one).
+    Returns the number of summary rows written; the caller commits."""
+    session = session or db.session
+    criteria = _scope(subject_id)
+    counts = _present_absent_last(session, criteria)
+    streaks = _streaks(session, criteria)
+
+    delete = AttendanceSummary.__table__.delete()
+    if subject_id is not None:
+        delete = delete.where(AttendanceSummary.subject_id == subject_id)
+    session.execute(delete)
+
+    rows = [
+        {
+            'subject_id': key[0],
+            'student_id': key[1],
+            'present_count': present,
+            'absent_count': absent,
+            'last_marked_date': last_date,
+            'current_streak': streaks.get(key, 0)
+        }
+        for key, (present, absent, last_date) in counts.items()
+    ]
+    if rows:
+        session.execute(AttendanceSummary.__table__.insert(), rows)
+    return len(rows)
+
+def check(subject_id=None, session=None):
+    """Compare rollups against raw Attendance rows.
+
+    Returns a list of {subject_id, student_id, expected, actual} for every
+    (subject, student) pair whose rollup is missing, stale or orphaned.
+    """
+    session = session or db.session
+    criteria = _scope(subject_id)
+    counts = _present_absent_last(session, criteria)
+    streaks = _streaks(session, criteria)
+    expected = {
+        key: (present, absent, last_date, streaks.get(key, 0))
+        for key, (present, absent, last_date) in counts.items()
+    }
+
+    query = session.query(AttendanceSummary)
+    if subject_id is not None:
+        query = query.filter(AttendanceSummary.subject_id == subject_id)
+    actual = {
+        (summary.subject_id, summary.student_id): (
+            summary.present_count, summary.absent_count, summary.last_marked_date, summary.current_streak
+        )
+        for summary in query
+    }
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        if expected.get(key) != actual.get(key):
+            mismatches.append({
+                'subject_id': key[0],
+                'student_id': key[1],
+                'expected': expected.get(key),
+                'actual': actual.get(key)
+            })
+    return mismatches
+
+if __name__ == '__main__':
+    from app import create_app
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'check'
+    scope = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    app = create_app()
+    with app.app_context():
+        if command == 'rebuild':
+            written = rebuild(scope)
+            db.session.commit()
+            print(f"Rebuilt {written} attendance summaries.")
+        elif command == 'check':
+            mismatches = check(scope)
+            for mismatch in mismatches:
+                print(mismatch)
+            print(f"{len(mismatches)} inconsistent attendance summaries.")
+            sys.exit(1 if mismatches else 0)
+        else:
+            print(__doc__)
+            sys.exit(2)
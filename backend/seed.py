@@ -0,0 +1,256 @@
+"""Synthetic school data at production volumes.
+
+init_db.py creates three demo users; this fills every table the app reads
+with a whole school so behaviour at scale can be reproduced locally. Run
+from the backend directory:
+
+    python seed.py                                    # 50k students, 2k subjects, 90 school days
+    python seed.py --students 5000 --subjects 200     # a smaller school
+    python seed.py --reset                            # drop everything and reseed
+
+Per subject, a roster of --class-size enrolled students (every student is
+on at least one roster) gets an Attendance row for each weekday of the term
+ending yesterday, --assignments assignments due across the term (the last
+two due in the coming fortnight) and, for each assignment, a Submission
+from most of the roster. Submissions share --files placeholder files in
+blob storage, written once. Attendance rollups are rebuilt at the end.
+
+Rows are bulk-inserted through Core in batches of --batch-size with
+explicit primary keys, so nothing is read back while generating. Every
+user's password is the role plus "123" (student123, teacher123), as in
+init_db.py; it is hashed once and shared.
+"""
+import argparse
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, select, text
+from models import db, User, Subject, Enrollment, Assignment, Submission, Attendance, Blob
+from migrations import upgrade, version_table
+from passwords import password_hasher
+from storage import get_storage
+from rollups import rebuild
+
+DOMAIN = 'school.classflow.com'
+GRADES = ('A', 'A', 'B', 'B', 'B', 'C', 'C', 'D', 'F')
+FILE_TYPES = ('pdf', 'docx', 'zip', 'txt')
+SUBJECT_NAMES = ('Mathematics', 'Physics', 'Chemistry', 'Biology', 'History', 'Geography',
+                 'Literature', 'Computer Science', 'Economics', 'Art', 'Music', 'French')
+
+def term_days(days, today=None):
+    """The last `days` weekdays before today, oldest first"""
+    current = (today or date.today()) - timedelta(days=1)
+    result = []
+    while len(result) < days:
+        if current.weekday() < 5:
+            result.append(current)
+        current -= timedelta(days=1)
+    return result[::-1]
+
+def next_ids(connection, *tables):
+    return [(connection.scalar(select(func.max(table.c.id))) or 0) + 1 for table in tables]
+
+def insert_batches(connection, table, rows, batch_size):
+    """Insert an iterable of row dicts in executemany batches; returns the count"""
+    batch = []
+    count = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            connection.execute(table.insert(), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        connection.execute(table.insert(), batch)
+        count += len(batch)
+    return count
+
+def reset_sequences(connection, tables):
+    # Explicit ids leave PostgreSQL's serial sequences behind
+    if connection.dialect.name == 'postgresql':
+        for table in tables:
+            connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 1) FROM {table.name}))"
+            ))
+
+def placeholder_files(count, rng):
+    """Write `count` files of assorted sizes to blob storage; returns [(key, size)]"""
+    storage = get_storage()
+    blobs = []
+    for i in range(count):
+        size = rng.choice((4, 16, 64, 256, 1024)) * 1024 + i
+        data = rng.randbytes(size)
+        key = hashlib.sha256(data).hexdigest()
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        storage.ingest(path, key)
+        blobs.append((key, size))
+    return blobs
+
+def generate(args, report=print):
+    rng = random.Random(args.seed)
+    engine = db.engine
+    tables = [User.__table__, Subject.__table__, Assignment.__table__, Submission.__table__, Attendance.__table__]
+    users, subjects, assignments, submissions, attendance = tables
+
+    with engine.connect() as connection:
+        if connection.scalar(select(func.count()).select_from(users).where(users.c.email.like(f'%@{DOMAIN}'))):
+            raise SystemExit(f'Users @{DOMAIN} already exist; pass --reset to rebuild the database')
+        first_user, first_subject, first_assignment, first_submission, first_attendance = \
+            next_ids(connection, *tables)
+
+    now = datetime.utcnow()
+    days = term_days(args.days)
+    term_start = datetime.combine(days[0], datetime.min.time())
+    password_hashes = {role: password_hasher.hash(f'{role}123') for role in ('teacher', 'student')}
+
+    teacher_ids = list(range(first_user, first_user + args.teachers))
+    student_ids = list(range(first_user + args.teachers, first_user + args.teachers + args.students))
+    # How reliably each student turns up and hands work in
+    diligence = {student_id: rng.uniform(0.7, 0.99) for student_id in student_ids}
+
+    # Rosters: consecutive slices of a shuffled list, wrapping round so every
+    # student is on at least one roster
+    shuffled = student_ids[:]
+    rng.shuffle(shuffled)
+    rosters = {}
+    for i in range(args.subjects):
+        start = i * args.class_size
+        rosters[first_subject + i] = [shuffled[(start + k) % len(shuffled)] for k in range(args.class_size)]
+        rosters[first_subject + i] = sorted(set(rosters[first_subject + i]))
+
+    started = time.perf_counter()
+
+    def step(name, count):
+        report(f'{name:<14} {count:>12,} rows  {time.perf_counter() - started:8.1f}s')
+
+    with engine.begin() as connection:
+        step('users', insert_batches(connection, users, (
+            {'id': user_id, 'email': f'{role}{user_id - first}@{DOMAIN}', 'password_hash': password_hashes[role],
+             'role': role, 'active': True, 'created_at': term_start - timedelta(days=14)}
+            for role, ids, first in (('teacher', teacher_ids, teacher_ids[0]), ('student', student_ids, student_ids[0]))
+            for user_id in ids
+        ), args.batch_size))
+
+        step('subjects', insert_batches(connection, subjects, (
+            {'id': subject_id, 'name': f'{SUBJECT_NAMES[i % len(SUBJECT_NAMES)]} {i // len(SUBJECT_NAMES) + 1}',
+             'teacher_id': teacher_ids[i % len(teacher_ids)], 'created_at': term_start - timedelta(days=7)}
+            for i, subject_id in enumerate(rosters)
+        ), args.batch_size))
+
+        step('enrollments', insert_batches(connection, Enrollment.__table__, (
+            {'subject_id': subject_id, 'student_id': student_id, 'created_at': term_start - timedelta(days=7)}
+            for subject_id, roster in rosters.items() for student_id in roster
+        ), args.batch_size))
+
+        # Due dates spread over the term, the last two still ahead
+        span = (now - term_start) / max(1, args.assignments - 2)
+        assignment_rows = []
+        for subject_id in rosters:
+            for k in range(args.assignments):
+                due = term_start + span * (k + 1) if k < args.assignments - 2 else \
+                    now + timedelta(days=7 * (k - args.assignments + 3))
+                assignment_rows.append({
+                    'id': first_assignment + len(assignment_rows), 'subject_id': subject_id,
+                    'title': f'Assignment {k + 1}', 'description': f'Coursework {k + 1} of {args.assignments}',
+                    'due_date': due.replace(hour=23, minute=59, second=0, microsecond=0),
+                    'created_at': due - timedelta(days=14)
+                })
+        step('assignments', insert_batches(connection, assignments, assignment_rows, args.batch_size))
+
+        blobs = placeholder_files(args.files, rng)
+        references = {key: 0 for key, _ in blobs}
+
+        def submission_rows():
+            submission_id = first_submission
+            for assignment in assignment_rows:
+                due = assignment['due_date']
+                past_due = due < now
+                for student_id in rosters[assignment['subject_id']]:
+                    rate = args.submission_rate * diligence[student_id] if past_due else 0.3
+                    if rng.random() >= rate:
+                        continue
+                    # Mostly in the days before the deadline, a few late
+                    submitted = due - timedelta(hours=rng.uniform(0, 120)) if rng.random() > 0.05 \
+                        else due + timedelta(hours=rng.uniform(1, 48))
+                    submitted = min(submitted, now)
+                    key, _ = rng.choice(blobs)
+                    references[key] += 1
+                    graded = past_due and rng.random() < 0.7
+                    yield {
+                        'id': submission_id, 'assignment_id': assignment['id'], 'student_id': student_id,
+                        'file_path': key, 'filename': f"assignment-{assignment['id']}.{rng.choice(FILE_TYPES)}",
+                        'submitted_at': submitted, 'sha256': key,
+                        'grade': rng.choice(GRADES) if graded else None,
+                        'feedback': 'Good work.' if graded and rng.random() < 0.3 else None,
+                        'scan_status': 'clean', 'processed_at': submitted
+                    }
+                    submission_id += 1
+        step('submissions', insert_batches(connection, submissions, submission_rows(), args.batch_size))
+
+        connection.execute(Blob.__table__.insert(), [
+            {'key': key, 'size': size, 'ref_count': references[key], 'created_at': now} for key, size in blobs
+        ])
+        step('blobs', len(blobs))
+
+        def attendance_rows():
+            attendance_id = first_attendance
+            for subject_id, roster in rosters.items():
+                for day in days:
+                    marked_at = datetime.combine(day, datetime.min.time()) + timedelta(hours=9)
+                    for student_id in roster:
+                        yield {
+                            'id': attendance_id, 'subject_id': subject_id, 'student_id': student_id, 'date': day,
+                            'status': 'PRESENT' if rng.random() < diligence[student_id] else 'ABSENT',
+                            'marked_at': marked_at
+                        }
+                        attendance_id += 1
+        step('attendance', insert_batches(connection, attendance, attendance_rows(), args.batch_size))
+        reset_sequences(connection, tables)
+
+    step('summaries', rebuild())
+    db.session.commit()
+
+def reset_database():
+    db.drop_all()
+    version_table.drop(db.engine, checkfirst=True)
+    upgrade()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=50000)
+    parser.add_argument('--teachers', type=int, default=1000)
+    parser.add_argument('--subjects', type=int, default=2000)
+    parser.add_argument('--class-size', type=int, default=30, help='students on each subject roster')
+    parser.add_argument('--assignments', type=int, default=12, help='per subject')
+    parser.add_argument('--days', type=int, default=90, help='school days (weekdays) in the term')
+    parser.add_argument('--submission-rate', type=float, default=0.95,
+                        help='chance a fully diligent student submits a past-due assignment')
+    parser.add_argument('--files', type=int, default=32, help='distinct placeholder files')
+    parser.add_argument('--batch-size', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--reset', action='store_true', help='drop all tables first')
+    args = parser.parse_args()
+    if args.teachers < 1 or args.students < 1 or args.subjects < 1 or args.assignments < 2:
+        parser.error('need at least one teacher, student and subject, and two assignments per subject')
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        if args.reset:
+            reset_database()
+        else:
+            upgrade()
+        print(f"Seeding {app.config['SQLALCHEMY_DATABASE_URI']}")
+        generate(args)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
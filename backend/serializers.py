@@ -0,0 +1,43 @@
+from sqlalchemy.orm import joinedload, contains_eager, undefer, configure_mappers
+from models import Subject, Assignment, Submission, Attendance
+from metrics import timed_serialization
+
+# Backref attributes (Subject.teacher, Submission.student, ...) only exist once mappers are configured
+configure_mappers()
+
+# Loader options matching what each model's to_dict() reads. An endpoint picks
+# the shape it returns and applies it to its query, so serializing N rows
+# costs one SELECT instead of 1 + N lazy loads per relationship.
+SUBJECT_SHAPE = (
+    joinedload(Subject.teacher),
+)
+
+ASSIGNMENT_SHAPE = (
+    joinedload(Assignment.subject),
+    undefer(Assignment.submission_count),
+)
+
+SUBMISSION_SHAPE = (
+    joinedload(Submission.student),
+    joinedload(Submission.assignment),
+)
+
+# For queries that already JOIN assignments (e.g. to order or filter on them)
+SUBMISSION_JOINED_SHAPE = (
+    joinedload(Submission.student),
+    contains_eager(Submission.assignment),
+)
+
+ATTENDANCE_SHAPE = (
+    joinedload(Attendance.subject),
+    joinedload(Attendance.student),
+)
+
+def shaped(query, shape):
+    """Apply a serialization shape's loader options to a query"""
+    return query.options(*shape)
+
+def serialize(objects):
+    """to_dict() of each object, timed into the request's serialize metric"""
+    with timed_serialization():
+        return [obj.to_dict() for obj in objects]
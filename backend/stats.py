@@ -0,0 +1,71 @@
+from sqlalchemy import func, case, cast, Date
+from models import db, Subject, Attendance, AttendanceSummary
+
+# SUM(CASE WHEN status = 'PRESENT' THEN 1 ELSE 0 END), 0 for empty groups
+present_count = func.coalesce(func.sum(case((Attendance.status == 'PRESENT', 1), else_=0)), 0)
+
+def percentage(part, total):
+    return round(part / total * 100, 2) if total else 0
+
+def stats_dict(total, present):
+    return {
+        'total': total,
+        'present': present,
+        'absent': total - present,
+        'percentage': percentage(present, total)
+    }
+
+def summary_by_subject(student_id, subject_id=None):
+    """Per-subject attendance stats for one student read from the rollup table,
+    so the cost is O(subjects) however long the history is."""
+    query = db.session.query(AttendanceSummary, Subject.name)\
+        .join(Subject, Subject.id == AttendanceSummary.subject_id)\
+        .filter(AttendanceSummary.student_id == student_id)
+    if subject_id:
+        query = query.filter(AttendanceSummary.subject_id == subject_id)
+
+    return [
+        {**summary.to_dict(), 'subject_name': name}
+        for summary, name in query.order_by(Subject.name).all()
+    ]
+
+def period_start(period):
+    """SQL expression for the first day of the week (Monday) or month containing Attendance.date"""
+    dialect = db.session.get_bind().dialect.name
+    if period not in ('week', 'month'):
+        raise ValueError('Bucket must be week or month!')
+    if dialect == 'sqlite':
+        if period == 'week':
+            return func.date(Attendance.date, 'weekday 0', '-6 days')
+        return func.strftime('%Y-%m-01', Attendance.date)
+    if dialect == 'postgresql':
+        return cast(func.date_trunc(period, Attendance.date), Date)
+    raise ValueError(f'Bucketed stats are not supported on {dialect}!')
+
+def attendance_by_period(period, *criteria):
+    """Per-subject attendance stats bucketed by week or month, computed with GROUP BY"""
+    bucket = period_start(period).label('period_start')
+    rows = db.session.query(
+        Attendance.subject_id,
+        bucket,
+        func.count(Attendance.id),
+        present_count
+    ).filter(*criteria)\
+        .group_by(Attendance.subject_id, bucket)\
+        .order_by(Attendance.subject_id, bucket)\
+        .all()
+
+    return [
+        {
+            'subject_id': subject_id,
+            'period_start': start.isoformat() if hasattr(start, 'isoformat') else start,
+            **stats_dict(total, present)
+        }
+        for subject_id, start, total, present in rows
+    ]
+
+def combined_stats(subject_stats):
+    """Roll per-subject stats up into one overall figure"""
+    total = sum(stats['total'] for stats in subject_stats)
+    present = sum(stats['present'] for stats in subject_stats)
+    return stats_dict(total, present)
@@ -0,0 +1,303 @@
+"""Pluggable, content-addressed storage for submission files.
+
+Files are stored once per SHA-256 digest; the digest is the blob key saved
+on Submission.blob_key. The blobs table counts how many submissions point
+at each key, and garbage collection removes blobs nobody references.
+
+STORAGE_BACKEND selects where blob bytes live:
+
+    'cas'     hash-sharded files under STORAGE_ROOT (<root>/ab/cd/<sha256>)
+    'object'  a local stand-in for an S3-compatible bucket, for exercising
+              the code paths a remote object store needs (no local paths)
+
+Run from the backend directory:
+
+    python storage.py gc                 # remove unreferenced blobs and legacy files
+    python storage.py migrate-legacy     # import pre-blob submission files
+"""
+import json
+import os
+import re
+import shutil
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, update, delete, select, exists, insert, func, inspect
+from models import db, Blob, Submission
+from bulk import UPSERT_DIALECTS
+from uploads import file_sha256
+
+BLOB_KEY = re.compile(r'^[0-9a-f]{64}$')
+
+def is_blob_key(value):
+    return bool(value and BLOB_KEY.match(value))
+
+class ContentAddressedStorage:
+    """Blobs as files sharded by the first two byte pairs of their digest"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def ingest(self, source_path, key, move=True):
+        """Store the file at source_path under key; identical content is kept once"""
+        target = self._path(key)
+        if os.path.exists(target):
+            if move:
+                os.remove(source_path)
+            return key
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        staging = f'{target}.{uuid.uuid4().hex}.tmp'
+        if move:
+            os.replace(source_path, staging)
+        else:
+            shutil.copyfile(source_path, staging)
+        os.replace(staging, target)
+        return key
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def size(self, key):
+        return os.path.getsize(self._path(key))
+
+    def local_path(self, key):
+        return self._path(key)
+
+    def open(self, key):
+        return open(self._path(key), 'rb')
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def keys(self):
+        """Yield (key, modified timestamp) for every stored blob"""
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if is_blob_key(name):
+                    yield name, os.path.getmtime(os.path.join(dirpath, name))
+
+class LocalObjectStorage:
+    """Stand-in for an S3-compatible bucket.
+
+    Objects live under <root>/<bucket>/blobs/<sha256> with a JSON sidecar
+    holding S3-style metadata (ContentLength, LastModified). local_path()
+    returns None, as it would for a remote bucket, so callers must stream
+    through open().
+    """
+
+    prefix = 'blobs/'
+
+    def __init__(self, root, bucket):
+        self.bucket_root = os.path.abspath(os.path.join(root, bucket))
+        os.makedirs(os.path.join(self.bucket_root, self.prefix), exist_ok=True)
+
+    def _object(self, key):
+        return os.path.join(self.bucket_root, self.prefix + key)
+
+    def ingest(self, source_path, key, move=True):
+        target = self._object(key)
+        if not os.path.exists(target):
+            staging = f'{target}.{uuid.uuid4().hex}.tmp'
+            shutil.copyfile(source_path, staging)
+            os.replace(staging, target)
+            with open(target + '.meta.json', 'w') as meta:
+                json.dump({
+                    'ContentLength': os.path.getsize(target),
+                    'LastModified': datetime.utcnow().isoformat()
+                }, meta)
+        if move:
+            os.remove(source_path)
+        return key
+
+    def exists(self, key):
+        return os.path.exists(self._object(key))
+
+    def size(self, key):
+        with open(self._object(key) + '.meta.json') as meta:
+            return json.load(meta)['ContentLength']
+
+    def local_path(self, key):
+        return None
+
+    def open(self, key):
+        return open(self._object(key), 'rb')
+
+    def delete(self, key):
+        for path in (self._object(key), self._object(key) + '.meta.json'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def keys(self):
+        folder = os.path.join(self.bucket_root, self.prefix)
+        for name in os.listdir(folder):
+            if is_blob_key(name):
+                yield name, os.path.getmtime(os.path.join(folder, name))
+
+def init_storage(app):
+    backend = app.config['STORAGE_BACKEND']
+    if backend == 'cas':
+        app.extensions['storage'] = ContentAddressedStorage(app.config['STORAGE_ROOT'])
+    elif backend == 'object':
+        app.extensions['storage'] = LocalObjectStorage(app.config['STORAGE_ROOT'], app.config['STORAGE_BUCKET'])
+    else:
+        raise RuntimeError(f'Unknown STORAGE_BACKEND {backend!r}')
+    if app.config['DOWNLOAD_OFFLOAD'] not in ('', 'x-accel', 'x-sendfile'):
+        raise RuntimeError(f"Unknown DOWNLOAD_OFFLOAD {app.config['DOWNLOAD_OFFLOAD']!r}")
+
+def get_storage():
+    return current_app.extensions['storage']
+
+def register_blob(key, size, session=None):
+    """Make sure a blobs row exists for key (ref_count starts at 0).
+
+    An existing row has its created_at refreshed, which restarts gc's grace
+    period and, being a write, locks the row until the caller commits.
+    Register before ingesting so a blob gc is about to collect is never
+    reused for a new submission.
+    """
+    session = session or db.session
+    dialect_insert = UPSERT_DIALECTS.get(session.get_bind().dialect.name)
+    values = {'key': key, 'size': size, 'ref_count': 0, 'created_at': datetime.utcnow()}
+    if dialect_insert is not None:
+        session.execute(dialect_insert(Blob).values(**values).on_conflict_do_update(
+            index_elements=['key'], set_={'created_at': values['created_at']}
+        ))
+    elif session.execute(update(Blob.__table__).where(Blob.key == key)
+                         .values(created_at=values['created_at'])).rowcount == 0:
+        session.execute(insert(Blob).values(**values))
+
+def store_file(source_path, sha256):
+    """Move a fully written temporary file into storage and register its blob.
+    Returns the blob key to save on the submission."""
+    storage = get_storage()
+    register_blob(sha256, os.path.getsize(source_path))
+    return storage.ingest(source_path, sha256)
+
+# Reference counting: every Submission row holds one reference to its blob.
+# Core-level bulk writes bypass these hooks; gc() therefore also checks for
+# live references before deleting anything.
+def _adjust(connection, key, delta):
+    if is_blob_key(key):
+        connection.execute(
+            update(Blob.__table__).where(Blob.key == key).values(ref_count=Blob.ref_count + delta)
+        )
+
+@event.listens_for(Submission, 'after_insert')
+def acquire_blob(mapper, connection, target):
+    _adjust(connection, target.blob_key, 1)
+
+@event.listens_for(Submission, 'after_delete')
+def release_blob(mapper, connection, target):
+    _adjust(connection, target.blob_key, -1)
+
+@event.listens_for(Submission, 'after_update')
+def move_blob_reference(mapper, connection, target):
+    history = inspect(target).attrs.blob_key.history
+    if history.has_changes():
+        for old_key in history.deleted:
+            _adjust(connection, old_key, -1)
+        _adjust(connection, target.blob_key, 1)
+
+def legacy_filename(path):
+    """Original filename from the old '<student>_<assignment>_<timestamp>_<name>' layout"""
+    name = os.path.basename(path)
+    parts = name.split('_', 3)
+    return parts[3] if len(parts) == 4 else name
+
+def migrate_legacy_files(session=None):
+    """Copy submission files stored under the old flat layout into blob storage.
+    Returns (migrated, missing) counts; the caller commits."""
+    session = session or db.session
+    storage = get_storage()
+    migrated = missing = 0
+    rows = session.execute(select(Submission.id, Submission.blob_key, Submission.sha256)).all()
+    for submission_id, path, sha256 in rows:
+        if is_blob_key(path):
+            continue
+        if not path or not os.path.isfile(path):
+            missing += 1
+            continue
+        digest = sha256 or file_sha256(path)
+        storage.ingest(path, digest, move=False)
+        register_blob(digest, os.path.getsize(path), session)
+        session.execute(update(Submission.__table__).where(Submission.id == submission_id).values(
+            file_path=digest, sha256=digest, filename=legacy_filename(path)
+        ))
+        session.execute(update(Blob.__table__).where(Blob.key == digest).values(ref_count=Blob.ref_count + 1))
+        migrated += 1
+    return migrated, missing
+
+def gc(grace=timedelta(hours=1), session=None):
+    """Delete unreferenced blobs and leftover legacy files.
+
+    Blobs younger than `grace` are kept so uploads that were ingested but
+    not yet committed as submissions are not collected. Returns the number
+    of files removed.
+    """
+    session = session or db.session
+    storage = get_storage()
+    cutoff = datetime.utcnow() - grace
+    referenced = exists().where(Submission.blob_key == Blob.key)
+
+    removed = 0
+    orphans = session.query(Blob.key).filter(Blob.created_at < cutoff, ~referenced).all()
+    for (key,) in orphans:
+        # Re-check age and references in the DELETE itself: an upload may have
+        # registered (refreshed) the blob or committed a submission since the scan
+        deleted = session.execute(delete(Blob.__table__).where(
+            Blob.key == key, Blob.created_at < cutoff, ~referenced
+        )).rowcount
+        if deleted:
+            storage.delete(key)
+            removed += 1
+
+    # Files on disk with no blobs row at all (e.g. a crash between ingest and commit)
+    known = {key for (key,) in session.query(Blob.key)}
+    cutoff_ts = time.time() - grace.total_seconds()
+    for key, modified in list(storage.keys()):
+        if key not in known and modified < cutoff_ts:
+            storage.delete(key)
+            removed += 1
+
+    # Old flat-layout files whose submission now points at a blob
+    folder = current_app.config['UPLOAD_FOLDER']
+    legacy_paths = {path for (path,) in session.query(Submission.blob_key) if not is_blob_key(path)}
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if os.path.isfile(path) and path not in legacy_paths and os.path.getmtime(path) < cutoff_ts:
+            os.remove(path)
+            removed += 1
+
+    # Repair counts drifted by bulk writes that bypassed the ORM hooks
+    count = select(func.count(Submission.id)).where(Submission.blob_key == Blob.key).scalar_subquery()
+    session.execute(update(Blob.__table__).values(ref_count=count))
+    return removed
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        command = sys.argv[1] if len(sys.argv) > 1 else None
+        if command == 'gc':
+            removed = gc()
+            db.session.commit()
+            print(f"Removed {removed} unreferenced files.")
+        elif command == 'migrate-legacy':
+            migrated, missing = migrate_legacy_files()
+            db.session.commit()
+            print(f"Migrated {migrated} submission files, {missing} missing on disk.")
+        else:
+            print(__doc__)
+            sys.exit(2)
@@ -1,37 +1,65 @@
+import hashlib
 import os
 from datetime import datetime
-from flask import Blueprint, request, jsonify, current_app, send_file
-from werkzeug.utils import secure_filename
-from models import db, Subject, Assignment, Submission, Attendance, User
+from flask import Blueprint, request, jsonify, current_app
+from sqlalchemy import func, case, and_
+from models import db, Subject, Enrollment, Assignment, Submission, Attendance, User
 from auth import token_required, role_required
+from pagination import paginate, page_response
+from response_cache import cached_response
+from werkzeug.utils import secure_filename
+from uploads import copy_stream, temporary_path
+from storage import get_storage, store_file
+from downloads import send_blob
+from tasks import enqueue_postprocess
+from events import submission_created
+from enrollments import is_enrolled, enrolled_subject_ids
+from stats import (
+    present_count, stats_dict, summary_by_subject, attendance_by_period, combined_stats
+)
+from serializers import (
+    shaped, serialize, timed_serialization,
+    SUBJECT_SHAPE, ASSIGNMENT_SHAPE, SUBMISSION_SHAPE, SUBMISSION_JOINED_SHAPE, ATTENDANCE_SHAPE
+)
 
 student_bp = Blueprint('student', __name__)
 
-@student_bp.route('/subjects', methods=['GET'])
+@student_bp.route('/student/subjects', methods=['GET'])
 @role_required('student')
+@cached_response('subjects', 'users', 'enrollments')
 def get_student_subjects(current_user):
-    """Get all subjects (students can view all subjects)"""
-    subjects = Subject.query.all()
-    return jsonify([subject.to_dict() for subject in subjects]), 200
+    """Get the subjects the student is enrolled in"""
+    query = shaped(Subject.query, SUBJECT_SHAPE).filter(Subject.id.in_(enrolled_subject_ids(current_user.id)))
+    subjects, next_cursor = paginate(query, [Subject.id])
+    return jsonify(page_response(serialize(subjects), next_cursor)), 200
 
-@student_bp.route('/assignments/<int:subject_id>', methods=['GET'])
+@student_bp.route('/student/assignments/<int:subject_id>', methods=['GET'])
 @role_required('student')
+@cached_response('subjects', 'assignments', 'enrollments')
 def get_subject_assignments_student(current_user, subject_id):
     """Get assignments for a subject (student view)"""
-    assignments = Assignment.query.filter_by(subject_id=subject_id).all()
+    if not is_enrolled(current_user.id, subject_id):
+        return jsonify({'message': 'Subject not found or access denied!'}), 404
+    
+    assignments = shaped(Assignment.query, ASSIGNMENT_SHAPE).filter_by(subject_id=subject_id).all()
+    
+    # Load the student's submissions for all of these assignments in one query
+    submissions = shaped(Submission.query, SUBMISSION_SHAPE).filter(
+        Submission.student_id == current_user.id,
+        Submission.assignment_id.in_([assignment.id for assignment in assignments])
+    ).all() if assignments else []
+    submissions_by_assignment = {submission.assignment_id: submission for submission in submissions}
     
     # Check if student has submitted each assignment
     assignments_data = []
-    for assignment in assignments:
-        assignment_data = assignment.to_dict()
-        submission = Submission.query.filter_by(
-            assignment_id=assignment.id,
-            student_id=current_user.id
-        ).first()
-        
-        assignment_data['submitted'] = submission is not None
-        assignment_data['my_submission'] = submission.to_dict() if submission else None
-        assignments_data.append(assignment_data)
+    with timed_serialization():
+        for assignment in assignments:
+            assignment_data = assignment.to_dict()
+            submission = submissions_by_assignment.get(assignment.id)
+            
+            assignment_data['submitted'] = submission is not None
+            assignment_data['my_submission'] = submission.to_dict() if submission else None
+            assignments_data.append(assignment_data)
     
     return jsonify(assignments_data), 200
 
@@ -59,6 +87,9 @@ def submit_assignment(current_user):
         if not assignment:
             return jsonify({'message': 'Assignment not found!'}), 404
         
+        if not is_enrolled(current_user.id, assignment.subject_id):
+            return jsonify({'message': 'You are not enrolled in this subject!'}), 403
+        
         # Check if student has already submitted
         existing_submission = Submission.query.filter_by(
             assignment_id=assignment_id,
@@ -74,21 +105,26 @@ def submit_assignment(current_user):
                 'message': f'File type not allowed! Allowed types: {", ".join(current_app.config["ALLOWED_EXTENSIONS"])}'
             }), 400
         
-        # Secure filename and save
-        filename = secure_filename(file.filename)
-        unique_filename = f"{current_user.id}_{assignment_id}_{datetime.utcnow().timestamp()}_{filename}"
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
-        
-        file.save(filepath)
+        # Receive into a temporary file, hashing while the bytes are copied,
+        # then hand it to content-addressed storage
+        temporary = temporary_path()
+        hasher = hashlib.sha256()
+        with open(temporary, 'wb') as destination:
+            copy_stream(file.stream, destination, hasher)
         
         # Create submission record
         submission = Submission(
-            assignment_id=assignment_id,
+            assignment_id=assignment.id,
             student_id=current_user.id,
-            file_path=filepath
+            blob_key=store_file(temporary, hasher.hexdigest()),
+            filename=secure_filename(file.filename),
+            sha256=hasher.hexdigest()
         )
         
         db.session.add(submission)
+        db.session.flush()
+        enqueue_postprocess(submission)
+        submission_created(submission, assignment.subject.teacher_id)
         db.session.commit()
         
         return jsonify({
@@ -103,48 +139,141 @@ def submit_assignment(current_user):
 @role_required('student')
 def get_my_submissions(current_user):
     """Get all submissions by current student"""
-    submissions = Submission.query.filter_by(student_id=current_user.id)\
-        .join(Assignment)\
-        .order_by(Submission.submitted_at.desc())\
-        .all()
+    query = shaped(Submission.query, SUBMISSION_JOINED_SHAPE)\
+        .filter_by(student_id=current_user.id)\
+        .join(Submission.assignment)
+    submissions, next_cursor = paginate(query, [Submission.submitted_at, Submission.id], descending=True)
     
-    return jsonify([submission.to_dict() for submission in submissions]), 200
+    return jsonify(page_response(serialize(submissions), next_cursor)), 200
 
 @student_bp.route('/my-attendance', methods=['GET'])
 @role_required('student')
 def get_my_attendance(current_user):
-    """Get attendance records for current student"""
+    """Get attendance records for current student.
+
+    With ?view=stats only aggregates are returned: per-subject totals for
+    every subject (or just ?subject_id=) and, with ?bucket=week|month,
+    per-period totals. No attendance rows are loaded.
+    """
     subject_id = request.args.get('subject_id')
     
-    query = Attendance.query.filter_by(student_id=current_user.id)
-    
+    criteria = [Attendance.student_id == current_user.id]
     if subject_id:
-        query = query.filter_by(subject_id=subject_id)
+        criteria.append(Attendance.subject_id == subject_id)
+    
+    if request.args.get('view') == 'stats':
+        bucket = request.args.get('bucket')
+        try:
+            buckets = attendance_by_period(bucket, *criteria) if bucket else None
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        subjects = summary_by_subject(current_user.id, subject_id)
+        
+        return jsonify({
+            'stats': combined_stats(subjects),
+            'subjects': subjects,
+            'buckets': buckets
+        }), 200
     
-    attendance_records = query.order_by(Attendance.date.desc()).all()
+    query = shaped(Attendance.query, ATTENDANCE_SHAPE).filter(*criteria)
+    attendance_records, next_cursor = paginate(query, [Attendance.date, Attendance.id], descending=True)
     
-    # Calculate attendance statistics
+    # Calculate attendance statistics in SQL so they cover all of the history, not just this page
     if subject_id:
-        total = len(attendance_records)
-        present = len([r for r in attendance_records if r.status == 'PRESENT'])
-        attendance_percentage = (present / total * 100) if total > 0 else 0
-        
-        stats = {
-            'total': total,
-            'present': present,
-            'absent': total - present,
-            'percentage': round(attendance_percentage, 2)
-        }
+        total, present = db.session.query(func.count(Attendance.id), present_count).filter(*criteria).one()
+        stats = stats_dict(total, present)
     else:
         stats = None
     
     return jsonify({
-        'attendance': [record.to_dict() for record in attendance_records],
-        'stats': stats
+        'attendance': serialize(attendance_records),
+        'stats': stats,
+        'next_cursor': next_cursor
     }), 200
 
-@student_bp.route('/download/<int:submission_id>', methods=['GET'])
+@student_bp.route('/student/dashboard', methods=['GET'])
 @role_required('student')
+def get_student_dashboard(current_user):
+    """Everything the student dashboard shows, from a handful of aggregate queries"""
+    limit = current_app.config['DASHBOARD_LIST_SIZE']
+    now = datetime.utcnow()
+    
+    # Assignments of the student's subjects, outer-joined to their submissions (at most one per assignment)
+    enrolled = and_(
+        Enrollment.subject_id == Assignment.subject_id,
+        Enrollment.student_id == current_user.id
+    )
+    my_submission = and_(
+        Submission.assignment_id == Assignment.id,
+        Submission.student_id == current_user.id
+    )
+    
+    total_assignments, submitted, late, overdue = db.session.query(
+        func.count(Assignment.id),
+        func.count(Submission.id),
+        func.coalesce(func.sum(case((Submission.submitted_at > Assignment.due_date, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((and_(Submission.id.is_(None), Assignment.due_date < now), 1), else_=0)), 0)
+    ).select_from(Assignment).join(Enrollment, enrolled).outerjoin(Submission, my_submission).one()
+    
+    pending = db.session.query(
+        Assignment.id, Assignment.title, Assignment.due_date, Assignment.subject_id, Subject.name
+    ).join(Enrollment, enrolled)\
+        .join(Subject, Subject.id == Assignment.subject_id)\
+        .outerjoin(Submission, my_submission)\
+        .filter(Submission.id.is_(None))\
+        .order_by(Assignment.due_date, Assignment.id)\
+        .limit(limit)\
+        .all()
+    
+    recent = db.session.query(
+        Submission.id, Submission.assignment_id, Submission.submitted_at, Submission.grade,
+        Submission.feedback, Assignment.title, Assignment.due_date, Subject.name
+    ).join(Assignment, Assignment.id == Submission.assignment_id)\
+        .join(Subject, Subject.id == Assignment.subject_id)\
+        .filter(Submission.student_id == current_user.id)\
+        .order_by(Submission.submitted_at.desc(), Submission.id.desc())\
+        .limit(limit)\
+        .all()
+    
+    subject_count = db.session.query(func.count(Enrollment.subject_id))\
+        .filter(Enrollment.student_id == current_user.id).scalar()
+    attendance = summary_by_subject(current_user.id)
+    
+    return jsonify({
+        'counts': {
+            'subjects': subject_count,
+            'assignments': total_assignments,
+            'pending': total_assignments - submitted,
+            'submitted': submitted,
+            'late': late,
+            'overdue': overdue
+        },
+        'pending_assignments': [{
+            'id': row.id,
+            'title': row.title,
+            'subject_id': row.subject_id,
+            'subject_name': row.name,
+            'due_date': row.due_date.isoformat(),
+            'is_overdue': row.due_date < now
+        } for row in pending],
+        'recent_submissions': [{
+            'id': row.id,
+            'assignment_id': row.assignment_id,
+            'assignment_title': row.title,
+            'subject_name': row.name,
+            'submitted_at': row.submitted_at.isoformat() if row.submitted_at else None,
+            'is_late': bool(row.submitted_at and row.submitted_at > row.due_date),
+            'grade': row.grade,
+            'feedback': row.feedback
+        } for row in recent],
+        'attendance': {
+            'overall': combined_stats(attendance),
+            'subjects': attendance
+        }
+    }), 200
+
+@student_bp.route('/download/<int:submission_id>', methods=['GET'])
+@token_required
 def download_submission(current_user, submission_id):
     """Download a submission file"""
     submission = Submission.query.get_or_404(submission_id)
@@ -157,14 +286,15 @@ def download_submission(current_user, submission_id):
         else:
             return jsonify({'message': 'Access denied!'}), 403
     
-    if not os.path.exists(submission.file_path):
+    storage = get_storage()
+    if not storage.exists(submission.blob_key):
         return jsonify({'message': 'File not found!'}), 404
     
-    filename = submission.file_path.split('/')[-1]
-    return send_file(
-        submission.file_path,
-        as_attachment=True,
-        download_name=filename
+    return send_blob(
+        submission.blob_key,
+        submission.filename or submission.blob_key,
+        etag=submission.sha256,
+        last_modified=submission.submitted_at
     )
 
 def allowed_file(filename):
@@ -0,0 +1,72 @@
+"""Background task handlers (registered with jobs.task)."""
+import hashlib
+import os
+import subprocess
+from datetime import datetime
+from flask import current_app
+from models import db, Submission
+from jobs import task, job_queue
+from storage import get_storage, is_blob_key
+from uploads import copy_stream, temporary_path
+
+def enqueue_postprocess(submission, session=None):
+    """Queue post-processing for a flushed submission, once per submission"""
+    job_queue.enqueue(
+        'submission.postprocess',
+        {'submission_id': submission.id},
+        idempotency_key=f'submission.postprocess:{submission.id}',
+        session=session
+    )
+
+def scan_file(path):
+    """Run SUBMISSION_SCAN_COMMAND on path. Exit status 0 is clean and 1
+    infected (the clamscan/clamdscan convention); anything else raises so
+    the job is retried."""
+    command = current_app.config['SUBMISSION_SCAN_COMMAND']
+    result = subprocess.run(command + [path], capture_output=True, text=True,
+                            timeout=current_app.config['SUBMISSION_SCAN_TIMEOUT'])
+    if result.returncode == 0:
+        return 'clean'
+    if result.returncode == 1:
+        return 'infected'
+    raise RuntimeError(f'Scanner exited with {result.returncode}: {result.stderr.strip()[:500]}')
+
+@task('submission.postprocess')
+def postprocess_submission(submission_id):
+    """Verify a submission's stored file against its hash and virus-scan it"""
+    submission = db.session.get(Submission, submission_id)
+    if submission is None:
+        return  # deleted before the job ran
+
+    storage = get_storage()
+    key = submission.blob_key
+    if not storage.exists(key):
+        raise RuntimeError(f'Blob {key} for submission {submission_id} is missing')
+
+    # Re-hash what storage actually holds; scan from a local copy if the
+    # backend has no files of its own
+    path = storage.local_path(key)
+    scratch = None
+    hasher = hashlib.sha256()
+    with storage.open(key) as source:
+        if path:
+            copy_stream(source, hasher=hasher)
+        else:
+            scratch = temporary_path()
+            with open(scratch, 'wb') as copy:
+                copy_stream(source, copy, hasher)
+    try:
+        digest = hasher.hexdigest()
+        if is_blob_key(key) and digest != key:
+            raise RuntimeError(f'Blob {key} is corrupt: content hashes to {digest}')
+        submission.sha256 = submission.sha256 or digest
+
+        if current_app.config['SUBMISSION_SCAN_COMMAND']:
+            submission.scan_status = scan_file(path or scratch)
+        else:
+            submission.scan_status = 'skipped'
+    finally:
+        if scratch:
+            os.remove(scratch)
+
+    submission.processed_at = datetime.utcnow()
@@ -1,9 +1,28 @@
+import csv
+import io
 import os
+import time
 from datetime import datetime
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response
 from werkzeug.utils import secure_filename
-from models import db, Subject, Assignment, Attendance, User, Submission
+from models import db, Subject, Assignment, Attendance, AttendanceSummary, User, Submission
 from auth import token_required, role_required
+from bulk import (
+    valid_student_ids, upsert_attendance,
+    submission_owners, assignment_submissions_by_email, update_grades
+)
+from rollups import apply_marks
+from registers import attendance_matrix
+from exports import FORMATS, attendance_register, gradebook, export_response
+from enrollments import enrolled_student_ids, roster_student_ids, student_ids_by_email, enroll, unenroll
+from storage import get_storage
+from archives import stream_zip
+from events import publish, publish_many, submission_graded
+from pagination import paginate, page_response
+from response_cache import cached_response
+from serializers import (
+    shaped, serialize, timed_serialization, SUBJECT_SHAPE, ASSIGNMENT_SHAPE, SUBMISSION_SHAPE, ATTENDANCE_SHAPE
+)
 
 teacher_bp = Blueprint('teacher', __name__)
 
@@ -47,10 +66,79 @@ def create_subject(current_user):
 
 @teacher_bp.route('/subjects', methods=['GET'])
 @role_required('teacher')
+@cached_response('subjects', 'users')
 def get_teacher_subjects(current_user):
     """Get all subjects taught by current teacher"""
-    subjects = Subject.query.filter_by(teacher_id=current_user.id).all()
-    return jsonify([subject.to_dict() for subject in subjects]), 200
+    subjects = shaped(Subject.query, SUBJECT_SHAPE).filter_by(teacher_id=current_user.id).all()
+    return jsonify(serialize(subjects)), 200
+
+def roster_changes(data):
+    """Student ids named by {"student_ids": [...], "emails": [...]}, and errors for unknown ones"""
+    errors = []
+    requested = set()
+    for student_id in data.get('student_ids') or []:
+        try:
+            requested.add(int(student_id))
+        except (TypeError, ValueError):
+            errors.append(f"Student {student_id} not found")
+    
+    emails = [str(email).strip().lower() for email in data.get('emails') or [] if str(email).strip()]
+    by_email = student_ids_by_email(emails)
+    for email in emails:
+        if email in by_email:
+            requested.add(by_email[email])
+        else:
+            errors.append(f"Student {email} not found")
+    
+    # Validate the ids with a single IN query
+    known = valid_student_ids(list(requested))
+    errors.extend(f"Student {student_id} not found" for student_id in sorted(requested - known))
+    return sorted(known), errors
+
+@teacher_bp.route('/subjects/<int:subject_id>/students', methods=['POST'])
+@role_required('teacher')
+def enroll_students(current_user, subject_id):
+    """Enroll students by id and/or email: {"student_ids": [...], "emails": [...]}"""
+    subject = Subject.query.filter_by(id=subject_id, teacher_id=current_user.id).first()
+    if not subject:
+        return jsonify({'message': 'Subject not found or access denied!'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    if not data.get('student_ids') and not data.get('emails'):
+        return jsonify({'message': 'student_ids or emails is required!'}), 400
+    
+    student_ids, errors = roster_changes(data)
+    added = enroll(subject.id, student_ids)
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Students enrolled successfully!',
+        'enrolled': len(added),
+        'already_enrolled': len(student_ids) - len(added),
+        'errors': errors if errors else None
+    }), 201
+
+@teacher_bp.route('/subjects/<int:subject_id>/students', methods=['DELETE'])
+@role_required('teacher')
+def unenroll_students(current_user, subject_id):
+    """Remove students from the roster by id and/or email; their records are kept"""
+    subject = Subject.query.filter_by(id=subject_id, teacher_id=current_user.id).first()
+    if not subject:
+        return jsonify({'message': 'Subject not found or access denied!'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    if not data.get('student_ids') and not data.get('emails'):
+        return jsonify({'message': 'student_ids or emails is required!'}), 400
+    
+    student_ids, errors = roster_changes(data)
+    removed = unenroll(subject.id, student_ids)
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Students unenrolled successfully!',
+        'unenrolled': removed,
+        'errors': errors if errors else None
+    }), 200
 
 # Assignment Management
 @teacher_bp.route('/assignments', methods=['POST'])
@@ -102,6 +190,7 @@ def create_assignment(current_user):
 
 @teacher_bp.route('/assignments/<int:subject_id>', methods=['GET'])
 @role_required('teacher')
+@cached_response('subjects', 'assignments')
 def get_subject_assignments(current_user, subject_id):
     """Get all assignments for a subject"""
     # Verify teacher owns the subject
@@ -113,8 +202,29 @@ def get_subject_assignments(current_user, subject_id):
     if not subject:
         return jsonify({'message': 'Subject not found or access denied!'}), 404
     
-    assignments = Assignment.query.filter_by(subject_id=subject_id).all()
-    return jsonify([assignment.to_dict() for assignment in assignments]), 200
+    assignments = shaped(Assignment.query, ASSIGNMENT_SHAPE).filter_by(subject_id=subject_id).all()
+    return jsonify(serialize(assignments)), 200
+
+@teacher_bp.route('/subjects/<int:subject_id>/gradebook/export', methods=['GET'])
+@role_required('teacher')
+def export_gradebook(current_user, subject_id):
+    """Download the gradebook (students x assignments: grade, late flag,
+    submitted at) as ?format=csv (default) or xlsx"""
+    subject = Subject.query.filter_by(
+        id=subject_id,
+        teacher_id=current_user.id
+    ).first()
+    
+    if not subject:
+        return jsonify({'message': 'Subject not found or access denied!'}), 404
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in FORMATS:
+        return jsonify({'message': f"format must be one of: {', '.join(FORMATS)}"}), 400
+    
+    name = secure_filename(subject.name) or 'subject'
+    return export_response(gradebook(subject.id), export_format, f'{name}-{subject.id}-gradebook',
+                           sheet_name=subject.name)
 
 @teacher_bp.route('/assignments/<int:assignment_id>/submissions', methods=['GET'])
 @role_required('teacher')
@@ -126,8 +236,42 @@ def get_assignment_submissions(current_user, assignment_id):
     if assignment.subject.teacher_id != current_user.id:
         return jsonify({'message': 'Access denied!'}), 403
     
-    submissions = Submission.query.filter_by(assignment_id=assignment_id).all()
-    return jsonify([submission.to_dict() for submission in submissions]), 200
+    submissions, next_cursor = paginate(
+        shaped(Submission.query, SUBMISSION_SHAPE).filter_by(assignment_id=assignment_id),
+        [Submission.submitted_at, Submission.id]
+    )
+    return jsonify(page_response(serialize(submissions), next_cursor)), 200
+
+@teacher_bp.route('/assignments/<int:assignment_id>/submissions/archive', methods=['GET'])
+@role_required('teacher')
+def download_submissions_archive(current_user, assignment_id):
+    """Stream a ZIP of all submission files, one folder per student email.
+    ?late=true and ?ungraded=true narrow it down."""
+    assignment = Assignment.query.get_or_404(assignment_id)
+
+    if assignment.subject.teacher_id != current_user.id:
+        return jsonify({'message': 'Access denied!'}), 403
+
+    query = db.session.query(Submission.blob_key, Submission.filename, Submission.submitted_at, User.email)\
+        .join(User, Submission.student_id == User.id)\
+        .filter(Submission.assignment_id == assignment_id)
+    if request.args.get('late', '').lower() in ('1', 'true'):
+        query = query.filter(Submission.submitted_at > assignment.due_date)
+    if request.args.get('ungraded', '').lower() in ('1', 'true'):
+        query = query.filter(Submission.grade.is_(None))
+
+    storage = get_storage()
+    entries = [
+        (f'{email}/{filename or blob_key}', storage.size(blob_key), submitted_at,
+         lambda key=blob_key: storage.open(key))
+        for blob_key, filename, submitted_at, email in query.order_by(User.email)
+        if storage.exists(blob_key)
+    ]
+
+    name = secure_filename(assignment.title) or 'assignment'
+    return Response(stream_zip(entries), mimetype='application/zip', headers={
+        'Content-Disposition': f'attachment; filename={name}-{assignment_id}-submissions.zip'
+    })
 
 @teacher_bp.route('/submissions/<int:submission_id>/grade', methods=['PUT'])
 @role_required('teacher')
@@ -143,6 +287,9 @@ def grade_submission(current_user, submission_id):
     
     submission.grade = data.get('grade')
     submission.feedback = data.get('feedback')
+    publish_many([submission_graded(submission.id, submission.assignment_id, submission.student_id, {
+        'grade': submission.grade, 'feedback': submission.feedback
+    })])
     
     db.session.commit()
     
@@ -151,6 +298,152 @@ def grade_submission(current_user, submission_id):
         'submission': submission.to_dict()
     }), 200
 
+GRADE_FIELDS = ('grade', 'feedback')
+
+def apply_grades(current_user, entries, assignment_id=None):
+    """Validate and write grades in one transaction.
+
+    entries is a list of (label, submission_id, values) where values holds
+    the grade/feedback keys to change and label names the entry in error
+    messages. With assignment_id, submissions of any other assignment are
+    rejected. Returns (graded count, errors).
+    """
+    errors = []
+    grades = {}
+    max_grade_length = Submission.grade.type.length
+
+    for label, submission_id, values in entries:
+        try:
+            submission_key = int(submission_id)
+        except (TypeError, ValueError):
+            errors.append(f"{label}: invalid submission_id")
+            continue
+        if not values:
+            errors.append(f"{label}: grade or feedback is required")
+            continue
+        grade = values.get('grade')
+        if grade is not None and len(str(grade)) > max_grade_length:
+            errors.append(f"{label}: grade longer than {max_grade_length} characters")
+            continue
+        # Later entries for the same submission win, as with sequential PUTs
+        grades.setdefault(submission_key, {}).update(values)
+
+    # Ownership for every submission with one joined query
+    owners = submission_owners(list(grades))
+    for submission_key in list(grades):
+        if submission_key not in owners:
+            errors.append(f"Submission {submission_key} not found")
+            del grades[submission_key]
+        elif owners[submission_key].teacher_id != current_user.id:
+            errors.append(f"Submission {submission_key}: access denied")
+            del grades[submission_key]
+        elif assignment_id is not None and owners[submission_key].assignment_id != assignment_id:
+            errors.append(f"Submission {submission_key}: not a submission for this assignment")
+            del grades[submission_key]
+
+    update_grades(grades)
+    publish_many([
+        submission_graded(submission_key, owners[submission_key].assignment_id,
+                          owners[submission_key].student_id, values)
+        for submission_key, values in grades.items()
+    ])
+    db.session.commit()
+    return len(grades), errors
+
+def grade_values(entry):
+    """The grade/feedback keys of a JSON entry; grade is a String column,
+    so JSON numbers (e.g. 95) are stored as their text"""
+    values = {field: entry[field] for field in GRADE_FIELDS if field in entry}
+    if values.get('grade') is not None:
+        values['grade'] = str(values['grade'])
+    return values
+
+@teacher_bp.route('/submissions/grades', methods=['PUT'])
+@role_required('teacher')
+def grade_submissions(current_user):
+    """Grade many submissions: {"grades": [{submission_id, grade, feedback}, ...]}"""
+    data = request.get_json()
+
+    if not data or not isinstance(data.get('grades'), list):
+        return jsonify({'message': 'grades is required!'}), 400
+
+    entries = [
+        (f"Entry {index}", entry.get('submission_id'), grade_values(entry))
+        for index, entry in enumerate(data['grades'])
+        if isinstance(entry, dict)
+    ]
+    graded, errors = apply_grades(current_user, entries)
+    skipped = len(data['grades']) - len(entries)
+    if skipped:
+        errors.append(f"{skipped} entries skipped: not objects")
+
+    return jsonify({
+        'message': 'Submissions graded successfully!',
+        'graded': graded,
+        'errors': errors if errors else None
+    }), 200
+
+@teacher_bp.route('/assignments/<int:assignment_id>/grades/import', methods=['POST'])
+@role_required('teacher')
+def import_grades(current_user, assignment_id):
+    """Grade an assignment from a CSV upload ('file' field or a text/csv body).
+
+    Rows are matched by a submission_id or email column; grade and feedback
+    columns are applied when present and non-blank, so a spreadsheet with
+    only email,grade leaves existing feedback untouched.
+    """
+    assignment = Assignment.query.get_or_404(assignment_id)
+
+    if assignment.subject.teacher_id != current_user.id:
+        return jsonify({'message': 'Access denied!'}), 403
+
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    # utf-8-sig drops the byte order mark spreadsheet exports often start with
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    try:
+        rows = list(reader)
+    except (csv.Error, UnicodeDecodeError) as e:
+        return jsonify({'message': f'Invalid CSV: {e}'}), 400
+
+    columns = {name.strip().lower(): name for name in reader.fieldnames or []}
+    if 'submission_id' not in columns and 'email' not in columns:
+        return jsonify({'message': 'CSV needs a submission_id or email column!'}), 400
+    fields = [field for field in GRADE_FIELDS if field in columns]
+    if not fields:
+        return jsonify({'message': 'CSV needs a grade or feedback column!'}), 400
+
+    errors = []
+    by_email = {}
+    if 'submission_id' not in columns:
+        emails = {row[columns['email']].strip().lower() for row in rows if row[columns['email']]}
+        by_email = assignment_submissions_by_email(assignment_id, emails)
+
+    entries = []
+    # Row 1 is the header
+    for line, row in enumerate(rows, start=2):
+        label = f"Row {line}"
+        if 'submission_id' in columns:
+            submission_id = (row[columns['submission_id']] or '').strip()
+        else:
+            email = (row[columns['email']] or '').strip().lower()
+            submission_id = by_email.get(email)
+            if submission_id is None:
+                errors.append(f"{label}: no submission from {email or 'blank email'}")
+                continue
+        # Blank cells leave the stored value alone
+        values = {field: row[columns[field]].strip() for field in fields if (row[columns[field]] or '').strip()}
+        entries.append((label, submission_id, values))
+
+    graded, grade_errors = apply_grades(current_user, entries, assignment_id)
+    errors.extend(grade_errors)
+
+    return jsonify({
+        'message': 'Grades imported successfully!',
+        'graded': graded,
+        'errors': errors if errors else None
+    }), 200
+
 # Attendance Management
 @teacher_bp.route('/attendance/mark', methods=['POST'])
 @role_required('teacher')
@@ -178,8 +471,12 @@ def mark_attendance(current_user):
     except ValueError:
         return jsonify({'message': 'Invalid date format!'}), 400
     
-    attendance_records = []
+    timings = {}
+    started = time.perf_counter()
+    
+    records_marked = 0
     errors = []
+    student_entries = {}
     
     for record in data['attendance_records']:
         student_id = record.get('student_id')
@@ -189,44 +486,73 @@ def mark_attendance(current_user):
             errors.append(f"Invalid record: {record}")
             continue
         
-        # Check if student exists
-        student = User.query.filter_by(id=student_id, role='student').first()
-        if not student:
+        try:
+            student_key = int(student_id)
+        except (TypeError, ValueError):
             errors.append(f"Student {student_id} not found")
             continue
         
-        # Check for existing attendance record
-        existing = Attendance.query.filter_by(
-            subject_id=data['subject_id'],
-            student_id=student_id,
-            date=attendance_date
-        ).first()
+        student_entries.setdefault(student_key, []).append((student_id, status))
+    
+    # Only students on the roster can be marked; one IN query checks them all
+    enrolled_students = enrolled_student_ids(subject.id, list(student_entries))
+    upserts = {}
+    for student_key, entries in student_entries.items():
+        if student_key not in enrolled_students:
+            errors.extend(f"Student {student_id} is not enrolled in this subject" for student_id, _ in entries)
+            continue
         
-        if existing:
-            existing.status = status
-            attendance_records.append(existing)
-        else:
-            new_attendance = Attendance(
-                subject_id=data['subject_id'],
-                student_id=student_id,
-                date=attendance_date,
-                status=status
-            )
-            db.session.add(new_attendance)
-            attendance_records.append(new_attendance)
+        # Later entries for the same student win, as with sequential updates
+        upserts[student_key] = entries[-1][1]
+        records_marked += len(entries)
+    
+    timings['validate_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    
+    phase_started = time.perf_counter()
+    changes = upsert_attendance(subject.id, attendance_date, upserts)
+    timings['write_ms'] = round((time.perf_counter() - phase_started) * 1000, 2)
+    
+    # Keep the per-student rollups in step within the same transaction
+    phase_started = time.perf_counter()
+    apply_marks(subject.id, attendance_date, upserts, changes)
+    timings['rollup_ms'] = round((time.perf_counter() - phase_started) * 1000, 2)
     
+    publish('attendance_marked', {
+        'subject_id': subject.id,
+        'date': attendance_date.isoformat(),
+        'records_marked': records_marked
+    }, users=[current_user.id, *upserts], channels=[f'subject:{subject.id}'])
+    
+    phase_started = time.perf_counter()
     db.session.commit()
+    timings['commit_ms'] = round((time.perf_counter() - phase_started) * 1000, 2)
+    timings['total_ms'] = round((time.perf_counter() - started) * 1000, 2)
     
     return jsonify({
         'message': 'Attendance marked successfully!',
-        'records_marked': len(attendance_records),
-        'errors': errors if errors else None
+        'records_marked': records_marked,
+        'errors': errors if errors else None,
+        'timings': timings
     }), 201
 
+def parse_date_arg(name):
+    """The query parameter `name` as a date, or None if absent or malformed"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        return None
+
 @teacher_bp.route('/attendance/<int:subject_id>', methods=['GET'])
 @role_required('teacher')
 def get_subject_attendance(current_user, subject_id):
-    """Get attendance records for a subject"""
+    """Get attendance records for a subject.
+    
+    ?format=matrix returns the whole range as a students x dates grid
+    (registers.attendance_matrix) instead of pages of records.
+    """
     # Verify teacher owns the subject
     subject = Subject.query.filter_by(
         id=subject_id,
@@ -236,45 +562,101 @@ def get_subject_attendance(current_user, subject_id):
     if not subject:
         return jsonify({'message': 'Subject not found or access denied!'}), 404
     
-    # Get date range from query parameters
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
+    # Get date range from query parameters; unparseable dates are ignored
+    start_date = parse_date_arg('start_date')
+    end_date = parse_date_arg('end_date')
     
-    query = Attendance.query.filter_by(subject_id=subject_id)
+    if request.args.get('format') == 'matrix':
+        return jsonify({
+            'subject': subject.to_dict(),
+            **attendance_matrix(subject.id, start_date, end_date)
+        }), 200
+    
+    query = shaped(Attendance.query, ATTENDANCE_SHAPE).filter_by(subject_id=subject_id)
     
     if start_date:
-        try:
-            query = query.filter(Attendance.date >= datetime.fromisoformat(start_date).date())
-        except ValueError:
-            pass
+        query = query.filter(Attendance.date >= start_date)
     
     if end_date:
-        try:
-            query = query.filter(Attendance.date <= datetime.fromisoformat(end_date).date())
-        except ValueError:
-            pass
+        query = query.filter(Attendance.date <= end_date)
     
-    attendance_records = query.order_by(Attendance.date.desc()).all()
+    attendance_records, next_cursor = paginate(query, [Attendance.date, Attendance.id], descending=True)
     
     # Group by student for easier display
     students_attendance = {}
-    for record in attendance_records:
-        student_id = record.student_id
-        if student_id not in students_attendance:
-            students_attendance[student_id] = {
-                'student': record.student.to_dict(),
-                'records': []
-            }
-        students_attendance[student_id]['records'].append(record.to_dict())
+    with timed_serialization():
+        for record in attendance_records:
+            student_id = record.student_id
+            if student_id not in students_attendance:
+                students_attendance[student_id] = {
+                    'student': record.student.to_dict(),
+                    'records': []
+                }
+            students_attendance[student_id]['records'].append(record.to_dict())
     
     return jsonify({
         'subject': subject.to_dict(),
-        'attendance': list(students_attendance.values())
+        'attendance': list(students_attendance.values()),
+        'next_cursor': next_cursor
+    }), 200
+
+@teacher_bp.route('/attendance/<int:subject_id>/export', methods=['GET'])
+@role_required('teacher')
+def export_subject_attendance(current_user, subject_id):
+    """Download the attendance register as ?format=csv (default) or xlsx,
+    optionally limited to ?start_date= / ?end_date="""
+    subject = Subject.query.filter_by(
+        id=subject_id,
+        teacher_id=current_user.id
+    ).first()
+    
+    if not subject:
+        return jsonify({'message': 'Subject not found or access denied!'}), 404
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in FORMATS:
+        return jsonify({'message': f"format must be one of: {', '.join(FORMATS)}"}), 400
+    
+    rows = attendance_register(subject.id, parse_date_arg('start_date'), parse_date_arg('end_date'))
+    name = secure_filename(subject.name) or 'subject'
+    return export_response(rows, export_format, f'{name}-{subject.id}-attendance', sheet_name=subject.name)
+
+@teacher_bp.route('/attendance/<int:subject_id>/summary', methods=['GET'])
+@role_required('teacher')
+def get_subject_attendance_summary(current_user, subject_id):
+    """Per-student attendance totals for a subject, read from the rollup table"""
+    subject = Subject.query.filter_by(
+        id=subject_id,
+        teacher_id=current_user.id
+    ).first()
+    
+    if not subject:
+        return jsonify({'message': 'Subject not found or access denied!'}), 404
+    
+    rows = db.session.query(AttendanceSummary, User.email)\
+        .join(User, User.id == AttendanceSummary.student_id)\
+        .filter(AttendanceSummary.subject_id == subject_id)\
+        .order_by(User.email)\
+        .all()
+    
+    return jsonify({
+        'subject': subject.to_dict(),
+        'students': [
+            {**summary.to_dict(), 'student_email': email}
+            for summary, email in rows
+        ]
     }), 200
 
 @teacher_bp.route('/students', methods=['GET'])
 @role_required('teacher')
+@cached_response('users', 'enrollments')
 def get_students(current_user):
-    """Get all students for teacher to select for attendance"""
-    students = User.query.filter_by(role='student', active=True).all()
-    return jsonify([student.to_dict() for student in students]), 200
\ No newline at end of file
+    """Students enrolled in ?subject_id= (the attendance roster), or in any of the teacher's subjects"""
+    subject_id = request.args.get('subject_id', type=int)
+    if subject_id is not None and not Subject.query.filter_by(id=subject_id, teacher_id=current_user.id).first():
+        return jsonify({'message': 'Subject not found or access denied!'}), 404
+    
+    query = User.query.filter_by(role='student', active=True)\
+        .filter(User.id.in_(roster_student_ids(current_user.id, subject_id)))
+    students, next_cursor = paginate(query, [User.id])
+    return jsonify(page_response(serialize(students), next_cursor)), 200
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""Fixtures: a fresh app on a throwaway SQLite file per test, with cheap
+password hashes, hashing on the request thread and the in-memory job queue."""
+import pytest
+from config import Config
+
+@pytest.fixture
+def config_overrides(tmp_path):
+    """Config settings a test module changes before the app is created; override this fixture"""
+    return {}
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, config_overrides):
+    monkeypatch.chdir(tmp_path)
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'STORAGE_ROOT': str(tmp_path / 'uploads' / 'blobs'),
+        'DATABASE_REPLICA_URLS': [],
+        'USER_CACHE_URL': None,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'PASSWORD_HASH_WORKERS': 0,
+        'JOB_QUEUE_BACKEND': 'memory',
+        'METRICS_TOKEN': 'test-metrics-token',
+        'TESTING': True,
+        **config_overrides,
+    }
+    for name, value in settings.items():
+        monkeypatch.setattr(Config, name, value, raising=False)
+
+    from app import create_app
+    from models import db
+    from migrations import upgrade
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
+    # No app context is held while the test runs: each request pushes its
+    # own, so flask.g does not leak from one request into the next
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+@pytest.fixture
+def engine(app):
+    from models import db
+    with app.app_context():
+        return db.engine
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+class Accounts:
+    """Registers users through the API; returns (user id, Authorization headers)"""
+
+    def __init__(self, client):
+        self.client = client
+        self.count = 0
+
+    def create(self, role):
+        self.count += 1
+        response = self.client.post('/register', json={
+            'email': f'{role}{self.count}@classflow.com', 'password': 'secret', 'role': role
+        })
+        assert response.status_code == 201, response.get_json()
+        body = response.get_json()
+        return body['user']['id'], {'Authorization': f"Bearer {body['token']}"}
+
+@pytest.fixture
+def accounts(client):
+    return Accounts(client)
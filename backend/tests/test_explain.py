@@ -0,0 +1,6 @@
+from explain import check
+
+def test_no_endpoint_query_scans_a_whole_table(app, capsys):
+    with app.app_context():
+        failures = check()
+    assert failures == {}, capsys.readouterr().out
@@ -0,0 +1,41 @@
+import io
+
+def setup_assignments(client, accounts):
+    """A teacher's subject with two assignments, each submitted by one student"""
+    _, teacher = accounts.create('teacher')
+    student_id, student = accounts.create('student')
+    subject_id = client.post('/api/subjects', json={'name': 'Maths'}, headers=teacher).get_json()['subject']['id']
+    client.post(f'/api/subjects/{subject_id}/students', json={'student_ids': [student_id]}, headers=teacher)
+    submission_ids = []
+    for title in ('First', 'Second'):
+        assignment_id = client.post('/api/assignments', headers=teacher, data={
+            'subject_id': subject_id, 'title': title, 'due_date': '2040-01-01T00:00:00'
+        }).get_json()['assignment']['id']
+        response = client.post('/api/submissions', headers=student, content_type='multipart/form-data', data={
+            'assignment_id': str(assignment_id), 'file': (io.BytesIO(b'work'), 'work.txt')
+        })
+        submission_ids.append((assignment_id, response.get_json()['submission']['id']))
+    return teacher, submission_ids
+
+def grades_of(client, teacher, assignment_id):
+    submissions = client.get(f'/api/assignments/{assignment_id}/submissions', headers=teacher).get_json()
+    return {submission['id']: submission['grade'] for submission in submissions}
+
+def test_bulk_grades_store_numbers_as_text(client, accounts):
+    teacher, [(assignment_id, submission_id), _] = setup_assignments(client, accounts)
+    response = client.put('/api/submissions/grades', headers=teacher, json={
+        'grades': [{'submission_id': submission_id, 'grade': 95}]
+    })
+    assert response.get_json()['graded'] == 1
+    assert grades_of(client, teacher, assignment_id) == {submission_id: '95'}
+
+def test_import_rejects_submissions_of_other_assignments(client, accounts):
+    teacher, [(assignment_id, own_id), (other_assignment_id, other_id)] = setup_assignments(client, accounts)
+    csv = f'submission_id,grade\n{own_id},A\n{other_id},F\n'
+    response = client.post(f'/api/assignments/{assignment_id}/grades/import', headers=teacher,
+                           data=csv, content_type='text/csv')
+    body = response.get_json()
+    assert body['graded'] == 1
+    assert body['errors'] == [f'Submission {other_id}: not a submission for this assignment']
+    assert grades_of(client, teacher, assignment_id) == {own_id: 'A'}
+    assert grades_of(client, teacher, other_assignment_id) == {other_id: None}
@@ -0,0 +1,138 @@
+"""The job queue with JOB_QUEUE_BACKEND=memory (see conftest.py), where
+run_pending() executes due jobs on the calling thread."""
+import io
+import os
+import sys
+from datetime import datetime, timedelta
+import pytest
+from jobs import task, job_queue, retry_delay
+from models import db, Submission
+from storage import get_storage
+from tasks import enqueue_postprocess
+
+calls = []
+
+@task('test.flaky', max_attempts=3)
+def flaky(fail_times):
+    """Fails its first fail_times runs"""
+    calls.append(datetime.utcnow())
+    if len(calls) <= fail_times:
+        raise RuntimeError(f'failure {len(calls)}')
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+
+def make_due(job):
+    """Move a job waiting for its retry to now, instead of sleeping"""
+    job['run_at'] = datetime.utcnow() - timedelta(seconds=1)
+
+def test_retry_delay_doubles_up_to_the_cap():
+    assert [retry_delay(attempt, 5, 60).total_seconds() for attempt in range(1, 6)] == [5, 10, 20, 40, 60]
+
+def test_failed_job_is_retried_with_backoff(app):
+    with app.app_context():
+        job_queue.enqueue('test.flaky', {'fail_times': 2})
+        [job] = job_queue.backend.jobs
+
+        assert job_queue.run_pending() == 1
+        assert job['status'] == 'queued' and job['attempts'] == 1
+        assert 'failure 1' in job['last_error']
+        wait = job['run_at'] - datetime.utcnow()
+        assert timedelta(seconds=app.config['JOB_RETRY_BASE'] - 1) < wait <= timedelta(seconds=app.config['JOB_RETRY_BASE'])
+        # Not due yet
+        assert job_queue.run_pending() == 0
+
+        make_due(job)
+        before = datetime.utcnow()
+        assert job_queue.run_pending() == 1
+        assert job['attempts'] == 2
+        assert job['run_at'] - before >= timedelta(seconds=2 * app.config['JOB_RETRY_BASE'] - 1)
+
+        make_due(job)
+        assert job_queue.run_pending() == 1
+        assert job['status'] == 'done' and job['attempts'] == 3 and job['last_error'] is None
+        assert len(calls) == 3
+
+def test_job_fails_after_max_attempts(app):
+    with app.app_context():
+        job_queue.enqueue('test.flaky', {'fail_times': 10})
+        [job] = job_queue.backend.jobs
+        for _ in range(3):
+            make_due(job)
+            job_queue.run_pending()
+        assert job['status'] == 'failed' and job['attempts'] == 3
+        assert 'failure 3' in job['last_error']
+        make_due(job)
+        assert job_queue.run_pending() == 0
+        assert job_queue.stats()['by_status'] == {'failed': 1}
+
+def test_idempotency_key_deduplicates(app):
+    with app.app_context():
+        job_queue.enqueue('test.flaky', {'fail_times': 0}, idempotency_key='once')
+        job_queue.enqueue('test.flaky', {'fail_times': 0}, idempotency_key='once')
+        job_queue.enqueue('test.flaky', {'fail_times': 0})
+        job_queue.enqueue('test.flaky', {'fail_times': 0})
+        assert len(job_queue.backend.jobs) == 3
+        assert job_queue.run_pending() == 3
+
+def test_unknown_task_is_rejected(app):
+    with app.app_context():
+        with pytest.raises(KeyError):
+            job_queue.enqueue('test.missing')
+
+@pytest.fixture
+def submission_id(client, accounts):
+    """A submission made through the API, with its post-processing job queued"""
+    _, teacher = accounts.create('teacher')
+    student_id, student = accounts.create('student')
+    subject_id = client.post('/api/subjects', json={'name': 'Maths'}, headers=teacher).get_json()['subject']['id']
+    client.post(f'/api/subjects/{subject_id}/students', json={'student_ids': [student_id]}, headers=teacher)
+    assignment_id = client.post('/api/assignments', headers=teacher, data={
+        'subject_id': subject_id, 'title': 'Essay', 'due_date': '2040-01-01T00:00:00'
+    }).get_json()['assignment']['id']
+    response = client.post('/api/submissions', headers=student, content_type='multipart/form-data', data={
+        'assignment_id': str(assignment_id), 'file': (io.BytesIO(b'my essay'), 'essay.txt')
+    })
+    return response.get_json()['submission']['id']
+
+def test_submission_queues_postprocess_once(app, submission_id):
+    with app.app_context():
+        [job] = job_queue.backend.jobs
+        assert job['name'] == 'submission.postprocess'
+        assert job['payload'] == {'submission_id': submission_id}
+        enqueue_postprocess(db.session.get(Submission, submission_id))
+        assert len(job_queue.backend.jobs) == 1
+
+def test_postprocess_verifies_and_marks_submission(app, submission_id):
+    with app.app_context():
+        assert job_queue.run_pending() == 1
+        assert job_queue.backend.jobs[0]['status'] == 'done'
+        submission = db.session.get(Submission, submission_id)
+        assert submission.scan_status == 'skipped'
+        assert submission.processed_at is not None
+
+@pytest.mark.parametrize('exit_status, scan_status', [(0, 'clean'), (1, 'infected')])
+def test_postprocess_records_scan_result(app, submission_id, exit_status, scan_status):
+    app.config['SUBMISSION_SCAN_COMMAND'] = [sys.executable, '-c', f'import sys; sys.exit({exit_status})']
+    with app.app_context():
+        job_queue.run_pending()
+        assert db.session.get(Submission, submission_id).scan_status == scan_status
+
+def test_postprocess_retries_on_scanner_error(app, submission_id):
+    app.config['SUBMISSION_SCAN_COMMAND'] = [sys.executable, '-c', 'import sys; sys.exit(2)']
+    with app.app_context():
+        job_queue.run_pending()
+        [job] = job_queue.backend.jobs
+        assert job['status'] == 'queued' and 'Scanner exited with 2' in job['last_error']
+        assert db.session.get(Submission, submission_id).processed_at is None
+
+def test_postprocess_detects_corrupt_blob(app, submission_id):
+    with app.app_context():
+        path = get_storage().local_path(db.session.get(Submission, submission_id).blob_key)
+        os.chmod(path, 0o644)
+        with open(path, 'wb') as blob:
+            blob.write(b'tampered')
+        job_queue.run_pending()
+        [job] = job_queue.backend.jobs
+        assert job['status'] == 'queued' and 'is corrupt' in job['last_error']
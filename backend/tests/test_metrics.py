@@ -0,0 +1,44 @@
+import re
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+OPERATIONAL = ['/metrics', '/cache-stats', '/job-stats', '/auth-stats', '/db-stats']
+
+@pytest.mark.parametrize('url', OPERATIONAL)
+def test_operational_endpoints_need_the_token(client, url):
+    assert client.get(url).status_code == 401
+    assert client.get(url, headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get(url, headers={'Authorization': 'Bearer test-metrics-token'}).status_code == 200
+
+@pytest.mark.parametrize('url', OPERATIONAL)
+def test_operational_endpoints_refused_without_a_configured_token(app, client, url):
+    app.config['METRICS_TOKEN'] = None
+    assert client.get(url).status_code == 403
+    assert client.get(url, headers={'Authorization': 'Bearer '}).status_code == 403
+
+@pytest.mark.parametrize('url', OPERATIONAL[1:])
+def test_teacher_accounts_do_not_open_stats(client, accounts, url):
+    # Anyone can register as a teacher, so the role grants nothing here
+    _, teacher = accounts.create('teacher')
+    assert client.get(url, headers=teacher).status_code == 401
+
+def test_serialization_is_timed_per_endpoint(client, accounts):
+    _, teacher = accounts.create('teacher')
+    client.post('/api/subjects', json={'name': 'Maths'}, headers=teacher)
+    client.get('/api/subjects', headers=teacher)
+    body = client.get('/metrics', headers={'Authorization': 'Bearer test-metrics-token'}).get_data(as_text=True)
+    count = re.search(r'^classflow_request_serialize_seconds_count\{endpoint="teacher.get_teacher_subjects",'
+                      r'process="\d+"\} (\d+)$', body, re.MULTILINE)
+    assert count and int(count.group(1)) >= 1
+    total = re.search(r'^classflow_request_serialize_seconds_sum\{endpoint="teacher.get_teacher_subjects",'
+                      r'process="\d+"\} ([\d.]+)$', body, re.MULTILINE)
+    assert float(total.group(1)) > 0
+
+def test_failed_statements_leave_no_timing_state_on_the_connection(engine):
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM no_such_table'))
+        assert conn.execute(text('SELECT 1')).scalar() == 1
+        assert 'metrics_started' not in conn.info
@@ -0,0 +1,74 @@
+import io
+import pytest
+
+@pytest.fixture
+def student(client, accounts):
+    """A student enrolled in 5 of a teacher's 6 subjects, marked present on
+    5 days and with 5 submissions in the first subject"""
+    _, teacher = accounts.create('teacher')
+    student_id, headers = accounts.create('student')
+    subject_ids = []
+    for index in range(6):
+        subject = client.post('/api/subjects', json={'name': f'Subject {index}'}, headers=teacher)
+        subject_ids.append(subject.get_json()['subject']['id'])
+    enrolled = subject_ids[:5]
+    for subject_id in enrolled:
+        client.post(f'/api/subjects/{subject_id}/students', json={'student_ids': [student_id]}, headers=teacher)
+    for day in range(1, 6):
+        client.post('/api/attendance/mark', headers=teacher, json={
+            'subject_id': enrolled[0], 'date': f'2026-02-{day:02d}',
+            'attendance_records': [{'student_id': student_id, 'status': 'PRESENT'}]
+        })
+    for index in range(5):
+        assignment = client.post('/api/assignments', headers=teacher, data={
+            'subject_id': enrolled[0], 'title': f'Assignment {index}', 'due_date': '2040-01-01T00:00:00'
+        })
+        client.post('/api/submissions', headers=headers, content_type='multipart/form-data', data={
+            'assignment_id': str(assignment.get_json()['assignment']['id']), 'file': (io.BytesIO(b'work'), 'work.txt')
+        })
+    return headers, enrolled
+
+def walk(client, url, headers, items_key='items'):
+    """Follow next_cursor from the first page to the last; returns the pages"""
+    pages = []
+    cursor = None
+    while True:
+        response = client.get(url + (f'&cursor={cursor}' if cursor else ''), headers=headers)
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        pages.append(body[items_key])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return pages
+
+def test_student_subjects_unpaginated_is_a_bare_list(client, student):
+    headers, enrolled = student
+    response = client.get('/api/student/subjects', headers=headers)
+    assert [subject['id'] for subject in response.get_json()] == enrolled
+
+def test_student_subjects_pages(client, student):
+    headers, enrolled = student
+    pages = walk(client, '/api/student/subjects?limit=2', headers)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [subject['id'] for page in pages for subject in page] == enrolled
+
+def test_my_submissions_pages(client, student):
+    headers, _ = student
+    everything = client.get('/api/my-submissions', headers=headers).get_json()
+    pages = walk(client, '/api/my-submissions?limit=2', headers)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [submission['id'] for page in pages for submission in page] == \
+        [submission['id'] for submission in everything]
+
+def test_my_attendance_pages(client, student):
+    headers, _ = student
+    pages = walk(client, '/api/my-attendance?limit=2', headers, items_key='attendance')
+    dates = [record['date'] for page in pages for record in page]
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert dates == sorted(dates, reverse=True) and len(set(dates)) == 5
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit=many', 'cursor=not-a-cursor'])
+def test_bad_page_arguments(client, student, query):
+    headers, _ = student
+    response = client.get(f'/api/student/subjects?{query}', headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,37 @@
+import pytest
+from push_server import PushServer
+
+@pytest.fixture
+def school(client, accounts):
+    """Two teachers' subjects; the student is enrolled in the first only"""
+    teacher_id, teacher = accounts.create('teacher')
+    other_teacher_id, other_teacher = accounts.create('teacher')
+    student_id, _ = accounts.create('student')
+    subjects = []
+    for headers in (teacher, other_teacher):
+        subject = client.post('/api/subjects', json={'name': 'Subject'}, headers=headers)
+        subjects.append(subject.get_json()['subject']['id'])
+    client.post(f'/api/subjects/{subjects[0]}/students', json={'student_ids': [student_id]}, headers=teacher)
+    assignment = client.post('/api/assignments', headers=teacher, data={
+        'subject_id': subjects[0], 'title': 'Homework', 'due_date': '2040-01-01T00:00:00'
+    })
+    return {
+        'teacher': {'id': teacher_id, 'role': 'teacher'},
+        'student': {'id': student_id, 'role': 'student'},
+        'enrolled': subjects[0], 'other': subjects[1],
+        'assignment': assignment.get_json()['assignment']['id']
+    }
+
+def test_students_follow_only_their_subjects(app, school):
+    push = PushServer(app)
+    assert push._may_subscribe(school['student'], f"subject:{school['enrolled']}")
+    assert not push._may_subscribe(school['student'], f"subject:{school['other']}")
+    assert not push._may_subscribe(school['student'], 'subject:9999')
+    assert not push._may_subscribe(school['student'], f"assignment:{school['assignment']}")
+
+def test_teachers_follow_only_their_own(app, school):
+    push = PushServer(app)
+    assert push._may_subscribe(school['teacher'], f"subject:{school['enrolled']}")
+    assert push._may_subscribe(school['teacher'], f"assignment:{school['assignment']}")
+    assert not push._may_subscribe(school['teacher'], f"subject:{school['other']}")
+    assert not push._may_subscribe(school['teacher'], 'subject:not-a-number')
@@ -0,0 +1,75 @@
+"""Pin the SQL statements each list endpoint issues, so an N+1 regression
+(a relationship lazy-loaded per row instead of by the endpoint's shape in
+serializers.py) fails here. Every endpoint is measured over a small and a
+larger data set: the count must be exact, and the same for both."""
+import io
+import pytest
+from querycount import assert_num_queries
+
+def build_school(client, accounts, size):
+    """A teacher with `size` subjects, each with `size` enrolled students,
+    `size` assignments (all submitted and graded) and `size` days of attendance"""
+    teacher_id, teacher = accounts.create('teacher')
+    students = [accounts.create('student') for _ in range(size)]
+    student_ids = [student_id for student_id, _ in students]
+    subject_ids, assignment_ids = [], []
+    for s in range(size):
+        subject = client.post('/api/subjects', json={'name': f'Subject {s}'}, headers=teacher)
+        subject_id = subject.get_json()['subject']['id']
+        subject_ids.append(subject_id)
+        client.post(f'/api/subjects/{subject_id}/students', json={'student_ids': student_ids}, headers=teacher)
+        for a in range(size):
+            response = client.post('/api/assignments', headers=teacher, data={
+                'subject_id': subject_id, 'title': f'Assignment {a}',
+                'due_date': f'20{30 + a}-01-01T00:00:00'
+            })
+            assignment_ids.append(response.get_json()['assignment']['id'])
+        for day in range(1, size + 1):
+            client.post('/api/attendance/mark', headers=teacher, json={
+                'subject_id': subject_id, 'date': f'2026-01-{day:02d}',
+                'attendance_records': [{'student_id': student_id, 'status': 'PRESENT'} for student_id in student_ids]
+            })
+    for assignment_id in assignment_ids:
+        for _, headers in students:
+            response = client.post('/api/submissions', headers=headers, content_type='multipart/form-data', data={
+                'assignment_id': str(assignment_id), 'file': (io.BytesIO(b'work'), 'work.txt')
+            })
+            assert response.status_code == 201, response.get_json()
+    grades = client.get(f'/api/assignments/{assignment_ids[0]}/submissions', headers=teacher).get_json()
+    client.put('/api/submissions/grades', headers=teacher, json={
+        'grades': [{'submission_id': submission['id'], 'grade': 'A'} for submission in grades]
+    })
+    return {
+        'teacher': teacher, 'student': students[0][1],
+        'subject_id': subject_ids[0], 'assignment_id': assignment_ids[0]
+    }
+
+# (role, URL template, expected statements)
+ENDPOINTS = [
+    ('teacher', '/api/subjects', 1),
+    ('teacher', '/api/assignments/{subject_id}', 2),
+    ('teacher', '/api/assignments/{assignment_id}/submissions', 3),
+    ('teacher', '/api/attendance/{subject_id}', 3),
+    ('teacher', '/api/attendance/{subject_id}?format=matrix', 4),
+    ('teacher', '/api/students', 1),
+    ('student', '/api/student/subjects', 1),
+    ('student', '/api/student/assignments/{subject_id}', 3),
+    ('student', '/api/my-submissions', 1),
+    ('student', '/api/my-attendance', 1),
+    ('student', '/api/my-attendance?subject_id={subject_id}', 2),
+    ('student', '/api/student/dashboard', 5),
+]
+
+@pytest.mark.parametrize('size', [2, 4])
+@pytest.mark.parametrize('role, url, expected', ENDPOINTS)
+def test_statement_count(app, engine, client, accounts, size, role, url, expected):
+    school = build_school(client, accounts, size)
+    url = url.format(**school)
+    # Count the queries themselves rather than response cache hits
+    app.config['RESPONSE_CACHE_ENABLED'] = False
+    # Warm the token user cache, as on any request after the first
+    assert client.get(url, headers=school[role]).status_code == 200
+
+    with assert_num_queries(expected, engine):
+        response = client.get(url, headers=school[role])
+    assert response.status_code == 200
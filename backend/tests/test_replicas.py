@@ -0,0 +1,75 @@
+"""Read routing with one replica: two SQLite files, where
+database.sync_sqlite_replicas() stands in for replication."""
+import pytest
+from sqlalchemy import create_engine
+from database import sync_sqlite_replicas
+from user_cache import user_cache
+
+@pytest.fixture
+def config_overrides(tmp_path):
+    # Without the response cache, which may hold lists read from the lagging replica
+    return {'DATABASE_REPLICA_URLS': [f"sqlite:///{tmp_path / 'replica.db'}"], 'RESPONSE_CACHE_ENABLED': False}
+
+@pytest.fixture
+def router(app):
+    sync_sqlite_replicas(app)
+    return app.extensions['replicas']
+
+def forget_writes(router, *user_ids):
+    """End the read-your-writes window early"""
+    for user_id in user_ids:
+        router.sticky.delete(user_id)
+
+def subject_names(client, headers):
+    return [subject['name'] for subject in client.get('/api/subjects', headers=headers).get_json()]
+
+def test_reads_go_to_the_replica_and_writes_to_the_primary(app, client, accounts, router):
+    teacher_id, teacher = accounts.create('teacher')
+    sync_sqlite_replicas(app)
+    forget_writes(router, teacher_id)
+
+    assert client.post('/api/subjects', json={'name': 'Maths'}, headers=teacher).status_code == 201
+    forget_writes(router, teacher_id)
+    # The replica has not caught up yet
+    assert subject_names(client, teacher) == []
+    assert router.stats()['replica_reads']['replica-0'] >= 1
+
+    sync_sqlite_replicas(app)
+    assert subject_names(client, teacher) == ['Maths']
+
+def test_writer_reads_the_primary_after_a_write(app, client, accounts, router):
+    teacher_id, teacher = accounts.create('teacher')
+    sync_sqlite_replicas(app)
+    forget_writes(router, teacher_id)
+
+    client.post('/api/subjects', json={'name': 'Maths'}, headers=teacher)
+    assert router.sticky.get(teacher_id)
+    assert subject_names(client, teacher) == ['Maths']
+
+def test_new_account_reads_the_primary(client, accounts, router):
+    # Registered after the last sync, with a cold user cache as on another worker
+    user_id, headers = accounts.create('student')
+    user_cache.clear()
+    assert router.sticky.get(user_id)
+    response = client.get('/me', headers=headers)
+    assert response.status_code == 200, response.get_json()
+
+def test_login_marks_the_user_as_writer(client, accounts, router):
+    user_id, _ = accounts.create('student')
+    forget_writes(router, user_id)
+    response = client.post('/login', json={'email': 'student1@classflow.com', 'password': 'secret'})
+    assert response.status_code == 200
+    assert router.sticky.get(user_id)
+
+def test_unreachable_replica_fails_over_to_the_primary(app, client, accounts, router, tmp_path):
+    teacher_id, teacher = accounts.create('teacher')
+    client.post('/api/subjects', json={'name': 'Maths'}, headers=teacher)
+    forget_writes(router, teacher_id)
+    router.engines['replica-0'] = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+
+    assert subject_names(client, teacher) == ['Maths']
+    stats = router.stats()
+    assert stats['failovers'] == 1 and stats['down'] == ['replica-0']
+    # Skipped for REPLICA_RETRY_INTERVAL rather than retried on every request
+    assert subject_names(client, teacher) == ['Maths']
+    assert router.stats()['failovers'] == 1
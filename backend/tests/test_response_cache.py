@@ -0,0 +1,64 @@
+import pytest
+from response_cache import response_cache
+
+@pytest.fixture
+def school(client, accounts):
+    """A teacher's subject with an assignment and one enrolled student"""
+    _, teacher = accounts.create('teacher')
+    student_id, student = accounts.create('student')
+    subject_id = client.post('/api/subjects', json={'name': 'Maths'}, headers=teacher).get_json()['subject']['id']
+    client.post(f'/api/subjects/{subject_id}/students', json={'student_ids': [student_id]}, headers=teacher)
+    client.post('/api/assignments', headers=teacher, data={
+        'subject_id': subject_id, 'title': 'Homework', 'due_date': '2040-01-01T00:00:00'
+    })
+    return {'teacher': teacher, 'student': student, 'student_id': student_id, 'subject_id': subject_id}
+
+def counters(endpoint):
+    return dict(response_cache.stats()['endpoints'].get(endpoint, {'hits': 0, 'misses': 0, 'not_modified': 0}))
+
+def test_student_subjects_are_cached_and_revalidated(client, school):
+    endpoint = 'student.get_student_subjects'
+    before = counters(endpoint)
+    first = client.get('/api/student/subjects', headers=school['student'])
+    second = client.get('/api/student/subjects', headers=school['student'])
+    assert first.status_code == second.status_code == 200
+    assert first.get_json() == second.get_json()
+    assert first.headers['ETag'] == second.headers['ETag']
+
+    revalidated = client.get('/api/student/subjects',
+                             headers={**school['student'], 'If-None-Match': first.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.get_data() == b''
+
+    after = counters(endpoint)
+    assert after['misses'] - before['misses'] == 1
+    assert after['hits'] - before['hits'] == 2
+    assert after['not_modified'] - before['not_modified'] == 1
+
+def test_unenrolling_invalidates_student_subjects(client, school):
+    first = client.get('/api/student/subjects', headers=school['student'])
+    assert [subject['id'] for subject in first.get_json()] == [school['subject_id']]
+
+    client.delete(f"/api/subjects/{school['subject_id']}/students", headers=school['teacher'],
+                  json={'student_ids': [school['student_id']]})
+    second = client.get('/api/student/subjects',
+                        headers={**school['student'], 'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.get_json() == []
+
+def test_new_assignment_invalidates_student_assignments(client, school):
+    url = f"/api/student/assignments/{school['subject_id']}"
+    first = client.get(url, headers=school['student'])
+    assert len(first.get_json()) == 1
+
+    client.post('/api/assignments', headers=school['teacher'], data={
+        'subject_id': school['subject_id'], 'title': 'Project', 'due_date': '2040-02-01T00:00:00'
+    })
+    second = client.get(url, headers={**school['student'], 'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert [assignment['title'] for assignment in second.get_json()] == ['Homework', 'Project']
+
+def test_entries_are_per_student(client, accounts, school):
+    _, other = accounts.create('student')
+    assert client.get('/api/student/subjects', headers=school['student']).get_json() != []
+    assert client.get('/api/student/subjects', headers=other).get_json() == []
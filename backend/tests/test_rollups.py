@@ -0,0 +1,63 @@
+import threading
+import pytest
+import rollups
+from models import AttendanceSummary
+
+@pytest.fixture
+def roster(client, accounts):
+    """A teacher's subject with five enrolled students"""
+    _, teacher = accounts.create('teacher')
+    student_ids = [accounts.create('student')[0] for _ in range(5)]
+    subject_id = client.post('/api/subjects', json={'name': 'Maths'}, headers=teacher).get_json()['subject']['id']
+    client.post(f'/api/subjects/{subject_id}/students', json={'student_ids': student_ids}, headers=teacher)
+    return teacher, subject_id, student_ids
+
+def mark(client, teacher, subject_id, day, statuses):
+    response = client.post('/api/attendance/mark', headers=teacher, json={
+        'subject_id': subject_id, 'date': day,
+        'attendance_records': [{'student_id': student_id, 'status': status} for student_id, status in statuses.items()]
+    })
+    assert response.status_code == 201, response.get_json()
+
+def summaries(subject_id):
+    return {summary.student_id: (summary.present_count, summary.absent_count, summary.current_streak)
+            for summary in AttendanceSummary.query.filter_by(subject_id=subject_id)}
+
+def test_marking_a_day_twice_keeps_rollups_exact(app, client, roster):
+    teacher, subject_id, student_ids = roster
+    first, second, *others = student_ids
+    mark(client, teacher, subject_id, '2026-03-02', {student_id: 'PRESENT' for student_id in student_ids})
+    mark(client, teacher, subject_id, '2026-03-03', {student_id: 'PRESENT' for student_id in student_ids})
+    # The same day again: one flip each way, the rest unchanged
+    mark(client, teacher, subject_id, '2026-03-03', {first: 'ABSENT', **{student_id: 'PRESENT' for student_id in others}})
+    mark(client, teacher, subject_id, '2026-03-02', {second: 'ABSENT'})
+
+    with app.app_context():
+        assert rollups.check(subject_id) == []
+        counts = summaries(subject_id)
+    assert counts[first] == (1, 1, 0)
+    assert counts[second] == (1, 1, 1)
+    assert all(counts[student_id] == (2, 0, 2) for student_id in others)
+
+def test_concurrent_identical_marks_count_once(app, client, roster):
+    teacher, subject_id, student_ids = roster
+    barrier = threading.Barrier(8)
+    failures = []
+
+    def post():
+        barrier.wait()
+        try:
+            mark(client, teacher, subject_id, '2026-03-02', {student_id: 'PRESENT' for student_id in student_ids})
+        except AssertionError as e:
+            failures.append(e)
+
+    threads = [threading.Thread(target=post) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
+    with app.app_context():
+        assert rollups.check(subject_id) == []
+        assert set(summaries(subject_id).values()) == {(1, 0, 1)}
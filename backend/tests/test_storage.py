@@ -0,0 +1,56 @@
+import hashlib
+from datetime import datetime, timedelta
+from sqlalchemy import event, update
+from models import db, Blob
+from storage import gc, get_storage, store_file
+
+def stored(tmp_path, content):
+    """Put content in blob storage and backdate its row past gc's grace period"""
+    source = tmp_path / f'{hashlib.sha256(content).hexdigest()}.tmp'
+    source.write_bytes(content)
+    key = store_file(str(source), hashlib.sha256(content).hexdigest())
+    db.session.execute(update(Blob.__table__).where(Blob.key == key)
+                       .values(created_at=datetime.utcnow() - timedelta(days=1)))
+    db.session.commit()
+    return key
+
+def test_gc_removes_old_unreferenced_blobs(app, tmp_path):
+    with app.app_context():
+        key = stored(tmp_path, b'orphaned work')
+        assert gc() == 1
+        db.session.commit()
+        assert db.session.get(Blob, key) is None
+        assert not get_storage().exists(key)
+
+def test_reuploading_an_old_blob_restarts_its_grace_period(app, tmp_path):
+    with app.app_context():
+        key = stored(tmp_path, b'resubmitted work')
+        # The same bytes arrive again before gc runs: ingest reuses the stored
+        # file, so the row must look new or gc would delete it from under the upload
+        again = tmp_path / 'again.tmp'
+        again.write_bytes(b'resubmitted work')
+        assert store_file(str(again), key) == key
+        db.session.commit()
+
+        assert gc() == 0
+        db.session.commit()
+        assert db.session.get(Blob, key) is not None
+        assert get_storage().exists(key)
+
+def test_gc_rechecks_age_when_deleting(app, tmp_path):
+    with app.app_context():
+        key = stored(tmp_path, b'racing work')
+
+        # A concurrent upload refreshes the row between gc's scan and its DELETE
+        def refresh_first(state):
+            if state.is_delete:
+                state.session.execute(update(Blob.__table__).where(Blob.key == key)
+                                      .values(created_at=datetime.utcnow()))
+        event.listen(db.session, 'do_orm_execute', refresh_first)
+        try:
+            assert gc() == 0
+        finally:
+            event.remove(db.session, 'do_orm_execute', refresh_first)
+        db.session.commit()
+        assert db.session.get(Blob, key) is not None
+        assert get_storage().exists(key)
@@ -0,0 +1,19 @@
+import io
+
+def test_submission_dict_shape(client, accounts):
+    _, teacher = accounts.create('teacher')
+    student_id, student = accounts.create('student')
+    subject_id = client.post('/api/subjects', json={'name': 'Maths'}, headers=teacher).get_json()['subject']['id']
+    client.post(f'/api/subjects/{subject_id}/students', json={'student_ids': [student_id]}, headers=teacher)
+    assignment_id = client.post('/api/assignments', headers=teacher, data={
+        'subject_id': subject_id, 'title': 'Essay', 'due_date': '2040-01-01T00:00:00'
+    }).get_json()['assignment']['id']
+    client.post('/api/submissions', headers=student, content_type='multipart/form-data', data={
+        'assignment_id': str(assignment_id), 'file': (io.BytesIO(b'my essay'), 'My Essay.txt')
+    })
+
+    [submission] = client.get('/api/my-submissions', headers=student).get_json()
+    # file_path is kept for older clients: the same stored key as blob_key
+    assert submission['file_path'] == submission['blob_key'] == submission['sha256']
+    # filename is the name the file was uploaded under, not the stored path
+    assert submission['filename'] == 'My_Essay.txt'
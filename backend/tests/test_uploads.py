@@ -0,0 +1,84 @@
+import hashlib
+import io
+import threading
+import pytest
+from models import Submission
+from storage import get_storage
+
+@pytest.fixture
+def upload(client, accounts):
+    """A student's chunked upload session for an assignment of a subject they are enrolled in"""
+    _, teacher = accounts.create('teacher')
+    student_id, student = accounts.create('student')
+    subject_id = client.post('/api/subjects', json={'name': 'Maths'}, headers=teacher).get_json()['subject']['id']
+    client.post(f'/api/subjects/{subject_id}/students', json={'student_ids': [student_id]}, headers=teacher)
+    assignment_id = client.post('/api/assignments', headers=teacher, data={
+        'subject_id': subject_id, 'title': 'Essay', 'due_date': '2040-01-01T00:00:00'
+    }).get_json()['assignment']['id']
+    response = client.post('/api/uploads', headers=student, json={
+        'assignment_id': assignment_id, 'filename': 'essay.txt', 'size': 8
+    })
+    assert response.status_code == 201, response.get_json()
+    return {'teacher': teacher, 'student': student, 'student_id': student_id, 'subject_id': subject_id,
+            'upload_id': response.get_json()['upload_id']}
+
+class GatedStream(io.BytesIO):
+    """A request body that waits at `barrier` before its first read, so two
+    requests are both past their offset check when either writes"""
+
+    def __init__(self, data, barrier):
+        super().__init__(data)
+        self.barrier = barrier
+        self.waited = False
+
+    def read(self, *args):
+        if not self.waited:
+            self.waited = True
+            self.barrier.wait()
+        return super().read(*args)
+
+def put_chunk(client, upload, offset, body):
+    return client.put(f"/api/uploads/{upload['upload_id']}?offset={offset}", headers=upload['student'],
+                      data=body, content_type='application/octet-stream')
+
+def test_racing_chunks_keep_only_the_counted_bytes(app, client, upload):
+    barrier = threading.Barrier(2)
+    bodies = [b'AAAAAAAA', b'BBBBBBBB']
+    statuses = {}
+
+    def send(body):
+        statuses[body] = put_chunk(client, upload, 0, GatedStream(body, barrier)).status_code
+
+    threads = [threading.Thread(target=send, args=(body,)) for body in bodies]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(statuses.values()) == [200, 409]
+    [winner] = [body for body, status in statuses.items() if status == 200]
+
+    response = client.post(f"/api/uploads/{upload['upload_id']}/complete", headers=upload['student'])
+    assert response.status_code == 201, response.get_json()
+    submission = response.get_json()['submission']
+    assert submission['sha256'] == hashlib.sha256(winner).hexdigest()
+    with app.app_context():
+        with get_storage().open(submission['blob_key']) as stored:
+            assert stored.read() == winner
+
+def test_chunks_assemble_in_order(app, client, upload):
+    assert put_chunk(client, upload, 0, b'abcd').status_code == 200
+    # A resend of the first chunk is refused without touching the file
+    assert put_chunk(client, upload, 0, b'zzzz').status_code == 409
+    assert put_chunk(client, upload, 4, b'efgh').status_code == 200
+    response = client.post(f"/api/uploads/{upload['upload_id']}/complete", headers=upload['student'],
+                           json={'sha256': hashlib.sha256(b'abcdefgh').hexdigest()})
+    assert response.status_code == 201, response.get_json()
+
+def test_complete_requires_enrollment(app, client, upload):
+    put_chunk(client, upload, 0, b'abcdefgh')
+    client.delete(f"/api/subjects/{upload['subject_id']}/students", headers=upload['teacher'],
+                  json={'student_ids': [upload['student_id']]})
+    response = client.post(f"/api/uploads/{upload['upload_id']}/complete", headers=upload['student'])
+    assert response.status_code == 403
+    with app.app_context():
+        assert Submission.query.count() == 0
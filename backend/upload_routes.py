@@ -0,0 +1,260 @@
+import hashlib
+import os
+import threading
+import uuid
+from datetime import datetime
+from flask import Blueprint, request, jsonify, current_app
+from models import db, Assignment, Submission, UploadSession
+from auth import role_required
+from uploads import (
+    UploadTooLarge, file_extension, size_limit, copy_stream, file_sha256, part_path, temporary_path
+)
+from storage import store_file
+from tasks import enqueue_postprocess
+from events import submission_created
+from enrollments import is_enrolled
+from werkzeug.utils import secure_filename
+
+
+upload_bp = Blueprint('upload', __name__)
+
+# upload_id -> (bytes hashed so far, sha256 object). Lets chunks handled by this
+# process extend the digest as they stream; if a chunk lands on another worker
+# the entry is dropped and complete_upload re-hashes the file from disk.
+_running_hashes = {}
+_running_hashes_lock = threading.Lock()
+
+def discard_session(session):
+    with _running_hashes_lock:
+        _running_hashes.pop(session.id, None)
+    try:
+        os.remove(part_path(session.id))
+    except FileNotFoundError:
+        pass
+    db.session.delete(session)
+
+def purge_expired_sessions():
+    """Drop upload sessions that have not received data within UPLOAD_SESSION_TTL"""
+    cutoff = datetime.utcnow() - current_app.config['UPLOAD_SESSION_TTL']
+    for session in UploadSession.query.filter(UploadSession.updated_at < cutoff).all():
+        discard_session(session)
+
+def get_own_session(current_user, upload_id):
+    session = db.session.get(UploadSession, upload_id)
+    if not session or session.student_id != current_user.id:
+        return None
+    return session
+
+@upload_bp.route('/uploads', methods=['POST'])
+@role_required('student')
+def initiate_upload(current_user):
+    """Start a chunked submission upload; validates everything that does not need the bytes"""
+    data = request.get_json()
+
+    required_fields = ['assignment_id', 'filename', 'size']
+    for field in required_fields:
+        if not data or field not in data:
+            return jsonify({'message': f'{field} is required!'}), 400
+
+    filename = data['filename']
+    if file_extension(filename) not in current_app.config['ALLOWED_EXTENSIONS']:
+        return jsonify({
+            'message': f'File type not allowed! Allowed types: {", ".join(current_app.config["ALLOWED_EXTENSIONS"])}'
+        }), 400
+
+    try:
+        size = int(data['size'])
+    except (TypeError, ValueError):
+        return jsonify({'message': 'Invalid size!'}), 400
+
+    if size <= 0:
+        return jsonify({'message': 'Invalid size!'}), 400
+    if size > size_limit(filename):
+        return jsonify({'message': f'File too large! Limit for this type is {size_limit(filename)} bytes'}), 413
+
+    assignment = db.session.get(Assignment, data['assignment_id'])
+    if not assignment:
+        return jsonify({'message': 'Assignment not found!'}), 404
+
+    if not is_enrolled(current_user.id, assignment.subject_id):
+        return jsonify({'message': 'You are not enrolled in this subject!'}), 403
+
+    existing_submission = Submission.query.filter_by(
+        assignment_id=assignment.id,
+        student_id=current_user.id
+    ).first()
+
+    if existing_submission:
+        return jsonify({'message': 'You have already submitted this assignment!'}), 400
+
+    purge_expired_sessions()
+
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        student_id=current_user.id,
+        assignment_id=assignment.id,
+        filename=filename,
+        declared_size=size,
+        received_bytes=0
+    )
+    open(part_path(session.id), 'wb').close()
+    with _running_hashes_lock:
+        _running_hashes[session.id] = (0, hashlib.sha256())
+
+    db.session.add(session)
+    db.session.commit()
+
+    return jsonify({
+        **session.to_dict(),
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE']
+    }), 201
+
+@upload_bp.route('/uploads/<upload_id>', methods=['GET'])
+@role_required('student')
+def get_upload(current_user, upload_id):
+    """Upload progress, so an interrupted client knows where to resume"""
+    session = get_own_session(current_user, upload_id)
+    if not session:
+        return jsonify({'message': 'Upload not found!'}), 404
+    return jsonify(session.to_dict()), 200
+
+@upload_bp.route('/uploads/<upload_id>', methods=['PUT'])
+@role_required('student')
+def upload_chunk(current_user, upload_id):
+    """Append the raw request body at ?offset=, which must equal received_bytes"""
+    session = get_own_session(current_user, upload_id)
+    if not session:
+        return jsonify({'message': 'Upload not found!'}), 404
+
+    try:
+        offset = int(request.args.get('offset', session.received_bytes))
+    except ValueError:
+        return jsonify({'message': 'Invalid offset!'}), 400
+
+    if offset != session.received_bytes:
+        return jsonify({
+            'message': 'Offset does not match received bytes!',
+            'received_bytes': session.received_bytes
+        }), 409
+
+    if request.content_length is not None and request.content_length > current_app.config['UPLOAD_CHUNK_SIZE']:
+        return jsonify({'message': f'Chunk too large! Limit is {current_app.config["UPLOAD_CHUNK_SIZE"]} bytes'}), 413
+
+    with _running_hashes_lock:
+        hashed_bytes, hasher = _running_hashes.pop(upload_id, (None, None))
+    if hashed_bytes != offset:
+        hasher = None
+
+    # Receive the chunk beside the upload; it only goes into the .part file
+    # once this request has claimed the offset, so a retry racing the
+    # original (same offset) can never overwrite the bytes that were counted
+    remaining = session.declared_size - offset
+    chunk = temporary_path()
+    try:
+        try:
+            with open(chunk, 'wb') as destination:
+                written = copy_stream(request.stream, destination, hasher, max_bytes=remaining)
+        except UploadTooLarge:
+            return jsonify({'message': 'Chunk exceeds the declared upload size!'}), 413
+
+        # Only the request that still sees the expected offset may advance it
+        advanced = UploadSession.query.filter_by(id=upload_id, received_bytes=offset)\
+            .update({'received_bytes': offset + written, 'updated_at': datetime.utcnow()})
+        db.session.commit()
+
+        if not advanced:
+            return jsonify({'message': 'Concurrent chunk upload detected!'}), 409
+
+        try:
+            with open(chunk, 'rb') as source, open(part_path(upload_id), 'r+b') as part:
+                part.seek(offset)
+                copy_stream(source, part)
+        except OSError:
+            # Give the range back so the client can resend it
+            UploadSession.query.filter_by(id=upload_id, received_bytes=offset + written)\
+                .update({'received_bytes': offset})
+            db.session.commit()
+            raise
+    finally:
+        os.remove(chunk)
+
+    if hasher is not None:
+        with _running_hashes_lock:
+            _running_hashes[upload_id] = (offset + written, hasher)
+
+    return jsonify({'upload_id': upload_id, 'received_bytes': offset + written}), 200
+
+@upload_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@role_required('student')
+def complete_upload(current_user, upload_id):
+    """Verify the assembled file and turn it into a submission"""
+    session = get_own_session(current_user, upload_id)
+    if not session:
+        return jsonify({'message': 'Upload not found!'}), 404
+
+    if session.received_bytes != session.declared_size:
+        return jsonify({
+            'message': 'Upload is incomplete!',
+            'received_bytes': session.received_bytes,
+            'declared_size': session.declared_size
+        }), 400
+
+    with _running_hashes_lock:
+        hashed_bytes, hasher = _running_hashes.pop(upload_id, (None, None))
+    source = part_path(upload_id)
+    digest = hasher.hexdigest() if hashed_bytes == session.declared_size else file_sha256(source)
+
+    data = request.get_json(silent=True) or {}
+    if data.get('sha256') and data['sha256'].lower() != digest:
+        # The assembled bytes are wrong; the client has to start over
+        discard_session(session)
+        db.session.commit()
+        return jsonify({'message': 'Checksum mismatch!', 'sha256': digest}), 400
+
+    # The roster may have changed since initiate_upload
+    assignment = db.session.get(Assignment, session.assignment_id)
+    if not assignment or not is_enrolled(current_user.id, assignment.subject_id):
+        discard_session(session)
+        db.session.commit()
+        return jsonify({'message': 'You are not enrolled in this subject!'}), 403
+
+    existing_submission = Submission.query.filter_by(
+        assignment_id=session.assignment_id,
+        student_id=current_user.id
+    ).first()
+
+    if existing_submission:
+        discard_session(session)
+        db.session.commit()
+        return jsonify({'message': 'You have already submitted this assignment!'}), 400
+
+    submission = Submission(
+        assignment_id=session.assignment_id,
+        student_id=current_user.id,
+        blob_key=store_file(source, digest),
+        filename=secure_filename(session.filename),
+        sha256=digest
+    )
+    db.session.add(submission)
+    db.session.delete(session)
+    db.session.flush()
+    enqueue_postprocess(submission)
+    submission_created(submission, submission.assignment.subject.teacher_id)
+    db.session.commit()
+
+    return jsonify({
+        'message': 'Assignment submitted successfully!',
+        'submission': submission.to_dict()
+    }), 201
+
+@upload_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@role_required('student')
+def abort_upload(current_user, upload_id):
+    """Abandon an upload and delete its partial file"""
+    session = get_own_session(current_user, upload_id)
+    if not session:
+        return jsonify({'message': 'Upload not found!'}), 404
+
+    discard_session(session)
+    db.session.commit()
+    return jsonify({'message': 'Upload cancelled!'}), 200
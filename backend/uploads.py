@@ -0,0 +1,57 @@
+import hashlib
+import os
+import uuid
+from flask import current_app
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+class UploadTooLarge(Exception):
+    """Raised by copy_stream when the source exceeds its byte limit"""
+
+def file_extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+def size_limit(filename):
+    """Largest accepted upload for a filename, by extension"""
+    return current_app.config['UPLOAD_SIZE_LIMITS'].get(
+        file_extension(filename), current_app.config['DEFAULT_UPLOAD_SIZE_LIMIT']
+    )
+
+def copy_stream(source, destination=None, hasher=None, max_bytes=None):
+    """Copy a file-like object in fixed-size buffers, updating `hasher` as it goes.
+
+    Memory use is one buffer regardless of size. With no destination the
+    bytes are only hashed. Raises UploadTooLarge once more than `max_bytes`
+    have been read. Returns the number of bytes copied.
+    """
+    copied = 0
+    while True:
+        buffer = source.read(COPY_BUFFER_SIZE)
+        if not buffer:
+            return copied
+        copied += len(buffer)
+        if max_bytes is not None and copied > max_bytes:
+            raise UploadTooLarge()
+        if destination is not None:
+            destination.write(buffer)
+        if hasher is not None:
+            hasher.update(buffer)
+
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        copy_stream(f, hasher=hasher)
+    return hasher.hexdigest()
+
+def incoming_folder():
+    """Where partial chunked uploads are assembled"""
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], '.incoming')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def part_path(upload_id):
+    return os.path.join(incoming_folder(), f'{upload_id}.part')
+
+def temporary_path():
+    """A fresh path in the incoming folder for a file being received"""
+    return os.path.join(incoming_folder(), f'{uuid.uuid4().hex}.tmp')
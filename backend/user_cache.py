@@ -0,0 +1,153 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import User
+
+# Columns token_required and the route handlers read from current_user
+CACHED_FIELDS = ('id', 'email', 'role', 'active')
+
+class LocalBackend:
+    """Per-process TTL + LRU store"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class RedisBackend:
+    """Store shared by every worker process; requires the `redis` package"""
+
+    def __init__(self, url, ttl, prefix='classflow:user:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('USER_CACHE_URL is set but the redis package is not installed')
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + str(key))
+        return json.loads(raw) if raw else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + str(key), json.dumps(value), ex=max(1, int(self.ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + str(key))
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+class UserCache:
+    """Cache of the user fields token_required needs, keyed by user id.
+
+    Entries are invalidated after any commit that changes a user's role or
+    active flag through the ORM. In the default per-process mode other
+    workers only see such changes once their entry expires, so keep
+    USER_CACHE_TTL short or set USER_CACHE_URL to share one cache.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.counter_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ttl = app.config['USER_CACHE_TTL']
+        if app.config.get('USER_CACHE_URL'):
+            self.backend = RedisBackend(app.config['USER_CACHE_URL'], ttl)
+        else:
+            self.backend = LocalBackend(app.config['USER_CACHE_SIZE'], ttl)
+        app.extensions['user_cache'] = self
+
+    def get(self, user_id):
+        """Return a detached User built from the cache, or None on a miss"""
+        snapshot = self.backend.get(user_id) if self.backend else None
+        with self.counter_lock:
+            if snapshot is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return User(**snapshot) if snapshot else None
+
+    def put(self, user):
+        if self.backend:
+            self.backend.set(user.id, {field: getattr(user, field) for field in CACHED_FIELDS})
+
+    def invalidate(self, user_id):
+        if self.backend:
+            self.backend.delete(user_id)
+            with self.counter_lock:
+                self.invalidations += 1
+
+    def clear(self):
+        if self.backend:
+            self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+user_cache = UserCache()
+
+@event.listens_for(Session, 'after_flush')
+def collect_changed_users(session, flush_context):
+    """Remember users whose role/active changed or who were deleted in this transaction"""
+    changed = session.info.setdefault('user_cache_invalidate', set())
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in ('role', 'active', 'email')):
+                changed.add(obj.id)
+    changed.update(obj.id for obj in session.deleted if isinstance(obj, User))
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_changed_users(session):
+    for user_id in session.info.pop('user_cache_invalidate', ()):
+        user_cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_changed_users(session):
+    session.info.pop('user_cache_invalidate', None)
@@ -23,13 +23,46 @@ api.interceptors.request.use(
   }
 )
 
+// One refresh at a time: concurrent 401s wait for the same new token, since
+// presenting a refresh token twice revokes the login
+let refreshing = null
+
+const refreshAccessToken = () => {
+  if (!refreshing) {
+    refreshing = axios.post(`${API_BASE_URL}/refresh`, {
+      refresh_token: localStorage.getItem('refresh_token')
+    }).then(({ data }) => {
+      localStorage.setItem('token', data.token)
+      localStorage.setItem('refresh_token', data.refresh_token)
+      return data.token
+    }).finally(() => {
+      refreshing = null
+    })
+  }
+  return refreshing
+}
+
 // Response interceptor for error handling
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const request = error.config
+    if (error.response?.status === 401 && error.response.data?.message === 'Token has expired!'
+        && localStorage.getItem('refresh_token') && !request._retried) {
+      // Renew the access token without asking for the password again
+      request._retried = true
+      try {
+        const token = await refreshAccessToken()
+        request.headers.Authorization = `Bearer ${token}`
+        return api(request)
+      } catch (refreshError) {
+        // Fall through to the login page
+      }
+    }
     if (error.response?.status === 401) {
       // Clear token and redirect to login
       localStorage.removeItem('token')
+      localStorage.removeItem('refresh_token')
       localStorage.removeItem('user')
       window.location.href = '/auth/login'
     }
@@ -46,7 +79,13 @@ export const authAPI = {
     api.post('/register', { email, password, role }),
   
   getCurrentUser: () => 
-    api.get('/me')
+    api.get('/me'),
+  
+  refresh: (refreshToken) => 
+    api.post('/refresh', { refresh_token: refreshToken }),
+  
+  logout: (refreshToken) => 
+    api.post('/logout', { refresh_token: refreshToken })
 }
 
 // Teacher endpoints
@@ -72,9 +111,28 @@ export const teacherAPI = {
   getAssignmentSubmissions: (assignmentId) => 
     api.get(`/api/assignments/${assignmentId}/submissions`),
   
+  // filters: { late: true, ungraded: true }
+  downloadSubmissionsArchive: (assignmentId, filters = {}) => 
+    api.get(`/api/assignments/${assignmentId}/submissions/archive`, {
+      params: filters,
+      responseType: 'blob'
+    }),
+  
   gradeSubmission: (submissionId, grade, feedback) => 
     api.put(`/api/submissions/${submissionId}/grade`, { grade, feedback }),
   
+  // grades: [{ submission_id, grade, feedback }]
+  gradeSubmissions: (grades) => 
+    api.put('/api/submissions/grades', { grades }),
+  
+  importGrades: (assignmentId, csvFile) => {
+    const formData = new FormData()
+    formData.append('file', csvFile)
+    return api.post(`/api/assignments/${assignmentId}/grades/import`, formData, {
+      headers: { 'Content-Type': 'multipart/form-data' }
+    })
+  },
+  
   // Attendance
   markAttendance: (subjectId, date, attendanceRecords) => 
     api.post('/api/attendance/mark', {
@@ -88,20 +146,45 @@ export const teacherAPI = {
       params: { start_date: startDate, end_date: endDate }
     }),
   
+  // format: 'csv' or 'xlsx'
+  exportAttendance: (subjectId, format, startDate, endDate) => 
+    api.get(`/api/attendance/${subjectId}/export`, {
+      params: { format, start_date: startDate, end_date: endDate },
+      responseType: 'blob'
+    }),
+  
+  exportGradebook: (subjectId, format) => 
+    api.get(`/api/subjects/${subjectId}/gradebook/export`, {
+      params: { format },
+      responseType: 'blob'
+    }),
+  
+  // Students x dates register: { dates, students, rows, codes }
+  getAttendanceMatrix: (subjectId, startDate, endDate) => 
+    api.get(`/api/attendance/${subjectId}`, {
+      params: { start_date: startDate, end_date: endDate, format: 'matrix' }
+    }),
+  
   // Students
-  getStudents: () => 
-    api.get('/api/students')
+  getStudents: (subjectId) => 
+    api.get('/api/students', { params: { subject_id: subjectId } }),
+  
+  enrollStudents: (subjectId, emails) => 
+    api.post(`/api/subjects/${subjectId}/students`, { emails }),
+  
+  unenrollStudents: (subjectId, studentIds) => 
+    api.delete(`/api/subjects/${subjectId}/students`, { data: { student_ids: studentIds } })
 }
 
 // Student endpoints
 export const studentAPI = {
   // Subjects
   getSubjects: () => 
-    api.get('/api/subjects'),
+    api.get('/api/student/subjects'),
   
   // Assignments
   getSubjectAssignments: (subjectId) => 
-    api.get(`/api/assignments/${subjectId}`),
+    api.get(`/api/student/assignments/${subjectId}`),
   
   // Submissions
   submitAssignment: (assignmentId, file) => {
@@ -116,6 +199,29 @@ export const studentAPI = {
     })
   },
   
+  // Chunked, resumable upload: initiate, PUT each slice, then complete.
+  // Large zips go through this path instead of one multipart request.
+  uploadInChunks: async (assignmentId, file, onProgress) => {
+    const { data: upload } = await api.post('/api/uploads', {
+      assignment_id: assignmentId,
+      filename: file.name,
+      size: file.size
+    })
+    
+    let offset = upload.received_bytes
+    while (offset < file.size) {
+      const chunk = file.slice(offset, offset + upload.chunk_size)
+      const { data } = await api.put(`/api/uploads/${upload.upload_id}`, chunk, {
+        params: { offset },
+        headers: { 'Content-Type': 'application/octet-stream' }
+      })
+      offset = data.received_bytes
+      if (onProgress) onProgress(offset / file.size)
+    }
+    
+    return api.post(`/api/uploads/${upload.upload_id}/complete`)
+  },
+  
   getMySubmissions: () => 
     api.get('/api/my-submissions'),
   
@@ -128,7 +234,24 @@ export const studentAPI = {
   getMyAttendance: (subjectId) => 
     api.get('/api/my-attendance', {
       params: { subject_id: subjectId }
-    })
+    }),
+  
+  // Dashboard
+  getDashboard: () => 
+    api.get('/api/student/dashboard')
+}
+
+// Save a blob response under the filename from its Content-Disposition
+export const saveDownload = (response, fallbackName) => {
+  const match = /filename="?([^";]+)"?/.exec(response.headers['content-disposition'] || '')
+  const url = window.URL.createObjectURL(new Blob([response.data]))
+  const link = document.createElement('a')
+  link.href = url
+  link.setAttribute('download', match ? match[1] : fallbackName)
+  document.body.appendChild(link)
+  link.click()
+  link.remove()
+  window.URL.revokeObjectURL(url)
 }
 
 export default api
\ No newline at end of file
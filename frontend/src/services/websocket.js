@@ -12,8 +12,9 @@ class WebSocketService {
     if (!token) return
 
     try {
-      // In production, use wss://
-      this.socket = new WebSocket(`ws://localhost:5000/ws?token=${token}`)
+      // /ws is routed to backend/push_server.py by the dev server or front proxy
+      const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws'
+      this.socket = new WebSocket(`${scheme}://${window.location.host}/ws?token=${token}`)
 
       this.socket.onopen = () => {
         console.log('WebSocket connected')
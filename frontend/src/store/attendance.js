@@ -7,6 +7,7 @@ export const useAttendanceStore = defineStore('attendance', () => {
   const authStore = useAuthStore()
   
   const attendanceRecords = ref([])
+  const attendanceMatrix = ref(null)
   const students = ref([])
   const loading = ref(false)
   const error = ref(null)
@@ -69,20 +70,12 @@ export const useAttendanceStore = defineStore('attendance', () => {
     try {
       if (authStore.user.role === 'teacher') {
         if (subjectId) {
-          const response = await teacherAPI.getSubjectAttendance(
+          const response = await teacherAPI.getAttendanceMatrix(
             subjectId,
             options.startDate,
             options.endDate
           )
-          
-          if (response.data.attendance) {
-            // Flatten the grouped attendance data
-            const flattened = []
-            response.data.attendance.forEach(group => {
-              flattened.push(...group.records)
-            })
-            attendanceRecords.value = flattened
-          }
+          attendanceMatrix.value = response.data
         }
       } else {
         const response = await studentAPI.getMyAttendance(subjectId)
@@ -96,14 +89,14 @@ export const useAttendanceStore = defineStore('attendance', () => {
     }
   }
 
-  const fetchStudents = async () => {
+  const fetchStudents = async (subjectId) => {
     if (authStore.user.role !== 'teacher') return
     
     loading.value = true
     error.value = null
     
     try {
-      const response = await teacherAPI.getStudents()
+      const response = await teacherAPI.getStudents(subjectId)
       students.value = response.data
     } catch (err) {
       error.value = err.response?.data?.message || 'Failed to fetch students'
@@ -113,7 +106,7 @@ export const useAttendanceStore = defineStore('attendance', () => {
     }
   }
 
-  const markAttendance = async (subjectId, date, records) => {
+  const markAttendance = async (subjectId, date, records, options = {}) => {
     if (authStore.user.role !== 'teacher') {
       throw new Error('Only teachers can mark attendance')
     }
@@ -134,7 +127,7 @@ export const useAttendanceStore = defineStore('attendance', () => {
       )
       
       // Refresh attendance records
-      await fetchAttendance(subjectId)
+      await fetchAttendance(subjectId, options)
       
       return response.data
     } catch (err) {
@@ -164,11 +157,13 @@ export const useAttendanceStore = defineStore('attendance', () => {
 
   const clearAttendance = () => {
     attendanceRecords.value = []
+    attendanceMatrix.value = null
     students.value = []
   }
 
   return {
     attendanceRecords,
+    attendanceMatrix,
     students,
     myAttendance,
     attendanceBySubject,
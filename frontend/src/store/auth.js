@@ -34,6 +34,7 @@ export const useAuthStore = defineStore('auth', () => {
       user.value = response.data.user
       
       localStorage.setItem('token', token.value)
+      localStorage.setItem('refresh_token', response.data.refresh_token)
       localStorage.setItem('user', JSON.stringify(user.value))
       
       return { success: true, data: response.data }
@@ -56,6 +57,7 @@ export const useAuthStore = defineStore('auth', () => {
       user.value = response.data.user
       
       localStorage.setItem('token', token.value)
+      localStorage.setItem('refresh_token', response.data.refresh_token)
       localStorage.setItem('user', JSON.stringify(user.value))
       
       return { success: true, data: response.data }
@@ -68,9 +70,15 @@ export const useAuthStore = defineStore('auth', () => {
   }
 
   function logout() {
+    // Revoke the refresh token; nothing to wait for if it fails
+    const refreshToken = localStorage.getItem('refresh_token')
+    if (refreshToken) {
+      api.post('/logout', { refresh_token: refreshToken }).catch(() => {})
+    }
     token.value = null
     user.value = null
     localStorage.removeItem('token')
+    localStorage.removeItem('refresh_token')
     localStorage.removeItem('user')
   }
 
@@ -27,6 +27,10 @@ export default defineConfig({
       '/me': {
         target: 'http://localhost:5000',
         changeOrigin: true
+      },
+      '/ws': {
+        target: 'ws://localhost:5001',
+        ws: true
       }
     }
   },